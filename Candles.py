@@ -0,0 +1,11 @@
+import sys
+import os
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+from src import cli
+
+"""Single entry point for the candles tools: sync, clean, status, ...
+Run "python Candles.py --help" for the list of commands. Heavy dependencies are only imported by the
+command that needs them."""
+
+if __name__ == '__main__':
+    sys.exit(cli.main())
@@ -0,0 +1,63 @@
+import os
+import io
+import sys
+import time
+import tempfile
+import contextlib
+import numpy as np
+import pandas
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import dataset_handler as dh
+from src import outliers
+
+"""Compares the run time and the results of the outlier detectors on synthetic candles with known wick spikes.
+Every detector is scored against the spikes (found and false), and against the other detectors (agreement).
+Usage: python benchmarks/outlier_detectors.py [candles] [spikes]"""
+
+
+def syntheticCandles(candles, spikes, seed=0):
+    """Returns a random walk of 1m candles with spikes added to the HIGH and LOW of random candles,
+    and the MTS timestamps of the spiked HIGH and LOW values."""
+    rng = np.random.default_rng(seed)
+    close = 10000 + np.cumsum(rng.normal(0, 5, candles))
+    open = np.concatenate(([close[0]], close[:-1]))
+    high = np.fmax(open, close) + rng.exponential(3, candles)
+    low = np.fmin(open, close) - rng.exponential(3, candles)
+    mts = 1514764800 + 60*np.arange(candles, dtype=np.float64)
+    spikedHigh = rng.choice(candles, spikes, replace=False)
+    spikedLow = rng.choice(candles, spikes, replace=False)
+    high[spikedHigh] += rng.uniform(100, 500, spikes)
+    low[spikedLow] -= rng.uniform(100, 500, spikes)
+    candlesSet = pandas.DataFrame({'MTS': mts, 'OPEN': open, 'CLOSE': close, 'HIGH': high, 'LOW': low,
+                                   'VOLUME': rng.exponential(1, candles)})
+    return candlesSet, mts[spikedHigh], mts[spikedLow]
+
+
+if __name__ == '__main__':
+    candles = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    spikes = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    candlesSet, spikedHigh, spikedLow = syntheticCandles(candles, spikes)
+    truth = set(spikedHigh) | {-mts for mts in spikedLow}
+
+    with tempfile.TemporaryDirectory() as directory:
+        handler = dh.CandlesHandler()
+        handler.open(os.path.join(directory, 'candles.hdf5'), new=True)
+        handler.saveDataset(candlesSet, '1m')
+        found = {}
+        for engine in outliers.detector_registry:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                _, outlierXhigh, _, outlierXlow, _ = outliers.detectOutliers(handler, '1m', engine=engine)
+            elapsed = time.perf_counter() - start
+            #LOW outliers are stored as negative timestamps to keep them apart from HIGH outliers.
+            found[engine] = set(outlierXhigh) | {-mts for mts in outlierXlow}
+            print("{:10s} {:8.2f} s, {:8.0f} candles/s, {} of {} spikes found, {} false".format(
+                engine, elapsed, candles/elapsed, len(found[engine] & truth), len(truth), len(found[engine] - truth)))
+        handler.close()
+
+    engines = list(found)
+    for n, first in enumerate(engines):
+        for second in engines[n+1:]:
+            union = found[first] | found[second]
+            agreement = len(found[first] & found[second])/len(union) if union else 1.0
+            print("Agreement of {} and {}: {:.1%}".format(first, second, agreement))
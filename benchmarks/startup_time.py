@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import statistics
+import numpy as np
+
+"""Measures the startup time of the command line tools.
+Every case is run in a fresh python process a number of times, and the median wall time is reported.
+The status query is run against a temporary config file and a candles file with a year of synthetic 1m candles.
+Usage: python benchmarks/startup_time.py [repeats]"""
+
+repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+cases = [
+    ("python interpreter", ["-c", "pass"]),
+    ("import src.dataset_handler", ["-c", "import src.dataset_handler"]),
+    ("import pandas (for reference)", ["-c", "import pandas"]),
+    ("Candles.py --help", ["Candles.py", "--help"]),
+    ("Candles.py status --help", ["Candles.py", "status", "--help"]),
+]
+
+
+def timeCommand(arguments, repeats):
+    """Returns the median wall time in seconds of running python with the given arguments."""
+    times = []
+    for n in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + arguments, cwd=repo, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def statusFiles(directory, candles=525600):
+    """Writes a candles file with candles synthetic 1m candles and a config file pointing to it into directory.
+    Returns the path of the config file."""
+    sys.path.insert(1, repo)
+    from src import dataset_handler as dh
+    candlespath = os.path.join(directory, 'candles.hdf5')
+    handler = dh.CandlesHandler()
+    handler.open(candlespath, new=True)
+    mts = time.time()//60*60 - 60*np.arange(candles, dtype=np.float64)[::-1]
+    close = 10000 + np.cumsum(np.random.default_rng(0).normal(0, 5, candles))
+    handler._appendRows('1m', np.column_stack([mts, close, close, close + 1, close - 1, np.ones(candles)]))
+    handler.close()
+    configpath = os.path.join(directory, 'config.ini')
+    with open(configpath, 'w') as file:
+        file.write("[DATASETS]\ncandles_dataset_path = {}\nclean_candles_dataset_path = {}\n".format(candlespath, candlespath))
+    return configpath
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    with tempfile.TemporaryDirectory() as directory:
+        configpath = statusFiles(directory)
+        for name, arguments in cases + [("Candles.py status (1 year of 1m)", ["Candles.py", "--config", configpath, "status"])]:
+            print("{:<35}{:8.1f} ms".format(name, timeCommand(arguments, repeats)*1000))
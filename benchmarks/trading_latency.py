@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import hmac
+import time
+import hashlib
+import threading
+import statistics
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src import clients
+
+"""Measures the latency of signed requests of BitfinexTrading against a local mock of the authenticated API.
+The mock checks the signature of every request and that the nonces of every request are unique.
+Sequential orders measure the latency of one request; async orders from several threads measure the throughput.
+Usage: python benchmarks/trading_latency.py [orders] [threads]"""
+
+key = 'benchmark-key'
+secret = 'benchmark-secret'
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Answers every POST with an order notification, after checking its signature."""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    nonces = set()
+    lock = threading.Lock()
+    errors = 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length'])).decode()
+        nonce = self.headers['bfx-nonce']
+        expected = hmac.new(secret.encode(), ('/api/' + self.path.lstrip('/') + nonce + body).encode(), hashlib.sha384).hexdigest()
+        with MockHandler.lock:
+            if expected != self.headers['bfx-signature'] or nonce in MockHandler.nonces:
+                MockHandler.errors += 1
+            MockHandler.nonces.add(nonce)
+        response = json.dumps([int(time.time()*1000), 'on-req', None, None, [], None, 'SUCCESS', 'Submitted']).encode()
+        self.send_response(200)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+def percentiles(times):
+    """Returns the median and 99th percentile of a list of seconds, in milliseconds."""
+    times = sorted(times)
+    return statistics.median(times)*1000, times[int(0.99*(len(times) - 1))]*1000
+
+
+if __name__ == '__main__':
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    client = clients.BitfinexTrading(key, secret, workers=threads)
+    client.api_url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    #The benchmark measures the client, not the rate budget of the exchange.
+    client.auth_limiter = clients.RateLimiter(rate=1e9, burst=threads)
+
+    times = []
+    for n in range(orders):
+        start = time.perf_counter()
+        client.new_order(amount=0.01, price=1000 + n)
+        times.append(time.perf_counter() - start)
+    print("Sequential orders:  median {:.2f} ms, p99 {:.2f} ms".format(*percentiles(times)))
+
+    start = time.perf_counter()
+    futures = [client.new_order_async(amount=0.01, price=1000 + n) for n in range(orders)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    print("Async orders:       {} threads, {:.0f} orders/s".format(threads, orders/elapsed))
+
+    start = time.perf_counter()
+    futures = [client.cancel_order_async(n) for n in range(orders)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    print("Async cancels:      {} threads, {:.0f} cancels/s".format(threads, orders/elapsed))
+
+    client.close()
+    server.shutdown()
+    print("Requests: {}, rejected signatures or repeated nonces: {}".format(len(MockHandler.nonces), MockHandler.errors))
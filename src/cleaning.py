@@ -0,0 +1,59 @@
+import io
+import time
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+"""Cleaning of raw candles, optionally spread over a pool of processes.
+
+Every job cleans one timebase of the raw candles file from a start time onwards. Workers open the raw file read-only,
+so any number of them can read it at once. The cleaned candles are sent back to the calling process, which is the
+only one that writes to the clean candles file."""
+
+
+def cleanJob(rawPath, timebase, start, engine, settings):
+    """Cleans the candles of one timebase of the raw candles file, from start onwards. Runs in the worker processes.
+    Returns (timebase, cleaned dataframe or None, number of outliers, seconds spent)."""
+    from src import dataset_handler as dh
+    from src import outliers
+    began = time.time()
+    handler = dh.CandlesHandler(path=rawPath, mode="r")
+    try:
+        #Progress bars of parallel jobs would garble each other, so the output of the job is discarded.
+        with contextlib.redirect_stdout(io.StringIO()):
+            cleaned, outlierXhigh, _, outlierXlow, _ = outliers.detectOutliers(handler, timebase, engine=engine, start=start, **settings)
+    finally:
+        #The worker processes are reused, so the raw file must not stay open after a failed job.
+        handler.close()
+    outlierCount = 0 if cleaned is None else len(outlierXhigh) + len(outlierXlow)
+    return timebase, cleaned, outlierCount, time.time() - began
+
+
+def cleanCandles(rawPath, clean_handler, jobs, workers=1, engine='gaussian', settings=None):
+    """Runs cleaning jobs and saves their results to the clean candles file.
+    Parameters
+    ----------
+    rawPath             :   String. Path of the raw candles file.
+    clean_handler       :   CandlesHandler of the clean candles file. Only this process writes to it.
+    jobs                :   List of (timebase, start, mode) tuples. mode is the saveDataset mode used for the result.
+    workers=1           :   Integer. Number of worker processes. With 1, the jobs run in this process.
+    engine='gaussian'   :   String. Name of the outlier detector, see src/outliers.py.
+    settings=None       :   Optional dictionary of detector settings, e.g. statlength and sigmalimit."""
+    settings = settings or {}
+    modes = {timebase: mode for timebase, start, mode in jobs}
+
+    def save(timebase, cleaned, outlierCount, seconds):
+        print("{}\tcleaned in {:.1f} seconds, {} outliers scaled.".format(timebase, seconds, outlierCount))
+        if cleaned is not None and len(cleaned) > 0:
+            clean_handler.saveDataset(cleaned, timebase, mode=modes[timebase])
+
+    if workers <= 1:
+        for timebase, start, mode in jobs:
+            save(*cleanJob(rawPath, timebase, start, engine, settings))
+        return
+    #Workers are spawned rather than forked, so they do not inherit the open hdf5 files of this process.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        futures = [executor.submit(cleanJob, rawPath, timebase, start, engine, settings) for timebase, start, mode in jobs]
+        for future in as_completed(futures):
+            save(*future.result())
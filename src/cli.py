@@ -0,0 +1,317 @@
+import os
+import sys
+import time
+import argparse
+import configparser
+sys.path.insert(1, os.path.join(sys.path[0], '..'))
+
+"""Command line interface for the candles tools.
+
+Usage: python Candles.py <command> [options]. Run with --help for the list of commands.
+
+Every command imports the heavy dependencies (pandas, scipy, the API client, ...) it needs inside its own
+function, so cheap commands like "status" start up fast enough to be called from schedulers and health checks."""
+
+default_configpath = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.ini')
+
+
+def loadConfig(configpath):
+    """Reads the config file. Raises a RuntimeError if it does not exist."""
+    if not os.path.isfile(configpath):
+        raise RuntimeError("Could not find configuration file \"{}\"".format(configpath))
+    config = configparser.ConfigParser()
+    config.read(configpath)
+    return config
+
+
+def sync(args, config):
+    """Collects candles data from Bitfinex and stores them in the local HDF5 dataset."""
+    from colorama import init
+    from src import clients
+    from src import dataset_handler as dh
+    candlespath = config['DATASETS']['candles_dataset_path'] #Get candles dataset filepath
+
+    #Initiate colorama for colored terminal output text
+    init(autoreset=True)
+
+    #Get the bitfinex API client, optionally with an on-disk cache of historical candle pages
+    cachedir = args.cache_dir or config.get('SYNC', 'cache_dir', fallback='')
+    replay = args.replay or config.getboolean('SYNC', 'replay', fallback=False)
+    cache = None
+    if cachedir:
+        cachesize = args.cache_size if args.cache_size is not None else config.getfloat('SYNC', 'cache_size_mb', fallback=1024)
+        cache = clients.CandleCache(cachedir, max_bytes=int(cachesize*1024**2), replay=replay)
+    elif replay:
+        print("Replay mode needs a cache directory.")
+        return 1
+    page_size = args.page_size or config.get('SYNC', 'page_size', fallback='auto')
+    if page_size != 'auto' and not page_size.isdigit():
+        print("The page size must be 'auto' or a number of candles.")
+        return 1
+    ttl = config.getfloat('SYNC', 'ttl', fallback=1.0)
+    apiClient = clients.BitfinexPublic(cache=cache, page_size=page_size, ttl=ttl)
+
+    #Get the candles dataset handler
+    handler = dh.CandlesHandler(path=candlespath)
+
+    #syncronize candles dataset with bitfinex
+    handler.syncDatafile(apiClient)
+    return 0
+
+
+def clean(args, config):
+    """Goes through the candles file that contains raw candles from the exchange, and cleans it up.
+    Timebases are independent, so with more than one worker they are cleaned in parallel processes."""
+    from colorama import init
+    from src import dataset_handler as dh
+    from src import cleaning
+    candlespath_raw = config['DATASETS']['candles_dataset_path'] #Get raw candles dataset filepath
+    candlespath_clean = config['DATASETS']['clean_candles_dataset_path'] #Get clean candles dataset filepath
+    engine = config.get('OUTLIERSCALER', 'engine', fallback='gaussian')
+    settings = {'statlength': config.getint('OUTLIERSCALER', 'statlength', fallback=10),
+                'sigmalimit': config.getfloat('OUTLIERSCALER', 'sigmalimit', fallback=0.5),
+                'madlimit': config.getfloat('OUTLIERSCALER', 'madlimit', fallback=10.0)}
+    workers = args.workers if args.workers is not None else config.getint('CLEAN', 'workers', fallback=1)
+
+    #Initiate colorama for colored terminal output text
+    init(autoreset=True)
+
+    #Get the clean candles and raw candles dataset handlers. The raw file is only read.
+    raw_handler = dh.CandlesHandler(path=candlespath_raw, mode="r")
+    clean_handler = dh.CandlesHandler(path=candlespath_clean)
+
+    #We simply go through every dataset in the raw candles file and clean the parts that do not
+    #exist in the clean dataset yet, and appends it to the clean dataset.
+    latest_clean_timestamps = clean_handler.latestMTS()
+    latest_raw_timestamps = raw_handler.latestMTS()
+    raw_handler.close()
+    jobs = []
+    for timebase in latest_clean_timestamps:
+        clean_ts = latest_clean_timestamps[timebase]
+        if clean_ts != 0:
+            mode = 'append'
+        else:
+            mode = 'skip'
+        raw_ts = latest_raw_timestamps[timebase]
+        if clean_ts != raw_ts:
+            #We need to update the cleaned dataset.
+            #Start by cleaning the candles that do not exist on file
+            jobs.append((timebase, clean_ts, mode))
+    start = time.time()
+    cleaning.cleanCandles(candlespath_raw, clean_handler, jobs, workers=workers, engine=engine, settings=settings)
+    print("Cleaned {} timebases with {} workers in {:.1f} seconds.".format(len(jobs), workers, time.time() - start))
+    return 0
+
+
+def status(args, config):
+    """Prints the latest candle of every timebase. Only needs h5py and numpy.
+    Returns 1 if --max-age is given and any timebase is older than max-age plus the length of one candle."""
+    from src import dataset_handler as dh
+    from src import converters
+    candlespath = config['DATASETS'][args.dataset + '_dataset_path']
+    handler = dh.CandlesHandler(path=candlespath, mode="r")
+    latest = handler.latestMTS()
+    handler.close()
+
+    now = time.time()
+    stale = False
+    for timebase, mts in latest.items():
+        if mts == 0:
+            readable = "Dataset is empty!"
+            age = None
+        else:
+            readable = converters.tsToDt(int(mts), str=True)
+            age = now - mts
+        isStale = args.max_age is not None and (age is None or age > args.max_age + dh.timebase_seconds[timebase])
+        stale = stale or isStale
+        print("{}\t{}\t{}".format(timebase, readable, "STALE" if isStale else "ok"))
+    return 1 if stale else 0
+
+
+def export(args, config):
+    """Exports candle datasets to month-partitioned Parquet or Arrow IPC files."""
+    from src import dataset_handler as dh
+    from src import exporter
+    handler = dh.CandlesHandler(path=config['DATASETS'][args.dataset + '_dataset_path'], mode="r")
+    start = time.time()
+    rowcounts = exporter.exportCandles(handler, args.directory, timebases=args.timebases, coloumns=args.coloumns or 'ALL',
+                                       fmt=args.format, start=args.start, end=args.end, workers=args.workers)
+    handler.close()
+    for timebase, rows in rowcounts.items():
+        print("{}\t{} rows".format(timebase, rows))
+    print("Exported in {:.1f} seconds.".format(time.time() - start))
+    return 0
+
+
+def import_(args, config):
+    """Imports Parquet or Arrow IPC files written by the export command into a candles file."""
+    from src import dataset_handler as dh
+    from src import exporter
+    handler = dh.CandlesHandler(path=config['DATASETS'][args.dataset + '_dataset_path'])
+    rowcounts = exporter.importCandles(handler, args.directory, timebases=args.timebases, mode=args.mode, workers=args.workers)
+    handler.close()
+    for timebase, rows in rowcounts.items():
+        print("{}\t{} rows".format(timebase, rows))
+    return 0
+
+
+#Problems found by CandlesHandler.validate that break the time index, and that validate --repair tries to repair.
+index_problems = ['unsorted', 'duplicates', 'nan_rows', 'uncommitted']
+
+
+def breaksIndex(result):
+    """Returns True if a validate result of a timebase has problems that break the time index."""
+    return any(result[key] for key in index_problems)
+
+
+def validate(args, config):
+    """Checks the candles datasets for unsorted rows, duplicates, NaN rows, OHLC inconsistencies and gaps, and
+    optionally repairs unsorted and duplicate rows. Returns 1 if problems that break the time index were found and,
+    with --repair, are still there after the repair."""
+    from src import dataset_handler as dh
+    candlespath = config['DATASETS'][args.dataset + '_dataset_path']
+    handler = dh.CandlesHandler(path=candlespath, mode="a" if args.repair else "r")
+    start = time.time()
+    report = handler.validate(timebases=args.timebases)
+    broken = False
+    for timebase, result in report.items():
+        problems = ["{}={}".format(key, value) for key, value in result.items() if key not in ('rows', 'examples') and value != 0]
+        print("{}\t{} rows\t{}".format(timebase, result['rows'], ", ".join(problems) if problems else "ok"))
+        if breaksIndex(result):
+            if args.repair:
+                removed = handler.repair(timebase)
+                print("\tRepaired. Removed {} rows.".format(removed))
+                #repair does not remove every problem, e.g. rows with an MTS but NaN prices.
+                result = handler.validate(timebases=[timebase])[timebase]
+                if breaksIndex(result):
+                    problems = ["{}={}".format(key, result[key]) for key in index_problems if result[key] != 0]
+                    print("\tProblems left after the repair: {}".format(", ".join(problems)))
+                    broken = True
+            else:
+                broken = True
+    handler.close()
+    print("Validated in {:.1f} seconds.".format(time.time() - start))
+    return 1 if broken else 0
+
+
+def compact(args, config):
+    """Writes a copy of a candles file with a compact storage encoding, and prints the round-trip error of every coloumn."""
+    from src import dataset_handler as dh
+    handler = dh.CandlesHandler(path=config['DATASETS'][args.dataset + '_dataset_path'], mode="r")
+    report = handler.convertEncoding(args.path, encoding=args.encoding, precision=args.precision, volumePrecision=args.volume_precision)
+    handler.close()
+    for timebase, errors in report.items():
+        print("{}\t{}".format(timebase, ", ".join("{}={:g}".format(clmn, error) for clmn, error in errors.items())))
+    return 0
+
+
+def shard(args, config):
+    """Converts a candles file to the sharded layout, and optionally compacts its sealed shards."""
+    from src import dataset_handler as dh
+    handler = dh.CandlesHandler(path=config['DATASETS'][args.dataset + '_dataset_path'])
+    start = time.time()
+    handler.shardFile(period=args.period)
+    print("Sharded by {} in {:.1f} seconds.".format(args.period, time.time() - start))
+    if args.compact:
+        for timebase, sizes in handler.compactShards().items():
+            print("{}\t{:.1f} MB -> {:.1f} MB".format(timebase, sizes['before']/1024**2, sizes['after']/1024**2))
+    handler.close()
+    return 0
+
+
+def serve(args, config):
+    """Serves queries of a candles file to local processes through src/server.py, until interrupted."""
+    from src import server
+    candleServer = server.CandlesServer(config['DATASETS'][args.dataset + '_dataset_path'], address=args.address, cacheEntries=args.cache_entries)
+    try:
+        candleServer.serveForever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        candleServer.shutdown()
+    return 0
+
+
+def buildParser():
+    """Returns the argument parser of the command line interface."""
+    parser = argparse.ArgumentParser(description="Synchronize, clean and inspect the local Bitfinex candles files.")
+    parser.add_argument('--config', default=default_configpath, help="Path to the config file. Default: %(default)s")
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    sync_parser = commands.add_parser('sync', help="Synchronize the raw candles file with Bitfinex.")
+    sync_parser.add_argument('--cache-dir', default=None, help="Directory of the cache of historical candle pages. Default: the cache_dir setting in the [SYNC] section of the config file, or no cache.")
+    sync_parser.add_argument('--cache-size', type=float, default=None, help="Maximum size of the cache in MB. Default: the cache_size_mb setting in the [SYNC] section of the config file, or 1024.")
+    sync_parser.add_argument('--page-size', default=None, help="Candles per request, or 'auto' to use the largest size the API accepts and adapt it to the response times. Default: the page_size setting in the [SYNC] section of the config file, or auto.")
+    sync_parser.add_argument('--replay', action='store_true', help="Only read candles from the cache, without calling the API.")
+    sync_parser.set_defaults(func=sync)
+
+    clean_parser = commands.add_parser('clean', help="Clean the raw candles into the clean candles file.")
+    clean_parser.add_argument('--workers', type=int, default=None, help="Number of worker processes. Default: the workers setting in the [CLEAN] section of the config file, or 1.")
+    clean_parser.set_defaults(func=clean)
+
+    status_parser = commands.add_parser('status', help="Print the latest candle of every timebase.")
+    status_parser.add_argument('--dataset', choices=['candles', 'clean_candles'], default='candles', help="Which candles file to inspect. Default: %(default)s")
+    status_parser.add_argument('--max-age', type=float, default=None, help="Exit with status 1 if a timebase is more than this many seconds out of date.")
+    status_parser.set_defaults(func=status)
+
+    validate_parser = commands.add_parser('validate', help="Check the candles datasets for unsorted, duplicate and inconsistent rows.")
+    validate_parser.add_argument('--dataset', choices=['candles', 'clean_candles'], default='candles', help="Which candles file to check. Default: %(default)s")
+    validate_parser.add_argument('--timebases', nargs='+', default=None, help="Timebases to check. Default: all.")
+    validate_parser.add_argument('--repair', action='store_true', help="Sort and deduplicate the timebases that need it.")
+    validate_parser.set_defaults(func=validate)
+
+    compact_parser = commands.add_parser('compact', help="Write a copy of a candles file with a compact storage encoding.")
+    compact_parser.add_argument('path', help="Path of the new candles file.")
+    compact_parser.add_argument('--dataset', choices=['candles', 'clean_candles'], default='candles', help="Which candles file to copy. Default: %(default)s")
+    compact_parser.add_argument('--encoding', choices=['float64', 'float32', 'int64', 'int32'], default='int64', help="Default: %(default)s")
+    compact_parser.add_argument('--precision', type=int, default=2, help="Price decimals kept by the integer encodings. Default: %(default)s")
+    compact_parser.add_argument('--volume-precision', type=int, default=4, help="Volume decimals kept by the integer encodings. Default: %(default)s")
+    compact_parser.set_defaults(func=compact)
+
+    shard_parser = commands.add_parser('shard', help="Split a candles file into one file per period, joined by virtual datasets.")
+    shard_parser.add_argument('--dataset', choices=['candles', 'clean_candles'], default='candles', help="Which candles file to shard. Default: %(default)s")
+    shard_parser.add_argument('--period', choices=['year', 'month'], default='year', help="Default: %(default)s")
+    shard_parser.add_argument('--compact', action='store_true', help="Compress the sealed shards afterwards.")
+    shard_parser.set_defaults(func=shard)
+
+    serve_parser = commands.add_parser('serve', help="Serve queries of a candles file to local processes.")
+    serve_parser.add_argument('--dataset', choices=['candles', 'clean_candles'], default='candles', help="Which candles file to serve. Default: %(default)s")
+    serve_parser.add_argument('--address', default=None, help="Path of the Unix socket, or host:port. Default: a socket next to the candles file, or 127.0.0.1:50555 on Windows.")
+    serve_parser.add_argument('--cache-entries', type=int, default=64, help="Number of query results kept in memory. Default: %(default)s")
+    serve_parser.set_defaults(func=serve)
+
+    export_parser = commands.add_parser('export', help="Export candles to month-partitioned Parquet or Arrow IPC files.")
+    export_parser.add_argument('directory', help="Output directory.")
+    export_parser.add_argument('--dataset', choices=['candles', 'clean_candles'], default='candles', help="Which candles file to export. Default: %(default)s")
+    export_parser.add_argument('--timebases', nargs='+', default=None, help="Timebases to export. Default: all.")
+    export_parser.add_argument('--coloumns', nargs='+', default=None, help="Coloumns to export. MTS is always included. Default: all.")
+    export_parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet', help="Default: %(default)s")
+    export_parser.add_argument('--start', default=None, help="Only export candles from this time, e.g. \"2018-01-01 00:00:00\".")
+    export_parser.add_argument('--end', default=None, help="Only export candles up to this time.")
+    export_parser.add_argument('--workers', type=int, default=4, help="Number of writer threads. Default: %(default)s")
+    export_parser.set_defaults(func=export)
+
+    import_parser = commands.add_parser('import', help="Import files written by the export command.")
+    import_parser.add_argument('directory', help="Directory written by the export command.")
+    import_parser.add_argument('--dataset', choices=['candles', 'clean_candles'], default='candles', help="Which candles file to import into. Default: %(default)s")
+    import_parser.add_argument('--timebases', nargs='+', default=None, help="Timebases to import. Default: all found in the directory.")
+    import_parser.add_argument('--mode', choices=['append', 'skip', 'replace'], default='skip', help="Save mode, see CandlesHandler.saveDataset. Default: %(default)s")
+    import_parser.add_argument('--workers', type=int, default=4, help="Number of reader threads. Default: %(default)s")
+    import_parser.set_defaults(func=import_)
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the command line interface. Returns the exit status."""
+    args = buildParser().parse_args(argv)
+    try:
+        config = loadConfig(args.config)
+    except RuntimeError as e:
+        print(e)
+        return 1
+    return args.func(args, config)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
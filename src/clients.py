@@ -1,15 +1,269 @@
+import os
 import json
+import gzip
 import hmac
 import hashlib
-import time
+import copy
+import threading
 import requests
-import base64
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+#Length of a single candle of each timeframe, in seconds.
+timeframe_seconds = {'1m':60, '5m':60*5, '15m':60*15, '30m':60*30, '1h':60*60, '3h':60*60*3, '6h':60*60*6, '12h':60*60*12,
+                     '1D':60*60*24, '7D':60*60*24*7, '14D':60*60*24*14, '1M':60*60*24*31}
+
+#Locks of the signed requests of every API key, see BitfinexTrading.
+send_locks = {}
+send_locks_lock = threading.Lock()
 
 class BitfinexError(Exception):
     pass
 
 
+class CandleCache(object):
+    """
+    A persistent on-disk cache of historical candle pages.
+
+    Closed historical candles never change, so a page of them can be served from disk instead of the API.
+    Pages are stored gzip compressed, in files named after a hash of the request (timeframe, symbol,
+    section and parameters such as start, end, limit and sort). Only full pages of closed candles are
+    cached, never the page holding the still-forming last candle. When the cache grows beyond max_bytes,
+    the least recently used pages are removed.
+
+    In replay mode, no requests are made for candles at all: cached pages are returned, and the 'last' candle
+    is the newest cached candle. A page that starts after the newest cached candle is returned as empty, since
+    it is past the end of the data. Any other page that is not cached (e.g. because it was evicted) raises a
+    BitfinexError, so that a sync stops there instead of leaving a hole. This lets a sync run fully offline
+    from the cache.
+    """
+
+    def __init__(self, directory, max_bytes=1024**3, replay=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.replay = replay
+        self._size = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, timeframe, symbol, section, params):
+        """Returns the content address of a candles request."""
+        request = json.dumps([timeframe, symbol, section, sorted((k, str(v)) for k, v in params.items())])
+        return hashlib.sha1(request.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.json.gz')
+
+    def _headPath(self, timeframe, symbol):
+        return os.path.join(self.directory, 'heads', '{}_{}.json'.format(timeframe, symbol))
+
+    def get(self, key):
+        """Returns the cached page with the given key, or None if it is not cached."""
+        path = self._path(key)
+        try:
+            with gzip.open(path, 'rt') as f:
+                page = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path) #Mark it as recently used.
+        return page
+
+    def put(self, key, page, timeframe, symbol):
+        """Stores a page of candles (as returned by the API, MTS in milliseconds)."""
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = path + '.tmp'
+        with gzip.open(tmppath, 'wt') as f:
+            json.dump(page, f)
+        try:
+            replaced = os.path.getsize(path) #A page that is stored again replaces the old file.
+        except OSError:
+            replaced = 0
+        os.replace(tmppath, path)
+        #Remember the newest cached candle, which is the 'last' candle in replay mode.
+        newest = max(page, key=lambda candle: candle[0])
+        head = self.head(timeframe, symbol)
+        if head is None or newest[0] > head[0]:
+            os.makedirs(os.path.dirname(self._headPath(timeframe, symbol)), exist_ok=True)
+            with open(self._headPath(timeframe, symbol), 'w') as f:
+                json.dump(newest, f)
+        if self._size is not None:
+            self._size += os.path.getsize(path) - replaced
+        self._evict()
+
+    def head(self, timeframe, symbol):
+        """Returns the newest cached candle of a timeframe and symbol, or None."""
+        try:
+            with open(self._headPath(timeframe, symbol)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _pages(self):
+        """Returns a list of (last use, size, path) of all cached pages."""
+        pages = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.json.gz'):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    pages.append((stat.st_mtime, stat.st_size, path))
+        return pages
+
+    def _evict(self):
+        """Removes the least recently used pages until the cache is below 90% of max_bytes."""
+        if self._size is None:
+            self._size = sum(size for _, size, _ in self._pages())
+        if self._size <= self.max_bytes:
+            return
+        for _, size, path in sorted(self._pages()):
+            if self._size <= 0.9*self.max_bytes:
+                break
+            os.remove(path)
+            self._size -= size
+
+
+class RateLimiter(object):
+    """
+    A thread-safe token bucket. Tokens are added at a constant rate, up to a maximum of burst tokens, and
+    every request takes one. Threads that find the bucket empty sleep until their token is available,
+    without holding the lock.
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        rate:   Tokens added per second.
+        burst:  Maximum number of tokens in the bucket, i.e. requests that can be made at once.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be made."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated)*self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens)/self.rate
+            time.sleep(wait)
+
+
+class NonceGenerator(object):
+    """
+    Generates strictly increasing nonces for the authenticated API, from any number of threads.
+
+    Nonces are microsecond timestamps, incremented when two are requested in the same microsecond.
+    If a path is given, the last nonce is also kept in that file under an exclusive file lock, so that
+    several processes using the same API key never send the same or a smaller nonce.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        """Returns the next nonce."""
+        with self._lock:
+            if self.path is None:
+                self._last = max(int(time.time()*1000000), self._last + 1)
+                return self._last
+            with open(self.path, 'a+') as f:
+                self._lockFile(f)
+                try:
+                    f.seek(0)
+                    stored = f.read().strip()
+                    last = max(self._last, int(stored) if stored else 0)
+                    self._last = max(int(time.time()*1000000), last + 1)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(str(self._last))
+                    f.flush()
+                finally:
+                    self._unlockFile(f)
+            return self._last
+
+    def _lockFile(self, f):
+        try:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlockFile(self, f):
+        try:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_UN)
+        except ImportError:
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SingleFlight(object):
+    """
+    Coalesces identical calls. While a call with some key is in flight, other threads that make the same call
+    wait for it and share its result instead of making their own. Results are then kept for ttl seconds.
+    Every caller gets its own copy of the result, so callers may modify it.
+    hits counts the calls answered from the cache, coalesced the calls that waited for one in flight, and
+    calls the calls that were actually made.
+    """
+
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.coalesced = 0
+        self.calls = 0
+        self._results = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """Returns func(), or the result of an identical call that is in flight or younger than ttl."""
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self.hits += 1
+                return copy.deepcopy(cached[1])
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = {'done': threading.Event(), 'result': None, 'error': None}
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            flight['done'].wait()
+            if flight['error'] is not None:
+                raise flight['error']
+            return copy.deepcopy(flight['result'])
+        try:
+            flight['result'] = func()
+        except Exception as e:
+            flight['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+                if flight['error'] is None and self.ttl > 0:
+                    self._results[key] = (time.monotonic() + self.ttl, flight['result'])
+            flight['done'].set()
+        return copy.deepcopy(flight['result'])
+
+    def stats(self):
+        """Returns a dictionary with the hits, coalesced and calls counters."""
+        with self._lock:
+            return {'hits': self.hits, 'coalesced': self.coalesced, 'calls': self.calls}
+
+
 class BaseClient(object):
     """
     A base class for the API Client methods that handles interaction with
@@ -19,9 +273,12 @@ class BaseClient(object):
     api_url = 'https://api.bitfinex.com/'
     exception_on_error = True
     lastcall = time.time()
+    #Public API calls are limited to one every 1.5 seconds.
+    public_rate = 1/1.5
     
     def __init__(self, proxydict=None, *args, **kwargs):
         self.proxydict = proxydict
+        self.limiter = RateLimiter(self.public_rate)
 
     def _get(self, *args, **kwargs):
         """
@@ -52,23 +309,38 @@ class BaseClient(object):
         raises a :class:`BitfinexError` if the response contains a json encoded
         error message.
         
-        A timer has been implemented to limit the time between api calls to 1.5 seconds.
+        Every call waits for a token from a rate limiter, by default the public limiter of one
+        call every 1.5 seconds. Pass limiter to use another one.
+        Timeouts and DDoS protection responses are retried, unless resend=False is passed. Then they
+        raise a BitfinexError, since resending a signed request is not always safe.
+        Pass sign, a function that returns the headers of a signed request, together with sendlock. sign is
+        called after the token was acquired, and the request is sent while holding sendlock, so that the nonces
+        of requests that share sendlock reach the server in increasing order.
         """
         retry = False
         timeout = False
         return_json = kwargs.pop('return_json', False)
+        limiter = kwargs.pop('limiter', self.limiter)
+        resend = kwargs.pop('resend', True)
+        sign = kwargs.pop('sign', None)
+        sendlock = kwargs.pop('sendlock', None)
         while True:
             if retry:
+                if not resend:
+                    raise BitfinexError("The request to {} timed out or was throttled, and was not resent.".format(url))
                 print("Retrying API call.")
-            nowtime = time.time()
-            while self.lastcall + 1.5 > nowtime:
-                nowtime = time.time()
-                time.sleep(0.1)
+            limiter.acquire()
                 
             fullurl = self.api_url + url
             self.lastcall = time.time()
             try:
-                response = func(fullurl, timeout=5, *args, **kwargs)
+                if sign is None:
+                    response = func(fullurl, timeout=5, *args, **kwargs)
+                else:
+                    with sendlock:
+                        kwargs['headers'] = sign()
+                        response = func(fullurl, timeout=5, *args, **kwargs)
+                self.lastduration = time.time() - self.lastcall
                 timeout=False
             except  requests.exceptions.Timeout:
                 print("\nTimeout!")
@@ -114,6 +386,29 @@ class BaseClient(object):
 
 
 class BitfinexPublic(BaseClient):
+    #Limits tried for pages of historical candles, largest first.
+    candle_page_sizes = [10000, 5000, 2500, 1000]
+    #Pages that take longer than slow_page_seconds to download are halved in size. Full pages that take less
+    #than fast_page_seconds are doubled, up to the largest limit the endpoint accepted.
+    slow_page_seconds = 2.5
+    fast_page_seconds = 1.0
+
+    def __init__(self, proxydict=None, cache=None, page_size='auto', ttl=1.0, *args, **kwargs):
+        """
+        proxydict:  Optional dictionary of proxies passed to requests.
+        cache:      Optional CandleCache used for historical candle pages.
+        page_size:  Number of candles per page in get_candle_page, or 'auto' to probe the largest
+                    limit the endpoint accepts and adapt it to the response times.
+        ttl:        Seconds that ticker and last candle responses are reused for. Concurrent identical
+                    calls always share one request. See SingleFlight; its counters are in self.flights.
+        """
+        super(BitfinexPublic, self).__init__(proxydict, *args, **kwargs)
+        self.cache = cache
+        self.flights = SingleFlight(ttl)
+        self.page_size = page_size
+        self.lastduration = None
+        self._pageLimit = None
+        self._maxPageLimit = None
 
     def ticker(self):
         """
@@ -128,12 +423,18 @@ class BitfinexPublic(BaseClient):
         volume (price): Trading volume of the last 24 hours
         timestamp (time) The timestamp at which this information was valid.
         
+        The v2 endpoint returns these as an array:
+        [BID, BID_SIZE, ASK, ASK_SIZE, DAILY_CHANGE, DAILY_CHANGE_RELATIVE, LAST_PRICE, VOLUME, HIGH, LOW]
         """
-        return self._get("v2/ticker/tBTCUSD", return_json=True)
+        url = "v2/ticker/tBTCUSD"
+        return self.flights.do(url, lambda: self._get(url, return_json=True))
     
     def get_last(self):
         """shortcut for last trade"""
-        return float(self.ticker()['last_price'])
+        ticker = self.ticker()
+        if isinstance(ticker, list):
+            return float(ticker[6])
+        return float(ticker['last_price'])
     
     def get_candlesticks(self, timeframe, symbol, section, **kwargs):
         """
@@ -161,7 +462,30 @@ class BitfinexPublic(BaseClient):
                 params += key + '=' + str(value) + "&"
             params = params[:-1]
             
-        result = self._get("v2/candles/trade:{}:{}/{}{}".format(timeframe, symbol, section, params), return_json=True)
+        result = None
+        cacheKey = None
+        if self.cache is not None:
+            if section == 'hist':
+                cacheKey = self.cache.key(timeframe, symbol, section, kwargs)
+                result = self.cache.get(cacheKey)
+                if result is None and self.cache.replay:
+                    head = self.cache.head(timeframe, symbol)
+                    if head is not None and 'start' in kwargs and int(kwargs['start']) > head[0]:
+                        result = [] #Past the newest cached candle, i.e. the end of the data.
+                    else:
+                        raise BitfinexError("Replay mode: the {} candles of {} from {} are not cached.".format(timeframe, symbol, kwargs.get('start')))
+            elif section == 'last' and self.cache.replay:
+                result = self.cache.head(timeframe, symbol)
+                if result is None:
+                    raise BitfinexError("Replay mode: no cached {} candles of {}.".format(timeframe, symbol))
+        if result is None:
+            url = "v2/candles/trade:{}:{}/{}{}".format(timeframe, symbol, section, params)
+            if section == 'last':
+                result = self.flights.do(url, lambda: self._get(url, return_json=True))
+            else:
+                result = self._get(url, return_json=True)
+            if cacheKey is not None and self._isClosedPage(result, timeframe, kwargs):
+                self.cache.put(cacheKey, result, timeframe, symbol)
         
         if len(result)>0:
             if isinstance(result[0], list):
@@ -171,154 +495,215 @@ class BitfinexPublic(BaseClient):
                 result[0] = result[0]/1000
                 result = [result]
         return result
+
+    def get_candle_page(self, timeframe, symbol, start):
+        """
+        Returns the next page of historical candles from start (a timestamp in seconds), oldest first.
+        With page_size 'auto', the first call probes the limits in candle_page_sizes until one is accepted,
+        and later calls adapt the limit to how long the pages take to download.
+        The length of a page says nothing about the end of the data, since the limit changes between calls.
+        """
+        start = int(start)*1000
+        if self.page_size != 'auto':
+            return self.get_candlesticks(timeframe, symbol, 'hist', limit=int(self.page_size), start=start, sort=1)
+        if self.cache is not None and self.cache.replay:
+            #The cached pages may have been fetched with any of the limits.
+            for limit in self.candle_page_sizes:
+                try:
+                    return self.get_candlesticks(timeframe, symbol, 'hist', limit=limit, start=start, sort=1)
+                except BitfinexError as e:
+                    missing = e
+            raise missing
+        if self._pageLimit is None:
+            for limit in self.candle_page_sizes:
+                self.lastduration = None
+                try:
+                    candles = self.get_candlesticks(timeframe, symbol, 'hist', limit=limit, start=start, sort=1)
+                except (BitfinexError, requests.HTTPError):
+                    print("\nA page size of {} candles was not accepted.".format(limit))
+                    continue
+                self._pageLimit = self._maxPageLimit = limit
+                self._adaptPageLimit(len(candles))
+                return candles
+            raise BitfinexError("None of the page sizes {} were accepted.".format(self.candle_page_sizes))
+        self.lastduration = None
+        candles = self.get_candlesticks(timeframe, symbol, 'hist', limit=self._pageLimit, start=start, sort=1)
+        self._adaptPageLimit(len(candles))
+        return candles
+
+    def _adaptPageLimit(self, received):
+        """Halves the page limit after a slow download, and doubles it after a fast, full page."""
+        if self.lastduration is None:
+            return #The page came from the cache.
+        if self.lastduration > self.slow_page_seconds:
+            self._pageLimit = max(self._pageLimit//2, self.candle_page_sizes[-1])
+        elif self.lastduration < self.fast_page_seconds and received >= self._pageLimit:
+            self._pageLimit = min(self._pageLimit*2, self._maxPageLimit)
+
+    def _isClosedPage(self, result, timeframe, params):
+        """
+        Returns True if a page of historical candles can never change: it must be full, i.e. hold
+        as many candles as the requested limit, and its newest candle must have closed.
+        """
+        if 'limit' not in params or len(result) != int(params['limit']) or len(result) == 0:
+            return False
+        if not all(isinstance(candle, list) for candle in result):
+            return False
+        newest = max(candle[0] for candle in result)/1000
+        return newest + timeframe_seconds.get(timeframe, 60*60*24*31) < time.time()
         
         
 class BitfinexTrading(BitfinexPublic):
+    """
+    Client of the authenticated API. It can be shared by many threads: every thread keeps its own connection,
+    and authenticated calls have their own rate limiter, so orders never wait behind the public calls of a
+    candle backfill. The *_async methods return Futures.
+    Bitfinex rejects a nonce that is not larger than the last one it received for the key. A nonce is therefore
+    drawn only after the rate limiter let the request through, and the signed requests of a key are sent one
+    at a time, so that they reach the server in the order of their nonces.
+    """
+    #Authenticated API calls are limited separately from the public ones.
+    auth_rate = 1.5
+    auth_burst = 10
 
-    def __init__(self, key, secret, *args, **kwargs):
+    def __init__(self, key, secret, proxydict=None, nonce_path=None, workers=4, *args, **kwargs):
         """
-        Stores the username, key, and secret which is used when making POST
-        requests to Bitfinex.
+        Stores the key and secret which are used when making POST requests to Bitfinex.
+        proxydict:  Optional dictionary of proxies passed to requests.
+        nonce_path: Optional path of a file shared by all processes that use the same key, see NonceGenerator.
+        workers:    Number of threads that send the requests of the *_async methods.
         """
-        super(Trading, self).__init__(
-                 key=key, secret=secret, *args, **kwargs)
+        super(BitfinexTrading, self).__init__(proxydict, *args, **kwargs)
         self.key = key
         self.secret = secret
+        self.auth_limiter = RateLimiter(self.auth_rate, self.auth_burst)
+        self._nonces = NonceGenerator(nonce_path)
+        #All clients of a key in this process send one signed request at a time, so their nonces arrive in order.
+        with send_locks_lock:
+            self._sendLock = send_locks.setdefault(key, threading.Lock())
+        #The key is hashed into the HMAC once. Every request signs with a copy of it.
+        self._hmac = hmac.new(secret.encode(), digestmod=hashlib.sha384)
+        self._local = threading.local()
+        self._workers = workers
+        self._executor = None
+        self._executorLock = threading.Lock()
 
     def _get_nonce(self):
         """
-        Get a unique nonce for the bitfinex API.
-
-        This integer must always be increasing, so use the current unix time.
-        Every time this variable is requested, it automatically increments to
-        allow for more than one API request per second.
-
-        This isn't a thread-safe function however, so you should only rely on a
-        single thread if you have a high level of concurrent API requests in
-        your application.
+        Get a unique, strictly increasing nonce for the bitfinex API. Safe to call from any thread.
         """
-        nonce = getattr(self, '_nonce', 0)
-        if nonce:
-            nonce += 1
-        # If the unix time is greater though, use that instead (helps low
-        # concurrency multi-threaded apps always call with the largest nonce).
-        self._nonce = max(int(time.time()), nonce)
-        return self._nonce
+        return self._nonces.next()
 
-    def _default_data(self, *args, **kwargs):
-        """
-        Generate a one-time signature and other data required to send a secure
-        POST request to the Bitfinex API.
-        """
-        data = {}
-        nonce = self._get_nonce()
-        data['nonce'] = str(nonce)
-        data['request'] = args[0]
-        return data
+    def _session(self):
+        """Returns the requests session of the calling thread, so connections are reused."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
 
-    def _post(self, *args, **kwargs):
+    def _post(self, path, data=None, return_json=False):
         """
-        Make a POST request.
+        Make a signed POST request to an authenticated v2 endpoint, e.g. 'v2/auth/r/wallets'.
         """
-        data = kwargs.pop('data', {})
-        data.update(self._default_data(*args, **kwargs))
-        
-        key = self.key
-        secret = self.secret
-        payload_json = json.dumps(data)
-        payload = base64.b64encode(payload_json)
-        sig = hmac.new(secret, payload, hashlib.sha384)
-        sig = sig.hexdigest()
-
-        headers = {
-           'X-BFX-APIKEY' : key,
-           'X-BFX-PAYLOAD' : payload,
-           'X-BFX-SIGNATURE' : sig
-           }
-        kwargs['headers'] = headers
-        
-        #print("headers: " + json.dumps(headers))
-        #print("sig: " + sig)
-        #print("api_secret: " + secret)
-        #print("api_key: " + key)
-        #print("payload_json: " + payload_json)
-        return self._request(requests.post, *args, **kwargs)
+        body = json.dumps(data or {}, separators=(',', ':'))
+
+        def sign():
+            #The nonce is drawn only once the request may be sent, see _request.
+            nonce = str(self._get_nonce())
+            signature = self._hmac.copy()
+            signature.update(('/api/' + path + nonce + body).encode())
+            return {
+               'bfx-nonce': nonce,
+               'bfx-apikey': self.key,
+               'bfx-signature': signature.hexdigest(),
+               'content-type': 'application/json'
+               }
+        return self._request(self._session().post, path, data=body, return_json=return_json,
+                             limiter=self.auth_limiter, resend=False, sign=sign, sendlock=self._sendLock)
+
+    def _submit(self, func, *args, **kwargs):
+        """Runs a method in the worker threads and returns its Future."""
+        with self._executorLock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        return self._executor.submit(func, *args, **kwargs)
+
+    def close(self):
+        """Waits for the pending *_async calls and stops the worker threads."""
+        with self._executorLock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
 
     def account_infos(self):
         """
-        Returns dictionary::
-        [{"fees":[{"pairs":"BTC","maker_fees":"0.1","taker_fees":"0.2"},
-        {"pairs":"LTC","maker_fees":"0.0","taker_fees":"0.1"},
-        {"pairs":"DRK","maker_fees":"0.0","taker_fees":"0.1"}]}]
+        Returns the user info array: [ID, EMAIL, USERNAME, ...]
         """
-        return self._post("/v2/account_infos", return_json=True)
+        return self._post("v2/auth/r/info/user", return_json=True)
     
     def balances(self):
         """
-        returns a list of balances
-        A list of wallet balances:
-        type (string): "trading", "deposit" or "exchange".
-        currency (string): Currency 
-        amount (decimal): How much balance of this currency in this wallet
-        available (decimal): How much X there is in this wallet that 
-        is available to trade.
+        returns a list of wallets:
+        [WALLET_TYPE, CURRENCY, BALANCE, UNSETTLED_INTEREST, AVAILABLE_BALANCE, ...]
+        WALLET_TYPE (string): "exchange", "margin" or "funding".
         """
-        return self._post("/v2/balances",return_json=True)
+        return self._post("v2/auth/r/wallets", return_json=True)
     
     def new_order(self, amount=0.01, price=1.11, side='buy',
                   order_type='limit', symbol='btcusd'):
         """
         enters a new order onto the orderbook
         
-        symbol (string): The name of the symbol (see `/symbols`).
+        symbol (string): The name of the symbol, e.g. 'btcusd'.
         amount (decimal): Order size: how much to buy or sell.
-        price (price): Price to buy or sell at. May omit if a market order.
-        exchange (string): "bitfinex".
+        price (price): Price to buy or sell at. Ignored by market orders.
         side (string): Either "buy" or "sell".
-        type (string): Either "market" / "limit" / "stop" / "trailing-stop" / "fill-or-kill" / "exchange market" / "exchange limit" / "exchange stop" / "exchange trailing-stop" / "exchange fill-or-kill". (type starting by "exchange " are exchange orders, others are margin trading orders) 
-        is_hidden (bool) true if the order should be hidden. Default is false.
+        order_type (string): Either "market" / "limit" / "stop" / "trailing-stop" / "fill-or-kill" / "exchange market" / "exchange limit" / "exchange stop" / "exchange trailing-stop" / "exchange fill-or-kill". (type starting by "exchange " are exchange orders, others are margin trading orders) 
         Response
         
-        order_id (int): A randomly generated ID for the order.
-        and the information given by /order/status"""
-        data = {'symbol': str(symbol),
+        A notification array, with the submitted orders in the fifth element."""
+        amount = abs(float(amount)) if side == 'buy' else -abs(float(amount))
+        data = {'symbol': 't' + str(symbol).upper(),
                 'amount': str(amount),
                 'price': str(price),
-                'exchange': 'bitfinex',
-                'side':str(side),
-                'type':order_type
+                'type': order_type.upper()
                 }
-        return self._post("/v2/order/new", data=data, return_json=True)
+        return self._post("v2/auth/w/order/submit", data=data, return_json=True)
+
+    def new_order_async(self, *args, **kwargs):
+        """
+        Like new_order, but returns at once with a Future of the response.
+        """
+        return self._submit(self.new_order, *args, **kwargs)
 
     def orders(self):
         """
-        Returns an array of the results of `/order/status` for all
-        your live orders.
+        Returns an array of all your live orders.
         """
-        return self._post("/v2/orders", return_json=True)
+        return self._post("v2/auth/r/orders", return_json=True)
 
     def cancel_order(self, order_id):
         """
         cancels order with order_id
         """
-        data = {'order_id': str(order_id)}
-        return self._post("/v2/order/cancel",data, return_json=True)
+        data = {'id': int(order_id)}
+        return self._post("v2/auth/w/order/cancel", data=data, return_json=True)
+
+    def cancel_order_async(self, order_id):
+        """
+        Like cancel_order, but returns at once with a Future of the response.
+        """
+        return self._submit(self.cancel_order, order_id)
     
     def cancel_all_orders(self):
         """
         cancels all orders
         """
-        req = self._post('/v2/order/cancel/all', return_json=False)
-        if req.content == "All orders cancelled":
-            return True
-        else:
-            return False
+        result = self._post('v2/auth/w/order/cancel/multi', data={'all': 1}, return_json=True)
+        return isinstance(result, list) and 'SUCCESS' in result
         
     def positions(self):
         """
         gets positions
         """
-        return self._post("/v2/positions", return_json=True)
-
-
-
+        return self._post("v2/auth/r/positions", return_json=True)
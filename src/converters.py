@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
 import time
 import pytz
+import numpy as np
 
 def tsToDt(timestamp, str=False):
     """Converts an integer or float timestamp into a datetime object (UTC).
@@ -35,10 +36,50 @@ def dtToStr(dt):
         return dt.strftime('%Y-%m-%d %H:%M:%S')
     else:
         raise RuntimeError("Datetime provided must be a datetime.datetime class object.")
-        
-        
-        
-        
+
+
+def toTs(value):
+    """Converts any supported scalar time value into a timestamp.
+    Accepts integer or float timestamps (returned unchanged), datetime.datetime objects, datetime strings
+    with the format %Y-%m-%d %H:%M:%S, and numpy.datetime64 values."""
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return value
+    elif isinstance(value, np.datetime64):
+        return int(value.astype('datetime64[s]').astype(np.int64))
+    else:
+        return dtToTs(value)
+
+
+def tsArrayToDt64(timestamps):
+    """Converts an array of integer or float timestamps (e.g. a whole MTS coloumn) into a numpy
+    datetime64[s] array in one vectorised operation. NaN timestamps become NaT."""
+    timestamps = np.asarray(timestamps)
+    if timestamps.dtype.kind == 'f':
+        nan = np.isnan(timestamps)
+        dt64 = np.where(nan, 0, timestamps).astype(np.int64).astype('datetime64[s]')
+        dt64[nan] = np.datetime64('NaT')
+        return dt64
+    return timestamps.astype(np.int64).astype('datetime64[s]')
+
+
+def dt64ToTs(dt64):
+    """Converts an array of numpy datetime64 values into an array of integer timestamps."""
+    return np.asarray(dt64).astype('datetime64[s]').astype(np.int64)
+
+
+def strArrayToTs(strings):
+    """Converts an array of datetime strings with the format %Y-%m-%d %H:%M:%S into an array of
+    integer timestamps (UTC), parsing the whole batch at once."""
+    return dt64ToTs(np.asarray(strings, dtype='datetime64[s]'))
+
+
+def tsArrayToStr(timestamps):
+    """Converts an array of timestamps into an array of human readable strings with the format %Y-%m-%d %H:%M:%S."""
+    dt64 = tsArrayToDt64(timestamps)
+    strings = np.char.replace(np.datetime_as_string(dt64, unit='s'), 'T', ' ', count=1)
+    return np.where(np.isnat(dt64), 'NaT', strings)
+
+
 def selftest():
     """Self test for the converters."""
     now_dt = datetime.utcnow()
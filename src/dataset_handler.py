@@ -1,24 +1,60 @@
 import os
 import sys
+import stat
+import shutil
 import h5py
-import pprint
-import progressbar
 import time
 import math
+import queue
+import threading
 import numpy as np
-import datetime
-from scipy.signal import gaussian
-from colorama import Fore, Back, Style
 sys.path.insert(1, os.path.join(sys.path[0], '..'))
 from src import converters
-import pandas
+from src import features
+from src import encoding
 #Handler class for the HDF5 datasets used in pytrader
+#pandas, scipy, progressbar and colorama are slow to import, and are therefore only imported
+#by the methods that use them. Status queries like latestMTS only need h5py and numpy.
+
+#Length of a single candle of each timebase, in seconds.
+timebase_seconds = {'1m':60, '5m':60*5, '15m':60*15, '30m':60*30, '1h':60*60, '3h':60*60*3, '6h':60*60*6, '12h':60*60*12,
+                    '1D':60*60*24, '7D':60*60*24*7, '14D':60*60*24*14, '1M':60*60*24*31}
+
+#Name of the group in the hdf5 file that holds the sync journal of every timebase.
+journal_group = '_journal'
+#Name of the group in the hdf5 file that holds the stored feature series of every timebase.
+features_group = '_features'
+#Name of the group in the hdf5 file that holds the level-of-detail pyramid of every timebase.
+#Level k of the pyramid holds one row per block of 2^k candles. Each level reduces the level below it by pyramid_factor.
+pyramid_group = '_pyramid'
+pyramid_factor = 4
+#Periods of the sharded layout (see CandlesHandler.shardFile) and the numpy datetime64 unit of each. Each shard file
+#holds the rows of one period of one timebase, in a dataset named shard_dataset.
+shard_periods = {'year': 'Y', 'month': 'M'}
+shard_dataset = 'candles'
+#Temporary names of the new and the old virtual dataset of a sharded timebase while it is rebuilt, see CandlesHandler._buildVirtual.
+virtual_new = '_new_{}'
+virtual_old = '_old_{}'
 
 class CandlesHandler:
     """A dataset handler class that handles the hdf5 files used for storing raw candles data in pytrader.
     A single CandlesHandler can only handle one datafile at a time. """
     
-    def __init__(self, path=None):
+    def __init__(self, path=None, mode="a", encoding="float64", precision=2, volumePrecision=4, shards=None, locking=True):
+        """
+        Parameters
+        ----------
+        path                :   Optional string. Full path of the hdf5 candles file to open.
+        mode="a"            :   Optional string. "a" opens the file for reading and writing, creating it and its datasets if needed.
+                                "r" opens an existing file read-only, without prompting or creating anything.
+        encoding="float64"  :   Optional string. Storage encoding of datasets created in the file: 'float64', 'float32', 'int64' or 'int32'.
+                                See src/encoding.py. Existing datasets keep the encoding they were created with.
+        precision=2         :   Optional integer. Number of price decimals kept by the integer encodings.
+        volumePrecision=4   :   Optional integer. Number of volume decimals kept by the integer encodings.
+        shards=None         :   Optional string. 'year' or 'month'. Datasets created in the file are sharded into one file per
+                                period, see shardFile. Files that are already sharded stay sharded.
+        locking=True        :   Optional boolean. With False, a file opened read-only is not locked, so that other processes can
+                                still open it for writing. The reader must then expect to see changes, see src/server.py."""
         #Initiate variables
         #Check if the dataset exists    
         self.valid_coloumns = ['MTS', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOLUME']
@@ -26,7 +62,18 @@ class CandlesHandler:
         
         self.datafile_path = path      
         self.candlesfile = None
-        self._openHDF5()
+        self.mode = mode
+        self.encoding = encoding
+        self.precision = precision
+        self.volumePrecision = volumePrecision
+        self.shards = shards
+        self.locking = locking
+        self._scalings = {}
+        #Callbacks of subscribe, and the condition that follow waits on for rows appended by this handler.
+        self._subscribers = {}
+        self._nextSubscription = 0
+        self._appended = threading.Condition()
+        self._openHDF5(silent=mode == "r")
 
         
         
@@ -36,7 +83,16 @@ class CandlesHandler:
         ----------
         silent=False  :   Boolean. If true, it will create a dataset if it cannot find one without prompting the user, nor printing anything."""
         
+        self._scalings = {}
         if self.datafile_path is not None:
+            if self.mode == "r":
+                if not os.path.isfile(self.datafile_path):
+                    raise RuntimeError("Could not find the candles file \"{}\".".format(self.datafile_path))
+                if self.locking:
+                    self.candlesfile = h5py.File(self.datafile_path, "r")
+                else:
+                    self.candlesfile = h5py.File(self.datafile_path, "r", locking=False)
+                return
             if not silent:
                 datafile_folder, datafile_name = os.path.split(self.datafile_path)
                 filelist = os.listdir(datafile_folder)
@@ -64,7 +120,22 @@ class CandlesHandler:
                 if r not in existing_objects:
                     if not silent:
                         print("Could not find dataset \"{}\" in the hdf5 file \"{}\". Creating.".format(r, datafile_name))
-                    a.create_dataset(r, (0, 6), maxshape=(None,6), fillvalue=np.NAN)
+                    dtype = encoding.encodings[self.encoding]
+                    attrs = {'encoding': self.encoding}
+                    attrs['scale'], attrs['unit'], attrs['offset'] = encoding.columnScaling(self.encoding, self.precision, self.volumePrecision)
+                    if self.shards is not None or 'shard_period' in a.attrs:
+                        if 'shard_period' not in a.attrs:
+                            self._checkShardPeriod(self.shards)
+                            a.attrs['shard_period'] = self.shards
+                        if self._restoreVirtual(r):
+                            continue
+                        #The shards can already hold rows, e.g. if the file lost its link to the virtual dataset.
+                        attrs['committed_rows'] = self._journalCommittedRows(r, sum(self._shardLengths(r)))
+                        self._buildVirtual(r, attrs=attrs, dtype=dtype)
+                    else:
+                        dataset = a.create_dataset(r, (0, 6), maxshape=(None,6), dtype=dtype, fillvalue=encoding.nanValue(dtype))
+                        for key, value in attrs.items():
+                            dataset.attrs[key] = value
     
     def _pandasToHDF5(self, set, timebase):
         """Takes a pandas dataframe and makes it ready for a save to a hdf5 dataset.
@@ -101,7 +172,389 @@ class CandlesHandler:
                 self.candlesfile = None
             except:
                 pass # Was already closed
-                
+
+    def _journal(self, timebase):
+        """Returns the journal dataset of a timebase, creating it if it does not exist.
+        Every row of the journal describes one page of candles written to the timebase dataset:
+        [first MTS of page, last MTS of page, dataset rows after the page was written, committed (0 or 1)]."""
+        group = self.candlesfile.require_group(journal_group)
+        if timebase not in group:
+            group.create_dataset(timebase, (0, 4), maxshape=(None, 4), dtype=np.float64)
+        return group[timebase]
+
+    def _committedRows(self, timebase):
+        """Returns the number of rows in a timebase dataset that are known to be completely written.
+        Files written before the journal existed have no commit marker. For those, every row up to the
+        last row with a valid MTS is considered committed."""
+        dataset = self.candlesfile[timebase]
+        if 'committed_rows' in dataset.attrs:
+            return int(dataset.attrs['committed_rows'])
+        length = dataset.shape[0]
+        while length > 0 and np.isnan(self._decodeMTS(timebase, dataset[length-1, 0])):
+            length -= 1
+        return length
+
+    def _recoverDataset(self, timebase):
+        """Rolls a timebase dataset back to its last committed page. Rows written after the last commit
+        marker (e.g. by a sync that was killed halfway through a page) are removed, and so is the
+        journal entry of the unfinished page. Returns the number of rows that were removed."""
+        dataset = self.candlesfile[timebase]
+        committed = self._committedRows(timebase)
+        if dataset.is_virtual:
+            #The shards can hold rows that were written before the virtual dataset was rebuilt.
+            removed = sum(self._shardLengths(timebase)) - committed
+            if removed > 0:
+                self._truncateShards(timebase, committed)
+                dataset = self._buildVirtual(timebase)
+        else:
+            removed = dataset.shape[0] - committed
+            if removed > 0:
+                dataset.resize(committed, 0)
+        journal = self._journal(timebase)
+        if journal.shape[0] > 0 and journal[-1, 3] == 0:
+            journal.resize(journal.shape[0]-1, 0)
+        dataset.attrs['committed_rows'] = committed
+        self.candlesfile.flush()
+        return removed
+
+    def _journalCommittedRows(self, timebase, rows):
+        """Returns the number of committed rows of a dataset of the given number of rows, according to its journal: the
+        row count of the last committed page, or all rows if the journal has no committed page (e.g. after a repair)."""
+        if journal_group in self.candlesfile and timebase in self.candlesfile[journal_group]:
+            journal = self.candlesfile[journal_group][timebase][:]
+            committed = journal[journal[:, 3] == 1]
+            if len(committed) > 0:
+                return int(min(rows, committed[-1, 2]))
+        return rows
+
+    def _restoreVirtual(self, timebase):
+        """Finishes or undoes a rebuild of the virtual dataset of a sharded timebase that was interrupted after the old
+        dataset was moved away. Returns True if the timebase dataset was restored."""
+        new, old = virtual_new.format(timebase), virtual_old.format(timebase)
+        file = self.candlesfile
+        if timebase not in file and old in file:
+            file.move(old, timebase)
+        elif timebase not in file and new in file:
+            file.move(new, timebase)
+        for name in (new, old):
+            if name in file:
+                del file[name]
+        return timebase in file
+
+    def _lastCommittedMTS(self, timebase):
+        """Returns the MTS of the last committed row of a timebase dataset, or 0 if the dataset is empty."""
+        committed = self._committedRows(timebase)
+        if committed == 0:
+            return 0
+        return int(self._decodeMTS(timebase, self.candlesfile[timebase][committed-1, 0]))
+
+    def _appendRows(self, timebase, rows):
+        """Appends rows to the end of a timebase dataset as one journaled page.
+        The page is first recorded in the journal as uncommitted. The commit marker is only written after
+        the rows have been flushed to disk, so a crash at any point leaves a file that _recoverDataset
+        can roll back to the previous page.
+        Parameters
+        ----------
+        timebase    :   The timebase of the dataset to append to.
+        rows        :   Array-like of shape (n, 6) in the candles format."""
+        rows = np.asarray(rows, dtype=np.float64)
+        if len(rows) == 0:
+            return
+        dataset = self.candlesfile[timebase]
+        journal = self._journal(timebase)
+        length = dataset.shape[0]
+        entry = journal.shape[0]
+        journal.resize(entry+1, 0)
+        journal[entry, :] = [rows[0, 0], rows[-1, 0], length+len(rows), 0]
+        self.candlesfile.flush()
+
+        encoded = self._encodeRows(timebase, rows)
+        if dataset.is_virtual:
+            #Only the active shard is written to. The virtual dataset is then rebuilt to include the new rows.
+            self._appendShardRows(timebase, encoded, rows[:, 0], self._shardDirectory(timebase))
+            dataset = self._buildVirtual(timebase, appended=True)
+        else:
+            dataset.resize(length+len(rows), 0) #Resize to fit more candles.
+            dataset[length:, :] = encoded #Add candles to the end
+        self.candlesfile.flush()
+
+        #The data is on disk. Write the commit marker.
+        dataset.attrs['committed_rows'] = length+len(rows)
+        journal[entry, 3] = 1
+        self.candlesfile.flush()
+        self._notifyAppended(timebase, encoded)
+
+    def _notifyAppended(self, timebase, encoded):
+        """Passes newly committed rows to the subscribed callbacks, and wakes up follow generators of this handler."""
+        if self._subscribers:
+            rows = self._decodeRows(timebase, encoded)
+            for callback, timebases, clmnIndices in list(self._subscribers.values()):
+                if timebases is None or timebase in timebases:
+                    try:
+                        callback(timebase, rows[:, clmnIndices])
+                    except Exception as e:
+                        #A failing subscriber must not stop the sync.
+                        print("A subscriber of \"{}\" failed: {}: {}".format(timebase, type(e).__name__, e))
+        with self._appended:
+            self._appended.notify_all()
+
+    def _checkShardPeriod(self, period):
+        if period not in shard_periods:
+            raise ValueError("The variable 'period' must be one of the following: {}".format(list(shard_periods)))
+
+    def _shardDirectory(self, timebase):
+        """Returns the directory of the shard files of a timebase: <candles file name>_shards/<timebase>."""
+        return os.path.join(os.path.splitext(os.path.abspath(self.datafile_path))[0] + '_shards', timebase)
+
+    def _shardList(self, directory):
+        """Returns the paths of the shard files in a directory, in time order. Shard files are named after their period,
+        e.g. 2018.hdf5 or 2018-01.hdf5, so sorting the names sorts them in time."""
+        if not os.path.isdir(directory):
+            return []
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith('.hdf5')]
+
+    def _shardLengths(self, timebase, directory=None, known=None):
+        """Returns the number of rows of every shard file of a timebase.
+        known is an optional dictionary {path: rows} of shards whose length is already known, which are not opened."""
+        lengths = []
+        for path in self._shardList(directory or self._shardDirectory(timebase)):
+            if known is not None and path in known:
+                lengths.append(known[path])
+                continue
+            with h5py.File(path, 'r') as f:
+                lengths.append(f[shard_dataset].shape[0])
+        return lengths
+
+    def _unsealShard(self, path):
+        """Makes a sealed shard file writable again."""
+        if os.path.exists(path) and not os.stat(path).st_mode & stat.S_IWUSR:
+            os.chmod(path, os.stat(path).st_mode | stat.S_IWUSR)
+
+    def _sealShards(self, directory):
+        """Makes every shard file but the last (the active shard) read-only."""
+        for path in self._shardList(directory)[:-1]:
+            os.chmod(path, os.stat(path).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    def _removeShards(self, directory):
+        """Deletes a directory of shard files."""
+        for path in self._shardList(directory):
+            self._unsealShard(path)
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+
+    def _appendShardRows(self, timebase, raw, mts, directory):
+        """Appends encoded rows to the shard files in a directory. Every row goes to the shard of the period of its MTS.
+        Rows older than the last shard are kept in the last shard, so that the rows keep the order they were appended in.
+        Parameters
+        ----------
+        timebase    :   The timebase of the rows.
+        raw         :   Array of shape (n, 6) of rows in the storage encoding of the timebase dataset.
+        mts         :   Float64 array of the n decoded MTS values of the rows.
+        directory   :   The directory of the shard files."""
+        unit = shard_periods[self.candlesfile.attrs['shard_period']]
+        shards = self._shardList(directory)
+        codes = converters.tsArrayToDt64(mts).astype('datetime64[' + unit + ']').astype(np.int64)
+        nat = np.datetime64('NaT').astype(np.int64)
+        if shards:
+            active = np.datetime64(os.path.splitext(os.path.basename(shards[-1]))[0], unit).astype(np.int64)
+        else:
+            valid = codes[codes != nat]
+            active = valid[0] if len(valid) > 0 else 0
+        codes = np.maximum.accumulate(np.concatenate(([active], codes)))[1:]
+        dtype = self.candlesfile[timebase].dtype
+        os.makedirs(directory, exist_ok=True)
+        bounds = np.concatenate(([0], np.flatnonzero(codes[1:] != codes[:-1]) + 1, [len(codes)]))
+        written = shards[-1:]
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            name = np.datetime_as_string(np.datetime64(int(codes[a]), unit))
+            path = os.path.join(directory, name + '.hdf5')
+            written.append(path)
+            self._unsealShard(path)
+            with h5py.File(path, 'a') as f:
+                if shard_dataset not in f:
+                    f.create_dataset(shard_dataset, (0, 6), maxshape=(None, 6), dtype=dtype, fillvalue=encoding.nanValue(dtype), chunks=True)
+                stored = f[shard_dataset]
+                length = stored.shape[0]
+                stored.resize(length + b - a, 0)
+                stored[length:, :] = raw[a:b]
+        #Only the shards written to can have to be sealed: the previous active shard, and shards of finished periods.
+        for path in set(written) - {written[-1]}:
+            os.chmod(path, os.stat(path).st_mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+    def _truncateShards(self, timebase, length):
+        """Removes the rows after the first length rows from the shard files of a timebase. Emptied shards are deleted."""
+        directory = self._shardDirectory(timebase)
+        offset = 0
+        for path, rows in zip(self._shardList(directory), self._shardLengths(timebase)):
+            if offset + rows > length:
+                self._unsealShard(path)
+                if offset >= length:
+                    os.remove(path)
+                else:
+                    with h5py.File(path, 'a') as f:
+                        f[shard_dataset].resize(length - offset, 0)
+            offset += rows
+        self._sealShards(directory)
+
+    def _buildVirtual(self, timebase, attrs=None, dtype=None, appended=False):
+        """(Re)creates the dataset of a timebase as a virtual dataset that joins its shard files in time order.
+        The attributes of the existing dataset are kept, unless attrs is given. Returns the new dataset.
+        Shard files are referenced relative to the directory of the candles file, so the two can be moved together.
+        The new dataset is built under a temporary name and then moved in place of the old one, so that the timebase
+        never goes missing; an interrupted rebuild is finished or undone by _restoreVirtual when the file is opened.
+        With appended=True, only rows were appended since the last build, so the lengths of the sealed shards are
+        taken from the old dataset instead of opening every shard file."""
+        file = self.candlesfile
+        folder = os.path.dirname(os.path.abspath(self.datafile_path))
+        known = None
+        if timebase in file:
+            old = file[timebase]
+            dtype = old.dtype
+            if attrs is None:
+                attrs = dict(old.attrs)
+            if appended and old.is_virtual:
+                sources = old.virtual_sources()
+                #The last source can have grown, so it is always opened. The rows of a source are found from where it is
+                #mapped in the virtual dataset, since the shape of its own dataspace is not stored in the file.
+                known = {}
+                for source in sources[:-1]:
+                    (first, _), (last, _) = source.vspace.get_select_bounds()
+                    known[os.path.normpath(os.path.join(folder, source.file_name))] = last - first + 1
+        paths = self._shardList(self._shardDirectory(timebase))
+        lengths = self._shardLengths(timebase, known=known)
+        layout = h5py.VirtualLayout(shape=(sum(lengths), 6), dtype=dtype)
+        offset = 0
+        for path, rows in zip(paths, lengths):
+            if rows > 0:
+                layout[offset:offset+rows] = h5py.VirtualSource(os.path.relpath(path, folder), shard_dataset, shape=(rows, 6))
+            offset += rows
+        new, previous = virtual_new.format(timebase), virtual_old.format(timebase)
+        if new in file:
+            del file[new]
+        dataset = file.create_virtual_dataset(new, layout, fillvalue=encoding.nanValue(dtype))
+        for key, value in (attrs or {}).items():
+            dataset.attrs[key] = value
+        if timebase in file:
+            file.move(timebase, previous)
+        file.move(new, timebase)
+        if previous in file:
+            del file[previous]
+        return file[timebase]
+
+    def _scaling(self, timebase):
+        """Returns the (scale, unit, offset) arrays of the encoding of a timebase dataset, or None if its values are stored as they are."""
+        if timebase not in self._scalings:
+            attrs = self.candlesfile[timebase].attrs
+            if attrs.get('encoding', 'float64') == 'float64':
+                self._scalings[timebase] = None
+            else:
+                self._scalings[timebase] = (np.asarray(attrs['scale']), np.asarray(attrs['unit']), np.asarray(attrs['offset']))
+        return self._scalings[timebase]
+
+    def _encodeRows(self, timebase, rows):
+        """Encodes float64 rows in the candles format into the storage encoding of a timebase dataset."""
+        scaling = self._scaling(timebase)
+        if scaling is None:
+            return np.asarray(rows, dtype=np.float64)
+        return encoding.encode(rows, self.candlesfile[timebase].dtype, *scaling)
+
+    def _decodeRows(self, timebase, raw):
+        """Decodes rows read from a timebase dataset into float64 values in the candles format."""
+        scaling = self._scaling(timebase)
+        if scaling is None:
+            return np.asarray(raw, dtype=np.float64)
+        return encoding.decode(raw, *scaling)
+
+    def _decodeMTS(self, timebase, raw):
+        """Decodes stored values of the MTS coloumn of a timebase dataset into float64 timestamps."""
+        scaling = self._scaling(timebase)
+        if scaling is None:
+            return np.asarray(raw, dtype=np.float64)
+        scale, unit, offset = scaling
+        return encoding.decode(raw, scale[0], unit[0], offset[0])
+
+    def _readRaw(self, timebase, startIndex=None, endIndex=None, coloumns=slice(None)):
+        """Reads the stored values of the rows startIndex:endIndex (python slice semantics) of a timebase dataset.
+        An empty range gives an empty array, since HDF5 cannot read an empty selection of a virtual dataset."""
+        dataset = self.candlesfile[timebase]
+        startIndex, endIndex, _ = slice(startIndex, endIndex).indices(dataset.shape[0])
+        if endIndex <= startIndex:
+            return np.zeros((0, 6), dtype=dataset.dtype)[:, coloumns]
+        return dataset[startIndex:endIndex, coloumns]
+
+    def _readRows(self, timebase, startIndex, endIndex):
+        """Reads the rows startIndex:endIndex of a timebase dataset straight from the hdf5 file.
+        Returns a float64 array of shape (n, 6) in the candles format."""
+        return self._decodeRows(timebase, self._readRaw(timebase, startIndex, endIndex))
+
+    def _writeRows(self, timebase, startIndex, rows):
+        """Overwrites existing rows of a timebase dataset, starting at startIndex, with float64 rows in the candles format."""
+        dataset = self.candlesfile[timebase]
+        if not dataset.is_virtual:
+            dataset[startIndex:startIndex+len(rows), :] = self._encodeRows(timebase, rows)
+            return
+        #The rows are written straight into the shards that hold them.
+        raw = self._encodeRows(timebase, rows)
+        directory = self._shardDirectory(timebase)
+        offset = 0
+        for path, length in zip(self._shardList(directory), self._shardLengths(timebase)):
+            a = max(startIndex, offset)
+            b = min(startIndex + len(rows), offset + length)
+            if a < b:
+                self._unsealShard(path)
+                with h5py.File(path, 'a') as f:
+                    f[shard_dataset][a-offset:b-offset, :] = raw[a-startIndex:b-startIndex]
+            offset += length
+        self._sealShards(directory)
+
+    def _searchMTS(self, timebase, ts, right=False):
+        """Binary search for a timestamp among the committed rows of a timebase dataset.
+        Only reads the O(log n) MTS values it needs from the file, instead of the whole MTS coloumn.
+        Returns the index of the first row with MTS >= ts, or with MTS > ts if right=True."""
+        dataset = self.candlesfile[timebase]
+        lo = 0
+        hi = self._committedRows(timebase)
+        while lo < hi:
+            mid = (lo + hi)//2
+            mts = self._decodeMTS(timebase, dataset[mid, 0])
+            if mts < ts or (right and mts == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _indexRange(self, timebase, start=None, end=None):
+        """Returns the index range [startIndex, endIndex) of the committed rows of a timebase dataset with
+        start <= MTS <= end. Start and end follow the same formats as in getDataset, and may be omitted."""
+        if timebase not in self.valid_timebases:
+            raise ValueError("The variable 'timebase' must be one of the following: {}".format(self.valid_timebases))
+        startIndex = 0
+        endIndex = self._committedRows(timebase)
+        if start is not None:
+            startIndex = self._searchMTS(timebase, float(converters.toTs(start)))
+        if end is not None:
+            endIndex = self._searchMTS(timebase, float(converters.toTs(end)), right=True)
+        return startIndex, max(startIndex, endIndex)
+
+    def _coloumnIndices(self, coloumns):
+        """Returns the dataset coloumn indices and names of a coloumns parameter as used by getDataset:
+        either the string 'ALL', or a list of coloumn names."""
+        if isinstance(coloumns, str):
+            if coloumns == "ALL":
+                coloumns = self.valid_coloumns
+            else:
+                raise RuntimeError("\"{}\" is not a valid value for the parameter \"coloumns\".".format(coloumns))
+        for a in coloumns:
+            if a not in self.valid_coloumns:
+                raise RuntimeError("\"{}\" is not a valid element of the parameter \"coloumns\". Valid values are: {}".format(a, self.valid_coloumns))
+        return [self.valid_coloumns.index(a) for a in coloumns], list(coloumns)
+
+    def _updateDerived(self, timebase, fromIndex=None):
+        """Brings everything derived from a timebase dataset up to date after it has been written to.
+        Pass fromIndex if rows before the end of the dataset were modified."""
+        self.updateFeatures(timebase, fromIndex=fromIndex)
+        self.updatePyramid(timebase, fromIndex=fromIndex, create=False)
+
     def latestMTS(self):
         """Returns a dictionary of the latest MTS timestamps of each dataset in the currently open datafile.
         If no datafile is open, a warning is thrown and all MTS fields will be zero.
@@ -113,33 +566,35 @@ class CandlesHandler:
         else:
             for timebase in self.valid_timebases:
                 try:
-                    MTSdict[timebase] = self.candlesfile[timebase][-1,0]
+                    MTSdict[timebase] = self._lastCommittedMTS(timebase)
                 except:
                     pass
             return MTSdict
-            
+
     def syncDatafile(self, client):
         #updates the dataset so that it contains all candles for all time.
         #This takes a long time to run the first time.
+        #Every fetched page is journaled, so a sync that is killed halfway resumes from the last committed page.
+        import progressbar
+        from colorama import Fore
         file = self.candlesfile
-        for dataset_name in file.keys():
+        for dataset_name in self.valid_timebases:
             print(Fore.CYAN + "Checking the following dataset: {}".format(dataset_name))
             dataset = file[dataset_name]
-            
-            #Grab the most recent candle timestamp 
+            removed = self._recoverDataset(dataset_name)
+            if removed > 0:
+                print(Fore.YELLOW + "Removed {} uncommitted rows left by an interrupted sync.".format(removed))
+
+            #Grab the most recent candle timestamp
             newestts = client.get_candlesticks(dataset_name, 'tBTCUSD', 'last')[0][0]
             #Check if it matches the most current timestamp of the corresponding dataset
-            try:
-                latest_time = int(dataset[-1][0]) #Get the latest timestamp
-            except ValueError:
-                #In case of indexerror, the dataset has no data. Likely because it has just been created.            
-                latest_time = 0   
-            
+            latest_time = self._lastCommittedMTS(dataset_name) #Get the latest timestamp
+
             if latest_time != 0:
-                latest_time_readable = datetime.datetime.fromtimestamp(int(latest_time)).strftime('%Y-%m-%d %H:%M:%S')
+                latest_time_readable = converters.tsToDt(int(latest_time), str=True)
             else:
                 latest_time_readable = "Dataset is empty!"
-            newestts_readable = datetime.datetime.fromtimestamp(int(newestts)).strftime('%Y-%m-%d %H:%M:%S')
+            newestts_readable = converters.tsToDt(int(newestts), str=True)
             print("Latest dataset timestamp: {}\tLatest exchange timestamp: {}\t==>\t".format(latest_time_readable, newestts_readable), end='')
             
             #We add 2 minute to each side to allow for errors in going from float to int
@@ -147,9 +602,9 @@ class CandlesHandler:
                 print(Fore.GREEN + "The dataset is up to date.\n".format(dataset_name))
             else:         
                 print(Fore.YELLOW + "The dataset is not up to date.".format(dataset_name))            
-                #We get the maximum amount of allowed candles (up to 1000) from bitfinex that are available 
-                #since the last candle was added to the dataset.
-                candles = client.get_candlesticks(dataset_name, 'tBTCUSD', 'hist', limit=1000, start=int(latest_time+1)*1000, sort=1) 
+                #We get a page of candles from bitfinex that are available since the last candle was added
+                #to the dataset. The client decides the size of the page.
+                candles = client.get_candle_page(dataset_name, 'tBTCUSD', latest_time+1)
                 
                 print(Fore.GREEN + "SYNCHRONIZING WITH BITFINEX...", end='')
                 if latest_time == 0:
@@ -164,75 +619,49 @@ class CandlesHandler:
                 else:
                     candlesOldestTs = candles[0][0] 
                 tsdiff = newestts - candlesOldestTs
-                #Divide tsdiff (ms) with a number to get it into the timescale of the current dataset.
-                if dataset_name == '1m':
-                   s = (60)
-                if dataset_name == '5m':
-                   s = (60*5)   
-                if dataset_name == '15m':
-                   s = (60*15)   
-                if dataset_name == '30m':
-                   s = (60*30)    
-                if dataset_name == '1h':
-                   s = (60*60)
-                if dataset_name == '3h':
-                   s = (60*60*3)   
-                if dataset_name == '6h':
-                   s = (60*60*6)   
-                if dataset_name == '12h':
-                   s = (60*60*12)    
-                if dataset_name == '1D':
-                   s = (60*60*24)
-                if dataset_name == '7D':
-                   s = (60*60*24*7)   
-                if dataset_name == '14D':
-                   s = (60*60*24*14)   
-                if dataset_name == '1M':
-                   s = (60*60*24*31)    
-                   
-                callsNeeded = int(tsdiff/(s*1000))+1 #multiply s with 1000 since we get 1000 candles at a time
-                if callsNeeded > 0:
-                    bar = progressbar.ProgressBar(max_value=callsNeeded)
-                    bar.update(0)
-                    time.sleep(0.05) #Hack to get it to work
-                    bar.update(1)
-                callno = 0   
+                #Divide tsdiff (s) with the length of a candle to get the number of candles to fetch.
+                #The page size changes between calls, so the progress bar counts candles instead of calls.
+                s = timebase_seconds[dataset_name]
+
+                candlesNeeded = int(tsdiff/s)+1
+                bar = progressbar.ProgressBar(max_value=candlesNeeded)
+                bar.update(0)
+                candlesFetched = 0
+                callno = 0
                 finalCall = False
                 while True:
-                    try:
-                        latest_time = int(dataset[-1][0]) #Get the latest timestamp of the dataset
-                    except ValueError:
-                        #In case of indexerror, the dataset has no data. Likely because it has just been created.
-                        latest_time = 0
-                    
+                    latest_time = self._lastCommittedMTS(dataset_name) #Get the latest timestamp of the dataset
+
                     if callno > 0 and not finalCall:
-                        #We get the maximum amount of allowed candles (up to 1000) from bitfinex that are available 
-                        #since the last candle was added to the dataset.
-                        candles = client.get_candlesticks(dataset_name, 'tBTCUSD', 'hist', limit=1000, start=int(latest_time+1)*1000, sort=1)
-                    
+                        #We get the next page of candles that are available since the last candle was added to the dataset.
+                        candles = client.get_candle_page(dataset_name, 'tBTCUSD', latest_time+1)
+
                     if finalCall:
-                        #Some candle api calls are buggy and will not return the very last candle. 
+                        #Some candle api calls are buggy and will not return the very last candle.
                         #We use this if-case to check if it was obtained.
                         candles = client.get_candlesticks(dataset_name, 'tBTCUSD', 'last')
-                        if candles[0][0] != latest_time:
-                            dataset.resize(dataset.len()+len(candles), 0) #Resize to fit more candles.
-                            dataset[-len(candles):, :] = candles #Add candles to the end
+                        if candles[0][0] > latest_time:
+                            self._appendRows(dataset_name, candles)
                         break
-                        
-                    #print("Candles returned: {}".format(len(candles)))
-                    if len(candles)<1000:
-                        finalCall = True
 
                     callno += 1
-                    if callno <= callsNeeded:
-                        bar.update(callno)
+                    #Only keep candles that are newer than the last committed one, so that an overlapping page
+                    #never writes duplicate timestamps.
+                    candles = [candle for candle in candles if candle[0] > latest_time]
+                    #We have reached the end of the data when a page has no new candles, or when it reaches the
+                    #newest candle of the exchange. This does not depend on the size of the pages.
+                    if len(candles)==0 or max(candle[0] for candle in candles) >= newestts:
+                        finalCall = True
+
+                    candlesFetched += len(candles)
+                    bar.update(min(candlesFetched, candlesNeeded))
                     if len(candles)!=0:
                         #print("Got {} candles from the period {}-{}".format(len(candles), candles[0][0], candles[-1][0]))
-                        dataset.resize(dataset.len()+len(candles), 0) #Resize to fit more candles.
-                        dataset[-len(candles):, :] = candles #Add candles to the end
+                        self._appendRows(dataset_name, candles)
+                self._updateDerived(dataset_name)
                 print(Fore.GREEN + "\nDone!\n")
                           
-    def getDataset(self, timebase, coloumns, start=None, end=None, startIndex=None, endIndex=None, length=None):
+    def getDataset(self, timebase, coloumns, start=None, end=None, startIndex=None, endIndex=None, length=None, index=False):
         """Returns the dataset specified as a pandas dataframe.
         Provide the third variable as an array of coloumn names that correspond to the coloumns you
         wish to have returned. Valid options are: 'ALL' (gives as str, not arr), or any combination of 
@@ -240,8 +669,8 @@ class CandlesHandler:
         
         Give the optional parameters start and end to get slice of dataset.
         There will be no candles returned before start, and no candles after end.
-        Start and end can be either integer timestamps, datetime objects, or strings following this
-        format: '%Y-%m-%d %H:%M:%S'.
+        Start and end can be either integer timestamps, datetime objects, numpy datetime64 values, or strings
+        following this format: '%Y-%m-%d %H:%M:%S'.
         
         You can also supply the parameters startIndex and endIndex if you know exactly
         the indeces of the dataset subset you wish to extract. This is much faster than
@@ -259,12 +688,14 @@ class CandlesHandler:
         startIndex  : Optional. Start index of dataset. Faster than supplying the variable start. Used when you already know the start-index of your desired dataset.
         endIndex    : Optional. End index of dataset. Follows same logic as the parameter startIndex.
         length      : Optional. Length of the dataset you wish to have returned. 
+        index=False : Optional boolean. If True, the returned dataframe is indexed by a DatetimeIndex (UTC) built from the MTS coloumn.
         
         Return
         ------
         dataframe   : Pandas dataframe containing the requested dataset.
         
         """
+        import pandas
         
         returnAllClmns = False
         #Check of coloumns are valid
@@ -295,10 +726,10 @@ class CandlesHandler:
                 
         #If the parameters start or end are given, we check if they are given as datetimes or str and if
         #so, they are converted to timestamps.
-        if isinstance(start, datetime.datetime) or isinstance(start, str):
-            start = converters.dtToTs(start)
-        if isinstance(end, datetime.datetime) or isinstance(end, str):
-            end = converters.dtToTs(end)   
+        if start is not None:
+            start = converters.toTs(start)
+        if end is not None:
+            end = converters.toTs(end)
             
         #Start the extraction of data
         if timebase in self.candlesfile.keys():
@@ -307,7 +738,7 @@ class CandlesHandler:
             #We employ the fact that the candles datasets are sorted in time to locate the indeces
             #needed to extract a specific subset of.
             if tsGiven:
-                timestamps = fullset[:,0] #Very slow! 
+                timestamps = self._decodeMTS(timebase, self._readRaw(timebase, coloumns=0)) #Very slow! 
                 if start is not None:
                     startIndex = np.searchsorted(timestamps, float(start))+1
                 if end is not None:
@@ -338,9 +769,9 @@ class CandlesHandler:
              
             if not tsGiven and not indecesGiven:
                 #We work on the entire dataset.
-                reducedset = fullset
+                reducedset = self._decodeRows(timebase, self._readRaw(timebase))
             else:
-                reducedset = fullset[startIndex:endIndex,:]
+                reducedset = self._decodeRows(timebase, self._readRaw(timebase, startIndex, endIndex))
                 
             #We then grab the coloumns that were requested, and return them in the order they were requested.
             if not returnAllClmns:
@@ -369,8 +800,12 @@ class CandlesHandler:
                         returnset[:,n] = reducedset[:,i]
                     n += 1
                     
-                return pandas.DataFrame(returnset, columns=coloumns)
-            return pandas.DataFrame(reducedset , columns=self.valid_coloumns)
+                dataframe = pandas.DataFrame(returnset, columns=coloumns)
+            else:
+                dataframe = pandas.DataFrame(reducedset[:], columns=self.valid_coloumns)
+            if index:
+                dataframe.index = pandas.DatetimeIndex(converters.tsArrayToDt64(reducedset[:, 0]), name='DATETIME')
+            return dataframe
         else:
             raise RuntimeError("No dataset named \"{}\".".format(timebase))          
             
@@ -437,7 +872,8 @@ class CandlesHandler:
                 raise RuntimeError("""Could not save data to file, since the file path specifier 
                 in the candles handler was empty. You must set the file path first: candlesHandler.datafile_path = full path to file""")
         
-        #Open the correct dataset in the datafile.
+        #Open the correct dataset in the datafile, dropping any rows left uncommitted by an interrupted write.
+        self._recoverDataset(timebase)
         candles_dataset = self.candlesfile[timebase]
         #Find its length
         length = candles_dataset.shape[0]
@@ -445,23 +881,22 @@ class CandlesHandler:
         print(saveSet)
         saveset_length = len(saveSet)
         if mode == 'append':
-            candles_dataset.resize(length + len(saveSet), 0)
-            candles_dataset[-saveset_length:,:] = saveSet
+            self._appendRows(timebase, saveSet)
         else:
             #We are either in mode skip or overwrite.
             mode_is_replace = mode == 'replace'
             set_startMts = saveSet[0][0]
-            file_startIndex = np.searchsorted(candles_dataset[:, 0], set_startMts) #Index of the first coloumn where data is to be inserted.
+            file_startIndex = np.searchsorted(self._decodeMTS(timebase, self._readRaw(timebase, coloumns=0)), set_startMts) #Index of the first coloumn where data is to be inserted.
             print("file_startIndex: {}".format(file_startIndex))
             growSize = saveset_length - (length - file_startIndex)
             growSize_indexer = -growSize
             print("growSize: {}".format(growSize))
             save_indexEnd = candles_dataset.shape[0]
             if growSize > 0:
-                #Start by resizing the datafile.
-                candles_dataset.resize(length + growSize, 0)
-                #save non-overlapping areas.
-                candles_dataset[-growSize:, :] = saveSet[-growSize:][:]
+                #Save non-overlapping areas at the end of the datafile.
+                self._appendRows(timebase, saveSet[-growSize:])
+                #A sharded dataset is replaced by the append, so its new length is read from the file.
+                save_indexEnd = self.candlesfile[timebase].shape[0]
             elif growSize==0:
                 #Need to create a growsize that is nonetype if it is actually 0.
                 #Also create a negative 
@@ -476,25 +911,819 @@ class CandlesHandler:
                 #If mode is skip, we're all done.
                 #Else we save the overlapping parts.
                 if mode_is_replace:
-                    candles_dataset[file_startIndex:save_indexEnd,:] = saveSet[:growSize_indexer]
+                    self._writeRows(timebase, file_startIndex, saveSet[:growSize_indexer])
             else:
-                #Otherwise, saving overlap parts of the set must be done element by element.
-                for k in range(6):
-                    for n in range(file_startIndex, save_indexEnd):
-                        setVal = saveSet[n-file_startIndex,k]
-                        print("setVal: {}".format(setVal))
-                        if mode_is_replace:
-                            if not np.isnan(setVal):
-                                #Mode is overwrite, and set value is not NAN. We overwrite value in file.
-                                candles_dataset[n,k] = setVal
-                        else:
-                            if np.isnan(candles_dataset[n,k]):
-                                #Mode is skip, and file value is NAN. We overwrite value in file.
-                                candles_dataset[n,k] = setVal
-                    
+                #Otherwise, the overlapping parts of the set are merged value by value with the file.
+                fileVals = self._readRows(timebase, file_startIndex, save_indexEnd)
+                setVals = saveSet[:save_indexEnd-file_startIndex]
+                if mode_is_replace:
+                    #Mode is overwrite. Where the set value is not NaN, we overwrite the value in the file.
+                    merged = np.where(np.isnan(setVals), fileVals, setVals)
+                else:
+                    #Mode is skip. Where the file value is NaN, we overwrite it with the set value.
+                    merged = np.where(np.isnan(fileVals), setVals, fileVals)
+                self._writeRows(timebase, file_startIndex, merged)
+        #Bring stored features up to date with the saved rows.
+        if mode == 'append':
+            self._updateDerived(timebase)
+        else:
+            self._updateDerived(timebase, fromIndex=file_startIndex)
+
+    def iterDataset(self, timebase, coloumns='ALL', start=None, end=None, chunkRows=1000000, overlap=0, asPandas=True, prefetch=True):
+        """Iterates over a dataset in consecutive blocks read straight from the hdf5 file, so that a single
+        pass over the complete history never holds more than a couple of blocks in memory.
+
+        Every block holds up to chunkRows new rows. With overlap > 0, each block after the first is prefixed
+        with the last overlap rows of the previous block, which is what rolling computations need.
+        
+        Parameters
+        ----------
+        timebase            : The timebase of the candles dataset you want. Valid options: '1m', '5m', '15m', '30m', '1h', '3h', '6h', '12h', '1D', '7D', '14D', '1M'
+        coloumns='ALL'      : The coloumns you want. Either the string 'ALL', or an array of any of the following values: 'MTS', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOLUME'.
+        start, end          : Optional. Only rows with start <= MTS <= end are returned. Same formats as in getDataset.
+        chunkRows=1000000   : Integer. Number of new rows in each block.
+        overlap=0           : Integer. Number of rows from the previous block to repeat at the beginning of each block.
+        asPandas=True       : Boolean. If True, blocks are pandas dataframes. If False, they are 2D numpy arrays with the coloumns in the requested order.
+        prefetch=True       : Boolean. If True, the next block is read in a background thread while the current one is processed.
+        
+        Yields
+        ------
+        block               : Pandas dataframe or numpy array with the rows of the next block.
+        """
+        if chunkRows < 1:
+            raise RuntimeError("chunkRows must be positive and greater than 0.")
+        if overlap < 0:
+            raise RuntimeError("overlap must be 0 or greater.")
+        clmnIndices, clmnNames = self._coloumnIndices(coloumns)
+        startIndex, endIndex = self._indexRange(timebase, start, end)
+
+        def blocks():
+            pos = startIndex
+            while pos < endIndex:
+                readStart = max(startIndex, pos - overlap)
+                readEnd = min(endIndex, pos + chunkRows)
+                block = self._readRows(timebase, readStart, readEnd)[:, clmnIndices]
+                if asPandas:
+                    import pandas
+                    block = pandas.DataFrame(block, columns=clmnNames)
+                yield block
+                pos = readEnd
+
+        if prefetch:
+            return readAhead(blocks())
+        return blocks()
+
+    def iterWindows(self, timebase, coloumns='ALL', window=60, stride=1, horizon=0, batchSize=1024, start=None, end=None,
+                    normalized=True, chunkRows=1000000, prefetch=True):
+        """Iterates over batches of sliding windows of a dataset, e.g. to build training sets. The windows are strided
+        views of blocks read with iterDataset, so no window is copied unless it is normalized.
+
+        A window holds window consecutive rows. The first windows start at the first row, and every next window starts
+        stride rows later. With horizon > 0, every window also has a target: the row horizon rows after its last row.
+        Windows whose target is past the end of the data are left out.
+        Batches hold up to batchSize windows. The last batch of every block of chunkRows rows can be shorter.
+
+        Parameters
+        ----------
+        timebase            : The timebase of the candles dataset you want. Valid options: '1m', '5m', '15m', '30m', '1h', '3h', '6h', '12h', '1D', '7D', '14D', '1M'
+        coloumns='ALL'      : The coloumns you want. Either the string 'ALL', or an array of any of the following values: 'MTS', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOLUME'.
+        window=60           : Integer. Number of rows in each window.
+        stride=1            : Integer. Number of rows between the starts of consecutive windows.
+        horizon=0           : Integer. Distance in rows from the last row of a window to its target. 0 gives no targets.
+        batchSize=1024      : Integer. Maximum number of windows in each batch.
+        start, end          : Optional. Only rows with start <= MTS <= end are used. Same formats as in getDataset.
+        normalized=True     : Boolean. If True, windows and targets are normalized to percent change from the first row of
+                              their window with normalizeBatch. The MTS and VOLUME coloumns are left as they are: a percent
+                              change of a timestamp means nothing, and the volume of the first candle is often 0.
+                              If False, windows are read-only views of the block.
+        chunkRows=1000000   : Integer. Number of new rows read from the file at a time.
+        prefetch=True       : Boolean. If True, the next batches are prepared in a background thread while the current one is processed.
+
+        Yields
+        ------
+        windows             : Numpy array of shape (batch, window, coloumns).
+        targets             : Numpy array of shape (batch, coloumns), or None if horizon is 0.
+        """
+        if window < 1 or stride < 1 or batchSize < 1:
+            raise RuntimeError("window, stride and batchSize must be positive and greater than 0.")
+        if horizon < 0:
+            raise RuntimeError("horizon must be 0 or greater.")
+        span = window + horizon
+        chunkRows = max(chunkRows, span)
+        _, clmnNames = self._coloumnIndices(coloumns)
+        keep = [n for n, name in enumerate(clmnNames) if name in ('MTS', 'VOLUME')]
+
+        def batches():
+            blockStart = 0 #Position of the first row of the block, relative to the first row of the data.
+            nextWindow = 0 #Position of the first row of the next window.
+            for block in self.iterDataset(timebase, coloumns, start=start, end=end, chunkRows=chunkRows, overlap=span - 1,
+                                          asPandas=False, prefetch=False):
+                blockEnd = blockStart + len(block)
+                #Windows that end with their target inside the block.
+                first = nextWindow - blockStart
+                count = max(0, (len(block) - span - first)//stride + 1) if first + span <= len(block) else 0
+                if count:
+                    views = np.lib.stride_tricks.sliding_window_view(block, window, axis=0).transpose(0, 2, 1)
+                    for a in range(0, count, batchSize):
+                        positions = first + stride*np.arange(a, min(count, a + batchSize))
+                        windows = views[positions[0]:positions[-1] + 1:stride]
+                        targets = block[positions + window - 1 + horizon] if horizon else None
+                        if normalized:
+                            if targets is not None:
+                                targets = normalizeBatch(targets[:, np.newaxis], keep=keep, first=windows[:, :1])[:, 0]
+                            windows = normalizeBatch(windows, keep=keep)
+                        yield windows, targets
+                    nextWindow += count*stride
+                blockStart = max(0, blockEnd - (span - 1))
+
+        if prefetch:
+            return readAhead(batches(), depth=2)
+        return batches()
+
+    def subscribe(self, callback, timebases=None, coloumns='ALL'):
+        """Registers a callback that is called with the new rows every time rows are committed to a timebase by this
+        handler, e.g. after every page of a sync. It is called as callback(timebase, rows) in the writing thread, where
+        rows is a float64 numpy array with the requested coloumns. Exceptions raised by the callback are printed and ignored.
+        Only writes made through this handler are seen. Use follow for rows written by other processes.
+
+        Parameters
+        ----------
+        callback        : Function called as callback(timebase, rows).
+        timebases=None  : Optional list of timebases. By default, appends to every timebase are passed to the callback.
+        coloumns='ALL'  : The coloumns passed to the callback. Either the string 'ALL', or an array of coloumn names.
+
+        Returns
+        -------
+        subscription    : Integer. Pass it to unsubscribe to remove the callback."""
+        clmnIndices, _ = self._coloumnIndices(coloumns)
+        if timebases is not None:
+            for timebase in timebases:
+                if timebase not in self.valid_timebases:
+                    raise ValueError("The variable 'timebases' may only contain the following: {}".format(self.valid_timebases))
+            timebases = set(timebases)
+        subscription = self._nextSubscription
+        self._nextSubscription += 1
+        self._subscribers[subscription] = (callback, timebases, clmnIndices)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Removes a callback registered with subscribe."""
+        self._subscribers.pop(subscription, None)
+
+    def _fileStamp(self):
+        """Returns the modification time and size of the candles file, which change whenever a writer flushes it."""
+        info = os.stat(self.datafile_path)
+        return info.st_mtime_ns, info.st_size
+
+    def _followStep(self, timebases, clmnIndices, seen, state):
+        """Returns a list of (timebase, rows) with the rows committed after seen[timebase], and moves seen forward.
+        A read-only file is reopened when it changed on disk, since it would otherwise keep showing the rows it had when
+        it was opened. The growth of a dataset is found from its commit marker, without reading any rows."""
+        if self.mode == "r":
+            stamp = self._fileStamp()
+            if stamp == state.get('stamp'):
+                return []
+            self.close()
+            self._openHDF5(silent=True)
+            state['stamp'] = stamp
+        new = []
+        try:
+            for timebase in timebases:
+                committed = self._committedRows(timebase)
+                if committed < seen[timebase]:
+                    #The dataset was rolled back or rebuilt shorter. Continue from its new end.
+                    seen[timebase] = committed
+                if committed > seen[timebase]:
+                    new.append((timebase, self._readRows(timebase, seen[timebase], committed)[:, clmnIndices]))
+                    seen[timebase] = committed
+        except (OSError, KeyError):
+            #The file can be unreadable while another process writes to it. It is read again after the next change.
+            if self.mode != "r":
+                raise
+            state['stamp'] = None
+            return []
+        return new
+
+    def _followState(self, timebases, coloumns, seen):
+        if isinstance(timebases, str):
+            timebases = [timebases]
+        for timebase in timebases:
+            if timebase not in self.valid_timebases:
+                raise ValueError("The variable 'timebases' may only contain the following: {}".format(self.valid_timebases))
+        clmnIndices, _ = self._coloumnIndices(coloumns)
+        seen = {} if seen is None else seen
+        for timebase in timebases:
+            if timebase not in seen:
+                seen[timebase] = self._committedRows(timebase)
+        #No stamp, so that the first step reads the file even if it has not changed since it was opened.
+        state = {'stamp': None}
+        return timebases, clmnIndices, seen, state
+
+    def follow(self, timebases, coloumns='ALL', seen=None, interval=0.5, timeout=None):
+        """Yields the rows appended to one or more timebases as they are committed, so that a consumer does not have to
+        poll latestMTS and query getDataset again.
+
+        The rows seen so far are kept in the dictionary seen, {timebase: number of rows}, which is updated after every
+        yield. Pass the same dictionary again to continue where a previous follow stopped. Timebases missing from seen
+        start at their current end, so only new rows are yielded.
+        Rows appended by this handler wake the generator at once. Rows appended by another process are found within
+        interval seconds. For that, the follower must open the file with mode="r" and locking=False: the writer can not
+        open a file that another process holds locked, and an open hdf5 file does not show changes made by others, so the
+        follower reopens it whenever its modification time or size changes. Only appended rows are followed. Rows
+        that are overwritten in place (saveDataset mode 'replace', repair) are not yielded again.
+
+        Parameters
+        ----------
+        timebases       : A timebase, or a list of timebases.
+        coloumns='ALL'  : The coloumns yielded. Either the string 'ALL', or an array of coloumn names.
+        seen=None       : Optional dictionary {timebase: number of rows already seen}.
+        interval=0.5    : Float. Seconds between checks of the file.
+        timeout=None    : Optional float. Stop after this many seconds without new rows. By default, follow never stops.
+
+        Yields
+        ------
+        timebase        : The timebase of the rows.
+        rows            : Float64 numpy array of the new rows, with the requested coloumns.
+        """
+        timebases, clmnIndices, seen, state = self._followState(timebases, coloumns, seen)
+        waited = 0.0
+        while True:
+            new = self._followStep(timebases, clmnIndices, seen, state)
+            if new:
+                waited = 0.0
+                for timebase, rows in new:
+                    yield timebase, rows
+                continue
+            if timeout is not None and waited >= timeout:
+                return
+            began = time.time()
+            with self._appended:
+                self._appended.wait(interval if timeout is None else min(interval, timeout - waited))
+            waited += time.time() - began
+
+    async def afollow(self, timebases, coloumns='ALL', seen=None, interval=0.5, timeout=None):
+        """Asynchronous version of follow, for use with async for. The file is checked every interval seconds."""
+        import asyncio
+        timebases, clmnIndices, seen, state = self._followState(timebases, coloumns, seen)
+        waited = 0.0
+        while True:
+            new = self._followStep(timebases, clmnIndices, seen, state)
+            if new:
+                waited = 0.0
+                for timebase, rows in new:
+                    yield timebase, rows
+                continue
+            if timeout is not None and waited >= timeout:
+                return
+            delay = interval if timeout is None else min(interval, timeout - waited)
+            await asyncio.sleep(delay)
+            waited += delay
+
+    def getAligned(self, timebases, coloumns, start=None, end=None, index=False):
+        """Returns several timebases in one dataframe, aligned on the timestamps of the finest timebase.
+        
+        Each row holds the finest candle, together with the most recent candle of every coarser timebase
+        that had closed when the finest candle closed. There is no lookahead: a 1h candle starting at 12:00
+        first shows up on the 1m row starting at 12:59. Before the first closed coarse candle, its coloumns are NaN.
+        Every dataset is located with a single index lookup and read once.
+        
+        Parameters
+        ----------
+        timebases   : List of timebases to combine, e.g. ['1m', '1h', '1D']. The finest one defines the rows.
+        coloumns    : The coloumns wanted from every timebase. Either the string 'ALL', or an array of any of the following values: 'MTS', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOLUME'.
+        start, end  : Optional. Only rows of the finest timebase with start <= MTS <= end are returned. Same formats as in getDataset.
+        index=False : Optional boolean. If True, the returned dataframe is indexed by a DatetimeIndex (UTC) built from the MTS coloumn.
+        
+        Return
+        ------
+        dataframe   : Pandas dataframe with the coloumn 'MTS' of the finest timebase, followed by one coloumn named
+                      '<timebase>_<coloumn>' per timebase and requested coloumn.
+        """
+        import pandas
+        for timebase in timebases:
+            if timebase not in self.valid_timebases:
+                raise ValueError("The variable 'timebases' may only contain the following: {}".format(self.valid_timebases))
+        clmnIndices, clmnNames = self._coloumnIndices(coloumns)
+        timebases = sorted(set(timebases), key=lambda tb: timebase_seconds[tb])
+        finest = timebases[0]
+
+        startIndex, endIndex = self._indexRange(finest, start, end)
+        fineRows = self._readRows(finest, startIndex, endIndex)
+        fineMTS = fineRows[:, 0]
+        fineClose = candleCloseTimes(finest, fineMTS)
+
+        result = {'MTS': fineMTS}
+        for clmnIndex, clmnName in zip(clmnIndices, clmnNames):
+            result['{}_{}'.format(finest, clmnName)] = fineRows[:, clmnIndex]
+        for timebase in timebases[1:]:
+            if len(fineMTS) > 0:
+                #The first coarse candle needed is the last one that had closed when the first fine candle closed.
+                coarseStart = max(0, self._searchMTS(timebase, fineClose[0] - timebase_seconds[timebase], right=True) - 1)
+                coarseEnd = self._searchMTS(timebase, fineClose[-1], right=True)
+            else:
+                coarseStart = coarseEnd = 0
+            coarseRows = self._readRows(timebase, coarseStart, coarseEnd)
+            coarseClose = candleCloseTimes(timebase, coarseRows[:, 0])
+            #Position of the last coarse candle closed at or before each fine candle closed.
+            positions = np.searchsorted(coarseClose, fineClose, side='right') - 1
+            valid = positions >= 0
+            for clmnIndex, clmnName in zip(clmnIndices, clmnNames):
+                values = np.full(len(fineMTS), np.nan)
+                values[valid] = coarseRows[positions[valid], clmnIndex]
+                result['{}_{}'.format(timebase, clmnName)] = values
+
+        dataframe = pandas.DataFrame(result)
+        if index:
+            dataframe.index = pandas.DatetimeIndex(converters.tsArrayToDt64(fineMTS), name='DATETIME')
+        return dataframe
+
+    def addFeature(self, name, timebases=None):
+        """Starts storing a registered feature (see src/features.py) for the given timebases of the open file,
+        and computes it for the existing candles. From then on it is updated incrementally every time
+        candles are written by syncDatafile or saveDataset.
+        Parameters
+        ----------
+        name            :   String. Name of a feature in features.feature_registry.
+        timebases=None  :   Optional list of timebases. Defaults to all timebases."""
+        if name not in features.feature_registry:
+            raise RuntimeError("No feature named \"{}\". Registered features are: {}".format(name, list(features.feature_registry)))
+        if timebases is None:
+            timebases = self.valid_timebases
+        for timebase in timebases:
+            if timebase not in self.valid_timebases:
+                raise ValueError("The variable 'timebases' may only contain the following: {}".format(self.valid_timebases))
+            group = self.candlesfile.require_group(features_group).require_group(timebase)
+            if name not in group:
+                group.create_dataset(name, (0,), maxshape=(None,), dtype=np.float64, fillvalue=np.nan)
+            self.updateFeatures(timebase, names=[name])
+
+    def updateFeatures(self, timebase, names=None, fromIndex=None, chunkRows=1000000):
+        """Incrementally updates the stored features of a timebase. Only the rows that were added since the last
+        update are computed, reading one feature window of older rows in front of them.
+        Parameters
+        ----------
+        timebase            :   The timebase whose features should be updated.
+        names=None          :   Optional list of feature names. Defaults to every feature stored for the timebase.
+        fromIndex=None      :   Optional integer. Recompute from this row onwards, e.g. after rows inside the dataset were replaced.
+        chunkRows=1000000   :   Integer. Maximum number of new rows computed at a time."""
+        if self.candlesfile is None or features_group not in self.candlesfile or timebase not in self.candlesfile[features_group]:
+            return
+        group = self.candlesfile[features_group][timebase]
+        if names is None:
+            names = list(group.keys())
+        total = self._committedRows(timebase)
+        for name in names:
+            if name not in features.feature_registry:
+                print("The stored feature \"{}\" is not registered and will not be updated.".format(name))
+                continue
+            feature = features.feature_registry[name]
+            clmnIndices, _ = self._coloumnIndices(feature['coloumns'])
+            stored = group[name]
+            done = stored.shape[0]
+            if fromIndex is not None:
+                done = min(done, fromIndex)
+            done = min(done, total)
+            stored.resize(total, 0)
+            while done < total:
+                chunkEnd = min(total, done + chunkRows)
+                readStart = max(0, done - feature['window'])
+                rows = self._readRows(timebase, readStart, chunkEnd)[:, clmnIndices]
+                values = feature['func'](rows)
+                stored[done:chunkEnd] = values[done-readStart:]
+                done = chunkEnd
+        self.candlesfile.flush()
+
+    def getFeatures(self, timebase, names, start=None, end=None, startIndex=None, endIndex=None, length=None, index=False):
+        """Returns stored feature series of a timebase as a pandas dataframe, together with the MTS coloumn.
+        Rows are selected like in getDataset: by start and end (start <= MTS <= end), or by startIndex and endIndex,
+        optionally combined with length.
+        
+        Parameters
+        ----------
+        timebase    : The timebase of the features you want.
+        names       : List of feature names, see addFeature.
+        start, end, startIndex, endIndex, length : Optional. Selects the rows to return. See getDataset.
+        index=False : Optional boolean. If True, the returned dataframe is indexed by a DatetimeIndex (UTC) built from the MTS coloumn.
+        
+        Return
+        ------
+        dataframe   : Pandas dataframe with the coloumn 'MTS' followed by one coloumn per feature.
+        """
+        import pandas
+        if (start is not None or end is not None) and (startIndex is not None or endIndex is not None):
+            raise RuntimeError("You must pass either the parameters \"start\" and/or \"end\", OR the parameters \"startIndex\" and/or \"endIndex\".")
+        if features_group not in self.candlesfile or timebase not in self.candlesfile[features_group]:
+            raise RuntimeError("No features are stored for the timebase \"{}\".".format(timebase))
+        group = self.candlesfile[features_group][timebase]
+        for name in names:
+            if name not in group:
+                raise RuntimeError("The feature \"{}\" is not stored for the timebase \"{}\". Use addFeature first.".format(name, timebase))
+
+        total = min([self._committedRows(timebase)] + [group[name].shape[0] for name in names])
+        if start is not None or end is not None:
+            startIndex, endIndex = self._indexRange(timebase, start, end)
+            if start is None and length is not None:
+                startIndex = endIndex - length
+            elif end is None and length is not None:
+                endIndex = startIndex + length
+        elif length is not None:
+            if startIndex is not None and endIndex is None:
+                endIndex = startIndex + length
+            elif endIndex is not None and startIndex is None:
+                startIndex = endIndex - length
+        startIndex = min(max(0, startIndex or 0), total)
+        endIndex = min(max(startIndex, total if endIndex is None else endIndex), total)
+
+        result = {'MTS': self._readRows(timebase, startIndex, endIndex)[:, 0]}
+        for name in names:
+            result[name] = group[name][startIndex:endIndex]
+        dataframe = pandas.DataFrame(result)
+        if index:
+            dataframe.index = pandas.DatetimeIndex(converters.tsArrayToDt64(result['MTS']), name='DATETIME')
+        return dataframe
+
+    def updatePyramid(self, timebase, fromIndex=None, create=True, chunkRows=1048576):
+        """Incrementally updates the level-of-detail pyramid of a timebase. Every level holds one candle per block
+        of 2^k candles of the dataset: the first MTS and OPEN, the last CLOSE, the highest HIGH, the lowest LOW and
+        the summed VOLUME of the block. Only blocks touched by rows written since the last update are recomputed.
+        Parameters
+        ----------
+        timebase            :   The timebase whose pyramid should be updated.
+        fromIndex=None      :   Optional integer. Recompute from this row onwards, e.g. after rows inside the dataset were replaced.
+        create=True         :   Boolean. If False, nothing is done unless the timebase already has a pyramid.
+        chunkRows=1048576   :   Integer. Maximum number of rows reduced at a time. Rounded to a multiple of pyramid_factor."""
+        if not create and (pyramid_group not in self.candlesfile or timebase not in self.candlesfile[pyramid_group]):
+            return
+        group = self.candlesfile.require_group(pyramid_group).require_group(timebase)
+        total = self._committedRows(timebase)
+        dirty = min(int(group.attrs.get('rows', 0)), total)
+        if fromIndex is not None:
+            dirty = min(dirty, fromIndex)
+        chunkRows = max(pyramid_factor, chunkRows - chunkRows % pyramid_factor)
+
+        sourceLength = total
+        readSource = lambda a, b: self._readRows(timebase, a, b)
+        blockSize = 1
+        level = 0
+        while sourceLength > 1:
+            level += 2
+            blockSize *= pyramid_factor
+            name = str(level)
+            if name not in group:
+                group.create_dataset(name, (0, 6), maxshape=(None, 6), dtype=np.float64, fillvalue=np.nan)
+            stored = group[name]
+            length = -(-sourceLength // pyramid_factor)
+            startBlock = min(dirty // blockSize, stored.shape[0])
+            stored.resize(length, 0)
+            pos = startBlock*pyramid_factor
+            while pos < sourceLength:
+                chunkEnd = min(sourceLength, pos + chunkRows)
+                reduced = reduceCandles(readSource(pos, chunkEnd), pyramid_factor)
+                stored[pos//pyramid_factor:pos//pyramid_factor + len(reduced)] = reduced
+                pos = chunkEnd
+            sourceLength = length
+            readSource = lambda a, b, stored=stored: stored[a:b]
+        #Remove levels that are no longer needed, e.g. after the dataset was truncated.
+        for name in list(group.keys()):
+            if int(name) > level:
+                del group[name]
+        group.attrs['rows'] = total
+        self.candlesfile.flush()
+
+    def getOverview(self, timebase, start=None, end=None, maxPoints=2000, index=False):
+        """Returns a decimated view of a dataset with at most about maxPoints candles, for plotting or inspecting
+        wide time ranges without reading every row. The coarsest needed level of the pyramid (see updatePyramid)
+        is read. Each returned candle then summarizes a block of candles: first MTS and OPEN, last CLOSE, highest HIGH,
+        lowest LOW and summed VOLUME. Blocks at the edges of the range may contain some candles outside of it.
+        If the range holds at most maxPoints candles, they are returned as they are.
+        
+        Parameters
+        ----------
+        timebase        : The timebase of the candles dataset you want. Valid options: '1m', '5m', '15m', '30m', '1h', '3h', '6h', '12h', '1D', '7D', '14D', '1M'
+        start, end      : Optional. Time range of the view (start <= MTS <= end). Same formats as in getDataset.
+        maxPoints=2000  : Integer. Maximum number of candles to return.
+        index=False     : Optional boolean. If True, the returned dataframe is indexed by a DatetimeIndex (UTC) built from the MTS coloumn.
+        
+        Return
+        ------
+        dataframe       : Pandas dataframe with the coloumns 'MTS', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOLUME'.
+        """
+        import pandas
+        if maxPoints < 1:
+            raise RuntimeError("maxPoints must be positive and greater than 0.")
+        startIndex, endIndex = self._indexRange(timebase, start, end)
+        if endIndex - startIndex <= maxPoints:
+            rows = self._readRows(timebase, startIndex, endIndex)
+        else:
+            if self.mode != "r":
+                self.updatePyramid(timebase)
+            if pyramid_group not in self.candlesfile or timebase not in self.candlesfile[pyramid_group]:
+                raise RuntimeError("The timebase \"{}\" has no pyramid, and the file is opened read-only.".format(timebase))
+            group = self.candlesfile[pyramid_group][timebase]
+            levels = sorted(int(name) for name in group.keys())
+            for level in levels:
+                blockSize = 2**level
+                first = startIndex // blockSize
+                last = -(-endIndex // blockSize)
+                if last - first <= maxPoints:
+                    break
+            rows = np.asarray(group[str(level)][first:last], dtype=np.float64)
+        dataframe = pandas.DataFrame(rows, columns=self.valid_coloumns)
+        if index:
+            dataframe.index = pandas.DatetimeIndex(converters.tsArrayToDt64(rows[:, 0]), name='DATETIME')
+        return dataframe
+
+    def validate(self, timebases=None, chunkRows=4000000, examples=10):
+        """Checks the candles datasets for problems that break the assumptions of getDataset and saveDataset,
+        reading each dataset in chunks and checking each chunk with vectorised numpy operations.
+        
+        The following is counted for each timebase:
+        rows            : Number of committed rows.
+        uncommitted     : Rows after the last commit marker, left by an interrupted write.
+        nan_rows        : Rows with a NaN MTS, OPEN, CLOSE, HIGH or LOW, e.g. rows filled by the dataset fillvalue.
+        unsorted        : Rows with an MTS smaller than that of the row before.
+        duplicates      : Rows with the same MTS as an earlier row, adjacent or not.
+        high_below_low  : Rows where HIGH < LOW.
+        ohlc_outside    : Rows where OPEN or CLOSE lies outside of LOW..HIGH.
+        negative_volume : Rows with VOLUME < 0.
+        irregular_steps : Rows whose distance to the previous MTS is not a multiple of the timebase length.
+        gaps            : Rows that follow a gap of missing candles.
+        missing_candles : Total number of candles missing in the gaps.
+        The step checks are skipped for the 1M timebase, whose candles vary in length.
+        Duplicates in a sorted chunk whose MTS values all lie after those of the chunks before it are found by comparing
+        neighbouring rows. Only once a chunk is unsorted or overlaps earlier rows, the distinct MTS values of the
+        dataset are held in memory, like in repair, and looked up for that chunk and the chunks after it.
+        
+        Parameters
+        ----------
+        timebases=None      : Optional list of timebases to check. Defaults to all timebases.
+        chunkRows=4000000   : Integer. Number of rows checked at a time.
+        examples=10         : Integer. Number of example row indices kept for each kind of problem.
+        
+        Returns
+        -------
+        report              : Dictionary with one dictionary of counts per timebase. Its key 'examples' holds a dictionary
+                              with the indices of the first rows with each kind of problem.
+        """
+        if timebases is None:
+            timebases = self.valid_timebases
+        checks = ['nan_rows', 'unsorted', 'duplicates', 'high_below_low', 'ohlc_outside', 'negative_volume', 'irregular_steps', 'gaps']
+        report = {}
+        for timebase in timebases:
+            committed = self._committedRows(timebase)
+            result = dict.fromkeys(checks + ['missing_candles'], 0)
+            result['rows'] = committed
+            result['uncommitted'] = self.candlesfile[timebase].shape[0] - committed
+            result['examples'] = {check: [] for check in checks}
+            step = timebase_seconds[timebase]
+            offset = 0
+            latest = -np.inf #Largest MTS of the previous blocks.
+            seen = None #Sorted distinct MTS values of the previous blocks, only built once a block needs them.
+            for block in self.iterDataset(timebase, chunkRows=chunkRows, overlap=1, asPandas=False):
+                #Every block but the first starts with the last row of the previous block, for the checks between rows.
+                first = 0 if offset == 0 else 1
+                mts, opn, close, high, low, volume = block.T
+                diff = np.diff(mts)
+                #A row is a duplicate if its MTS was seen in a previous block, or earlier in this block.
+                new = mts[first:]
+                valid = np.flatnonzero(~np.isnan(new))
+                values = new[valid]
+                duplicate = np.zeros(len(new), dtype=bool)
+                if np.all(values[1:] >= values[:-1]) and (len(values) == 0 or values[0] > latest):
+                    #A sorted block after all previous rows can only repeat the MTS of the row before.
+                    duplicate[valid[1:][values[1:] == values[:-1]]] = True
+                    if seen is not None:
+                        seen = np.concatenate((seen, np.unique(values)))
+                else:
+                    if seen is None:
+                        seen = np.unique(self._decodeMTS(timebase, self._readRaw(timebase, 0, offset, coloumns=0)))
+                        seen = seen[~np.isnan(seen)]
+                    order = np.argsort(new, kind='stable')
+                    duplicate[order[1:][new[order][1:] == new[order][:-1]]] = True
+                    if len(seen):
+                        positions = np.minimum(np.searchsorted(seen, new), len(seen) - 1)
+                        duplicate |= seen[positions] == new
+                    seen = np.union1d(seen, values)
+                if len(values):
+                    latest = max(latest, values.max())
+                problems = {
+                    'nan_rows': np.isnan(block[first:, :5]).any(axis=1),
+                    'high_below_low': (high < low)[first:],
+                    'ohlc_outside': ((np.fmax(opn, close) > high) | (np.fmin(opn, close) < low))[first:],
+                    'negative_volume': (volume < 0)[first:],
+                    'unsorted': diff < 0,
+                    'duplicates': duplicate,
+                }
+                #Row n of the diff based checks is row n+1 of the block.
+                diffOffset = offset + 1 - first
+                if timebase != '1M':
+                    irregular = (diff > 0) & (np.fmod(diff, step) != 0)
+                    gaps = (diff > step) & ~irregular
+                    problems['irregular_steps'] = irregular
+                    problems['gaps'] = gaps
+                    result['missing_candles'] += int(np.sum(diff[gaps]//step - 1))
+                else:
+                    problems['irregular_steps'] = problems['gaps'] = np.zeros(0, dtype=bool)
+                for check, mask in problems.items():
+                    result[check] += int(np.count_nonzero(mask))
+                    found = result['examples'][check]
+                    if len(found) < examples:
+                        start = diffOffset if check in ('unsorted', 'irregular_steps', 'gaps') else offset
+                        found += (np.flatnonzero(mask)[:examples - len(found)] + start).tolist()
+                offset += len(block) - first
+            report[timebase] = result
+        return report
+
+    def repair(self, timebase, chunkRows=1000000):
+        """Repairs a candles dataset so that its MTS coloumn is strictly increasing: rows are sorted by MTS, of rows with
+        the same MTS only the one written last is kept, and rows without an MTS and uncommitted rows are dropped.
+        The repaired rows are streamed into a new dataset in chunks, which then replaces the old one. The journal is
+        reset, and stored features and the pyramid are recomputed from the first row that changed.
+        Only the MTS coloumn is held in memory in full.
+        
+        Parameters
+        ----------
+        timebase            : The timebase of the dataset to repair.
+        chunkRows=1000000   : Integer. Number of rows written at a time.
+        
+        Returns
+        -------
+        removed             : Number of rows that were removed.
+        """
+        if self.mode == "r":
+            raise RuntimeError("Cannot repair a candles file that is opened read-only.")
+        dataset = self.candlesfile[timebase]
+        committed = self._committedRows(timebase)
+        mts = self._decodeMTS(timebase, self._readRaw(timebase, 0, committed, coloumns=0))
+        #Stable sort, so that rows with the same MTS stay in the order they were written.
+        valid = np.flatnonzero(~np.isnan(mts))
+        order = valid[np.argsort(mts[valid], kind='stable')]
+        sortedMTS = mts[order]
+        keep = np.append(sortedMTS[1:] != sortedMTS[:-1], True) if len(order) > 0 else np.zeros(0, dtype=bool)
+        order = order[keep]
+        changed = np.flatnonzero(order != np.arange(len(order)))
+        if len(changed) == 0 and len(order) == dataset.shape[0]:
+            return 0
+        firstChanged = int(changed[0]) if len(changed) > 0 else len(order)
+
+        sharded = dataset.is_virtual
+        if sharded:
+            #The repaired rows are written to a new set of shards, which then replaces the old one.
+            directory = self._shardDirectory(timebase) + '_repair'
+            self._removeShards(directory)
+        else:
+            name = timebase + '_repair'
+            if name in self.candlesfile:
+                del self.candlesfile[name]
+            repaired = self.candlesfile.create_dataset(name, (len(order), 6), maxshape=(None, 6), dtype=dataset.dtype,
+                                                       fillvalue=dataset.fillvalue, chunks=dataset.chunks, compression=dataset.compression)
+            for key, value in dataset.attrs.items():
+                repaired.attrs[key] = value
+        for a in range(0, len(order), chunkRows):
+            indices = order[a:a+chunkRows]
+            low, high = indices.min(), indices.max() + 1
+            if high - low <= 4*len(indices):
+                #Mostly sorted data. Reading the whole span at once is much faster than picking rows.
+                rows = dataset[low:high, :][indices - low]
+            else:
+                sortedIndices = np.sort(indices)
+                rows = dataset[sortedIndices, :][np.searchsorted(sortedIndices, indices)]
+            if sharded:
+                self._appendShardRows(timebase, rows, self._decodeMTS(timebase, rows[:, 0]), directory)
+            else:
+                repaired[a:a+len(indices), :] = rows
+        removed = dataset.shape[0] - len(order)
+        if sharded:
+            self._removeShards(self._shardDirectory(timebase))
+            if os.path.isdir(directory):
+                os.rename(directory, self._shardDirectory(timebase))
+            self._buildVirtual(timebase).attrs['committed_rows'] = len(order)
+        else:
+            repaired.attrs['committed_rows'] = len(order)
+            del self.candlesfile[timebase]
+            self.candlesfile.move(name, timebase)
+
+        #The journal no longer describes the dataset. Replace it with a single entry for the repaired rows.
+        journal = self._journal(timebase)
+        journal.resize(0, 0)
+        if len(order) > 0:
+            journal.resize(1, 0)
+            journal[0, :] = [sortedMTS[keep][0], sortedMTS[keep][-1], len(order), 1]
+        self.candlesfile.flush()
+        self._updateDerived(timebase, fromIndex=firstChanged)
+        return removed
+
+    def convertEncoding(self, path, encoding="int64", precision=2, volumePrecision=4, chunkRows=1000000):
+        """Writes a copy of the candles of the open file into a new file with another storage encoding
+        (see src/encoding.py), and reports the round-trip error of every coloumn. Stored features and
+        pyramids are not copied; they can be added to the new file again.
+        
+        Parameters
+        ----------
+        path                : String. Full path of the new file. It must not exist.
+        encoding="int64"    : String. 'float64', 'float32', 'int64' or 'int32'.
+        precision=2         : Integer. Number of price decimals kept by the integer encodings.
+        volumePrecision=4   : Integer. Number of volume decimals kept by the integer encodings.
+        chunkRows=1000000   : Integer. Number of rows converted at a time.
+        
+        Returns
+        -------
+        report              : Dictionary with, for each timebase, a dictionary with the largest absolute difference
+                              between the original and the stored value of each coloumn.
+        """
+        if os.path.exists(path):
+            raise RuntimeError("The file \"{}\" already exists.".format(path))
+        target = CandlesHandler(None, encoding=encoding, precision=precision, volumePrecision=volumePrecision)
+        target.open(path, new=True)
+        report = {}
+        try:
+            for timebase in self.valid_timebases:
+                maxError = np.zeros(6)
+                for block in self.iterDataset(timebase, chunkRows=chunkRows, asPandas=False):
+                    target._appendRows(timebase, block)
+                    stored = target._decodeRows(timebase, target._encodeRows(timebase, block))
+                    errors = np.abs(stored - block)
+                    #A value that became NaN, or stopped being NaN, counts as an infinite error.
+                    errors[np.isnan(stored) != np.isnan(block)] = np.inf
+                    maxError = np.fmax(maxError, np.nanmax(errors, axis=0, initial=0))
+                report[timebase] = dict(zip(self.valid_coloumns, maxError.tolist()))
+        finally:
+            target.close()
+        return report
+
+    def shardFile(self, period='year', chunkRows=1000000):
+        """Converts the open candles file to the sharded layout. The rows of every timebase are moved into one file per
+        period, in the directory <candles file name>_shards/<timebase>/, and the timebase dataset of the candles file
+        becomes an HDF5 virtual dataset that joins them. Everything that reads the candles file sees the same datasets
+        as before. Stored features, pyramids and the journal stay in the candles file.
+
+        Writes only touch the shard of the newest period (the active shard) and rebuild the virtual dataset. Older
+        shards are sealed: their files are made read-only, and can be compacted with compactShards. A sealed shard
+        is only unsealed for a write into the past, e.g. by saveDataset in 'replace' mode or by repair.
+        The shard directory must stay next to the candles file. The space of the moved rows is only returned to the
+        file system when the candles file is repacked, e.g. with h5repack.
+        
+        Parameters
+        ----------
+        period='year'       : String. 'year' or 'month'. The period of the rows held by each shard file.
+        chunkRows=1000000   : Integer. Number of rows moved at a time.
+        """
+        if self.mode == "r":
+            raise RuntimeError("Cannot shard a candles file that is opened read-only.")
+        self._checkShardPeriod(period)
+        if self.candlesfile.attrs.get('shard_period', period) != period:
+            raise RuntimeError("The candles file is already sharded by {}.".format(self.candlesfile.attrs['shard_period']))
+        self.candlesfile.attrs['shard_period'] = period
+        for timebase in self.valid_timebases:
+            if self.candlesfile[timebase].is_virtual:
+                continue
+            self._recoverDataset(timebase)
+            dataset = self.candlesfile[timebase]
+            directory = self._shardDirectory(timebase)
+            self._removeShards(directory)
+            for a in range(0, dataset.shape[0], chunkRows):
+                raw = dataset[a:a+chunkRows, :]
+                self._appendShardRows(timebase, raw, self._decodeMTS(timebase, raw[:, 0]), directory)
+            self._buildVirtual(timebase)
+            self.candlesfile.flush()
+
+    def compactShards(self, timebases=None):
+        """Rewrites the sealed shard files of a sharded candles file with compression and without unused space.
+        The active shard of each timebase is left as it is.
+        
+        Parameters
+        ----------
+        timebases=None  : Optional list of timebases. Defaults to all timebases.
+        
+        Returns
+        -------
+        report          : Dictionary with, for each timebase, the total size in bytes of its sealed shards before and after.
+        """
+        if timebases is None:
+            timebases = self.valid_timebases
+        report = {}
+        for timebase in timebases:
+            if not self.candlesfile[timebase].is_virtual:
+                continue
+            before = 0
+            after = 0
+            for path in self._shardList(self._shardDirectory(timebase))[:-1]:
+                before += os.path.getsize(path)
+                tmppath = path + '.tmp'
+                with h5py.File(path, 'r') as source, h5py.File(tmppath, 'w') as target:
+                    stored = source[shard_dataset]
+                    target.create_dataset(shard_dataset, data=stored[:], maxshape=(None, 6), fillvalue=stored.fillvalue,
+                                          chunks=True, compression='gzip', shuffle=True)
+                self._unsealShard(path)
+                os.replace(tmppath, path)
+                after += os.path.getsize(path)
+            self._sealShards(self._shardDirectory(timebase))
+            report[timebase] = {'before': before, 'after': after}
+        return report
+
     def normalize(self, dataset):
         #this should not be here!
-        """Normalizes a dataset to percent change. The dataset must be a 1D array."""
+        """Normalizes a dataset to percent change. The dataset must be a 1D array. See normalizeBatch for many windows at once."""
         start = dataset[0]
         max = np.amax(dataset) - start #Largest positive deviation from start price
         min = np.amin(dataset) - start #Largest negative deviation from start price
@@ -543,6 +1772,8 @@ class CandlesHandler:
         outlierXlow        :   X-values of the located negative outliers. For debugging and plotting purposes.
         outlierXhigh       :   Y-values of the located negative outliers (now scaled down).
         """
+        import progressbar
+        from scipy.signal import gaussian
         firstCaller = False
         if set is None:
             firstCaller = True
@@ -681,6 +1912,106 @@ class CandlesHandler:
         
 
         
+def reduceCandles(rows, factor):
+    """Combines every factor consecutive candles of an array in the candles format into one candle: the first MTS
+    and OPEN, the last CLOSE, the highest HIGH, the lowest LOW and the summed VOLUME. NaN values are ignored.
+    A last incomplete block is combined as well."""
+    rows = np.asarray(rows, dtype=np.float64)
+    starts = np.arange(0, len(rows), factor)
+    ends = np.minimum(starts + factor, len(rows)) - 1
+    reduced = np.empty((len(starts), 6))
+    reduced[:, 0] = rows[starts, 0]
+    reduced[:, 1] = rows[starts, 1]
+    reduced[:, 2] = rows[ends, 2]
+    if len(starts) > 0:
+        reduced[:, 3] = np.fmax.reduceat(rows[:, 3], starts)
+        reduced[:, 4] = np.fmin.reduceat(rows[:, 4], starts)
+        reduced[:, 5] = np.add.reduceat(np.nan_to_num(rows[:, 5]), starts)
+    return reduced
+
+
+def candleCloseTimes(timebase, mts):
+    """Returns the close times (timestamps) of candles of a timebase, given their MTS (open) timestamps.
+    Monthly candles close at the start of the next calendar month."""
+    mts = np.asarray(mts, dtype=np.float64)
+    if timebase == '1M':
+        months = converters.tsArrayToDt64(mts).astype('datetime64[M]') + 1
+        close = converters.dt64ToTs(months).astype(np.float64)
+        close[np.isnan(mts)] = np.nan
+        return close
+    return mts + timebase_seconds[timebase]
+
+
+def normalizeBatch(windows, keep=None, first=None):
+    """Normalizes a batch of windows to percent change from the first row of each window, i.e. (window - window[0])/window[0].
+    This is what CandlesHandler.normalize does to a single window, applied to the whole batch in one operation and
+    without modifying it. Flat windows give 0, where normalize divides by zero. Values whose first value is 0 also give 0,
+    instead of inf or NaN.
+
+    Parameters
+    ----------
+    windows     :   Numpy array of shape (batch, window) or (batch, window, coloumns).
+    keep=None   :   Optional list of indices of coloumns that are returned as they are, e.g. the MTS coloumn.
+    first=None  :   Optional array of shape (batch, 1) or (batch, 1, coloumns) of the values to normalize against, instead
+                    of the first row of each window.
+
+    Returns
+    -------
+    normalized  :   New float64 numpy array of the same shape."""
+    windows = np.asarray(windows, dtype=np.float64)
+    first = windows[:, :1] if first is None else np.asarray(first, dtype=np.float64)
+    normalized = np.zeros(np.broadcast(windows, first).shape)
+    np.divide(windows - first, first, out=normalized, where=first != 0)
+    if keep:
+        normalized[..., keep] = windows[..., keep]
+    return normalized
+
+
+def readAhead(generator, depth=1):
+    """Runs a generator in a background thread, keeping up to depth items ready ahead of the consumer.
+    Exceptions raised in the generator are re-raised in the consumer. Closing the returned generator
+    stops the background thread."""
+    items = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def put(item, error=None):
+        #Waits for room in the queue, unless the consumer has stopped. Returns False if it has.
+        while not stop.is_set():
+            try:
+                items.put((item, error), timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in generator:
+                if not put(item):
+                    return
+            put(done)
+        except Exception as e:
+            put(done, e)
+        finally:
+            if hasattr(generator, 'close'):
+                generator.close()
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
 def weightedAvgAndStd(series, weights=[]):
     """
     Return the weighted average and standard deviation.
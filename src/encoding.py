@@ -0,0 +1,77 @@
+import numpy as np
+
+"""Compact storage encodings for candle datasets.
+
+Every coloumn is stored as (value - offset)*scale/unit in the dtype of the encoding, and decoded as
+stored*unit/scale + offset. scale and unit are integers, so that whole minutes and fixed-point prices decode exactly:
+
+float64 :   Values are stored as they are. The default.
+float32 :   Prices and volume as float32 (about 7 significant digits).
+int64   :   Prices and volume as fixed-point integers with a configurable number of decimals.
+int32   :   As int64, in half the space. Prices up to about 21 million at 2 decimals.
+
+MTS is stored exactly in all compact encodings, as whole minutes since mts_epoch. Candles of every timebase start on
+whole minutes. float32 and int32 can hold about 31 years of minutes, i.e. until the end of 2044.
+In the integer encodings, NaN is stored as the smallest integer of the dtype."""
+
+encodings = {'float64': np.float64, 'float32': np.float32, 'int64': np.int64, 'int32': np.int32}
+
+#Origin and unit of the stored MTS coloumn in the compact encodings. Bitfinex candles start in 2013.
+mts_epoch = 1356998400
+mts_unit = 60
+
+
+def columnScaling(encoding, precision=2, volumePrecision=4):
+    """Returns the scale, unit and offset arrays (one value per coloumn) of an encoding.
+    Parameters
+    ----------
+    encoding            :   String. One of the keys of encodings.
+    precision=2         :   Integer. Number of decimals kept of the prices in the integer encodings.
+    volumePrecision=4   :   Integer. Number of decimals kept of the volume in the integer encodings."""
+    if encoding not in encodings:
+        raise ValueError("The variable 'encoding' must be one of the following: {}".format(list(encodings)))
+    scale = np.ones(6)
+    unit = np.ones(6)
+    offset = np.zeros(6)
+    if encoding != 'float64':
+        unit[0] = mts_unit
+        offset[0] = mts_epoch
+    if encoding in ('int64', 'int32'):
+        scale[1:5] = 10**precision
+        scale[5] = 10**volumePrecision
+    return scale, unit, offset
+
+
+def nanValue(dtype):
+    """Returns the value that represents NaN in a dtype."""
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'i':
+        return np.iinfo(dtype).min
+    return np.nan
+
+
+def encode(rows, dtype, scale, unit, offset):
+    """Encodes rows of candles (float64, shape (n, 6)) into the stored representation.
+    Raises a RuntimeError if a value does not fit into an integer dtype."""
+    dtype = np.dtype(dtype)
+    rows = np.asarray(rows, dtype=np.float64)
+    values = (rows - offset)*scale/unit
+    if dtype.kind != 'i':
+        return values.astype(dtype)
+    nan = np.isnan(values)
+    values = np.round(np.where(nan, 0, values))
+    info = np.iinfo(dtype)
+    if values.size > 0 and (values.min() <= info.min or values.max() > info.max):
+        raise RuntimeError("The candles do not fit into the {} encoding. Use fewer decimals or a larger dtype.".format(dtype))
+    encoded = values.astype(dtype)
+    encoded[nan] = info.min
+    return encoded
+
+
+def decode(raw, scale, unit, offset):
+    """Decodes stored rows (shape (n, 6), or the matching coloumns of scale, unit and offset) into float64 values."""
+    raw = np.asarray(raw)
+    values = raw.astype(np.float64)
+    if raw.dtype.kind == 'i':
+        values[raw == np.iinfo(raw.dtype).min] = np.nan
+    return values*unit/scale + offset
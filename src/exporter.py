@@ -0,0 +1,174 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from src import converters
+
+"""Export and import of candle datasets to and from Parquet or Arrow IPC files.
+
+Exported files are partitioned by timebase and month:
+
+    <directory>/<timebase>/month=YYYY-MM/part-0.parquet
+
+MTS is written as int64 and the other coloumns as float64. The export streams the dataset through
+CandlesHandler.iterDataset, so only one block and the months being written are held in memory.
+Requires pyarrow."""
+
+formats = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+def _importPyarrow():
+    """Imports pyarrow, raising a RuntimeError with install instructions if it is missing."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        import pyarrow.ipc
+    except ImportError:
+        raise RuntimeError("Exporting and importing candles requires pyarrow. Install it with: pip install pyarrow")
+    return pyarrow
+
+
+def _writePartition(path, rows, clmnNames, fmt):
+    """Writes the rows of one month to a file. Runs in the writer threads."""
+    pyarrow = _importPyarrow()
+    arrays = []
+    for n, clmn in enumerate(clmnNames):
+        if clmn == 'MTS':
+            arrays.append(pyarrow.array(rows[:, n].astype(np.int64), type=pyarrow.int64()))
+        else:
+            arrays.append(pyarrow.array(rows[:, n], type=pyarrow.float64()))
+    table = pyarrow.Table.from_arrays(arrays, names=clmnNames)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if fmt == 'parquet':
+        pyarrow.parquet.write_table(table, path, compression='zstd')
+    else:
+        with pyarrow.ipc.new_file(path, table.schema) as writer:
+            writer.write_table(table)
+    return len(rows)
+
+
+def exportCandles(handler, directory, timebases=None, coloumns='ALL', fmt='parquet', start=None, end=None, workers=4, chunkRows=1000000):
+    """Exports candle datasets to month-partitioned Parquet or Arrow IPC files, writing several months in parallel.
+
+    Parameters
+    ----------
+    handler             : An open CandlesHandler.
+    directory           : String. Output directory. One subdirectory is created per timebase.
+    timebases=None      : Optional list of timebases. Defaults to all timebases.
+    coloumns='ALL'      : The coloumns to export. Either the string 'ALL', or an array of coloumn names. 'MTS' is always exported.
+    fmt='parquet'       : String. 'parquet' or 'arrow' (Arrow IPC file format).
+    start, end          : Optional. Only rows with start <= MTS <= end are exported. Same formats as in getDataset.
+    workers=4           : Integer. Number of writer threads.
+    chunkRows=1000000   : Integer. Number of rows read from the hdf5 file at a time.
+
+    Returns
+    -------
+    rowcounts           : Dictionary with the number of exported rows of each timebase.
+    """
+    _importPyarrow()
+    if fmt not in formats:
+        raise ValueError("The variable 'fmt' must be one of the following: {}".format(list(formats)))
+    if timebases is None:
+        timebases = handler.valid_timebases
+    if isinstance(coloumns, str):
+        coloumns = handler.valid_coloumns if coloumns == 'ALL' else [coloumns]
+    clmnNames = ['MTS'] + [clmn for clmn in coloumns if clmn != 'MTS']
+
+    rowcounts = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for timebase in timebases:
+            pending = []
+            rowcounts[timebase] = 0
+
+            def submit(month, parts):
+                path = os.path.join(directory, timebase, 'month={}'.format(month), 'part-0' + formats[fmt])
+                pending.append(executor.submit(_writePartition, path, np.concatenate(parts), clmnNames, fmt))
+                #Keep at most two writes per worker in flight, so memory stays bounded.
+                while len(pending) > 2*workers:
+                    rowcounts[timebase] += pending.pop(0).result()
+
+            month = None
+            parts = []
+            for block in handler.iterDataset(timebase, clmnNames, start=start, end=end, chunkRows=chunkRows, asPandas=False):
+                block = block[~np.isnan(block[:, 0])]
+                if len(block) == 0:
+                    continue
+                months = np.datetime_as_string(converters.tsArrayToDt64(block[:, 0]).astype('datetime64[M]'))
+                #Indices where a new month begins within the block.
+                bounds = np.concatenate(([0], np.flatnonzero(months[1:] != months[:-1]) + 1, [len(block)]))
+                for a, b in zip(bounds[:-1], bounds[1:]):
+                    if months[a] != month:
+                        if parts:
+                            submit(month, parts)
+                        month = months[a]
+                        parts = []
+                    parts.append(block[a:b])
+            if parts:
+                submit(month, parts)
+            rowcounts[timebase] += sum(future.result() for future in pending)
+    return rowcounts
+
+
+def _readFile(path):
+    """Reads one exported file into a pandas dataframe."""
+    pyarrow = _importPyarrow()
+    if path.endswith(formats['parquet']):
+        table = pyarrow.parquet.read_table(path)
+    else:
+        with pyarrow.ipc.open_file(path) as reader:
+            table = reader.read_all()
+    dataframe = table.to_pandas()
+    dataframe['MTS'] = dataframe['MTS'].astype(np.float64)
+    return dataframe
+
+
+def importCandles(handler, directory, timebases=None, mode='skip', keepnan=True, workers=4, batchRows=1000000):
+    """Imports month-partitioned Parquet or Arrow IPC files written by exportCandles back into the candles file
+    of a CandlesHandler, through saveDataset. Files are read in parallel and saved in time order.
+
+    Parameters
+    ----------
+    handler             : An open CandlesHandler.
+    directory           : String. Directory that exportCandles wrote to.
+    timebases=None      : Optional list of timebases. Defaults to all timebases found in the directory.
+    mode='skip'         : String. Save mode passed to saveDataset: 'append', 'skip' or 'replace'.
+    keepnan=True        : Boolean. Passed to saveDataset. With False, overlapping rows are merged value by value, which is slow.
+    workers=4           : Integer. Number of reader threads.
+    batchRows=1000000   : Integer. Months are combined into batches of about this many rows before each save.
+
+    Returns
+    -------
+    rowcounts           : Dictionary with the number of imported rows of each timebase.
+    """
+    import pandas
+    _importPyarrow()
+    if timebases is None:
+        timebases = [tb for tb in handler.valid_timebases if os.path.isdir(os.path.join(directory, tb))]
+    rowcounts = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for timebase in timebases:
+            paths = []
+            for root, _, files in os.walk(os.path.join(directory, timebase)):
+                paths += [os.path.join(root, name) for name in files if os.path.splitext(name)[1] in formats.values()]
+            #Partition directories are named month=YYYY-MM, so sorting the paths sorts them in time.
+            paths.sort()
+            rowcounts[timebase] = 0
+            batch = []
+            batchLength = 0
+            #Read a few files ahead of the saves, without loading every file at once.
+            reads = [executor.submit(_readFile, path) for path in paths[:2*workers]]
+            for n in range(len(paths)):
+                dataframe = reads[n].result()
+                reads[n] = None
+                if n + 2*workers < len(paths):
+                    reads.append(executor.submit(_readFile, paths[n + 2*workers]))
+                batch.append(dataframe)
+                batchLength += len(dataframe)
+                if batchLength >= batchRows:
+                    handler.saveDataset(pandas.concat(batch, ignore_index=True), timebase, mode=mode, keepnan=keepnan)
+                    rowcounts[timebase] += batchLength
+                    batch = []
+                    batchLength = 0
+            if batch:
+                handler.saveDataset(pandas.concat(batch, ignore_index=True), timebase, mode=mode, keepnan=keepnan)
+                rowcounts[timebase] += batchLength
+    return rowcounts
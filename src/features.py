@@ -0,0 +1,80 @@
+import numpy as np
+
+"""Registry of derived feature series that can be stored next to the candles datasets.
+
+A feature is a vectorised function that takes a 2D array with the coloumns it asks for (one row per candle)
+and returns a 1D array with one value per row. It also declares its window: the number of preceding rows
+that each value depends on. The CandlesHandler uses the window to update stored features incrementally,
+so that only the new rows plus one window of history are read and computed after each sync or clean run.
+
+New features are added with the registerFeature decorator:
+
+    @registerFeature('range', ['HIGH', 'LOW'], window=0)
+    def candleRange(rows):
+        return rows[:, 0] - rows[:, 1]
+"""
+
+feature_registry = {}
+
+
+def registerFeature(name, coloumns, window):
+    """Decorator that registers a feature function under a name.
+    Parameters
+    ----------
+    name        :   String. Name of the feature. It is also the name of the stored series.
+    coloumns    :   List of candle coloumns the function needs, in the order they are passed to it.
+    window      :   Integer. Number of preceding rows each value depends on."""
+    def decorator(func):
+        feature_registry[name] = {'func': func, 'coloumns': list(coloumns), 'window': int(window)}
+        return func
+    return decorator
+
+
+def rollingMean(values, n):
+    """Mean of the last n values at every position. The first n-1 positions are NaN."""
+    result = np.full(len(values), np.nan)
+    if len(values) >= n:
+        result[n-1:] = np.lib.stride_tricks.sliding_window_view(values, n).mean(axis=1)
+    return result
+
+
+def rollingStd(values, n):
+    """Population standard deviation of the last n values at every position. The first n-1 positions are NaN."""
+    result = np.full(len(values), np.nan)
+    if len(values) >= n:
+        result[n-1:] = np.lib.stride_tricks.sliding_window_view(values, n).std(axis=1)
+    return result
+
+
+@registerFeature('return', ['CLOSE'], window=1)
+def closeReturn(rows):
+    """Relative change of the close from the previous candle."""
+    close = rows[:, 0]
+    result = np.full(len(close), np.nan)
+    result[1:] = close[1:]/close[:-1] - 1
+    return result
+
+
+@registerFeature('logreturn', ['CLOSE'], window=1)
+def closeLogReturn(rows):
+    """Logarithmic change of the close from the previous candle."""
+    close = rows[:, 0]
+    result = np.full(len(close), np.nan)
+    result[1:] = np.diff(np.log(close))
+    return result
+
+
+@registerFeature('volatility_60', ['CLOSE'], window=60)
+def volatility60(rows):
+    """Standard deviation of the log returns of the last 60 candles."""
+    return rollingStd(closeLogReturn(rows), 60)
+
+
+@registerFeature('pctchange_60', ['CLOSE'], window=59)
+def pctChange60(rows):
+    """Percent change of the close over a window of 60 candles, i.e. the last value of
+    CandlesHandler.normalize applied to the window of the 60 last closes."""
+    close = rows[:, 0]
+    result = np.full(len(close), np.nan)
+    result[59:] = close[59:]/close[:-59] - 1
+    return result
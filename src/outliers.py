@@ -0,0 +1,88 @@
+import numpy as np
+
+"""Registry of outlier detectors used to clean candle wicks.
+
+A detector finds candles whose HIGH or LOW wick is far too long compared to the wicks around it, and scales the
+wick down. Every detector is called as
+
+    detector(handler, timebase, start=None, **settings)
+
+with an open CandlesHandler, and returns the same five values as CandlesHandler.scaleOutliers:
+(cleaned dataframe, outlierXhigh, outlierYhigh, outlierXlow, outlierYlow), or five None if there is nothing to clean.
+Settings a detector does not use are ignored, so all settings of the [OUTLIERSCALER] section of config.ini can be
+passed to any of them. The detector is chosen with the engine setting of that section.
+
+gaussian    :   CandlesHandler.scaleOutliers. Settings: statlength, sigmalimit.
+mad         :   Rolling median/MAD test of the wick lengths, in a single vectorised pass. Settings: statlength, madlimit.
+"""
+
+detector_registry = {}
+
+#Scales the median absolute deviation to the standard deviation of normally distributed values.
+mad_to_sigma = 1.4826
+
+
+def registerDetector(name):
+    """Decorator that registers an outlier detector function under a name."""
+    def decorator(func):
+        detector_registry[name] = func
+        return func
+    return decorator
+
+
+def detectOutliers(handler, timebase, engine='gaussian', start=None, **settings):
+    """Runs the outlier detector named engine on a timebase of a CandlesHandler, from start onwards."""
+    if engine not in detector_registry:
+        raise ValueError("The variable 'engine' must be one of the following: {}".format(list(detector_registry)))
+    return detector_registry[engine](handler, timebase, start=start, **settings)
+
+
+@registerDetector('gaussian')
+def gaussianDetector(handler, timebase, start=None, statlength=10, sigmalimit=0.5, **unused):
+    """Gaussian-weighted mean/sigma test of the wick changes. See CandlesHandler.scaleOutliers."""
+    return handler.scaleOutliers(timebase, start=start, statlength=statlength, sigmalimit=sigmalimit)
+
+
+def rollingMedian(values, window, chunkRows=200000):
+    """Median of the centred window of length window (odd) at every position. The first and last window//2
+    positions use the first and last complete window. NaN values are ignored.
+    The windows are strided views, and are reduced chunkRows positions at a time to bound memory."""
+    half = window//2
+    count = len(values) - window + 1
+    if count < 1:
+        return np.full(len(values), np.nanmedian(values) if np.any(~np.isnan(values)) else np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(values, window)
+    medians = np.empty(count)
+    median = np.nanmedian if np.isnan(values).any() else np.median
+    for a in range(0, count, chunkRows):
+        medians[a:a+chunkRows] = median(windows[a:a+chunkRows], axis=1)
+    return np.concatenate((np.full(half, medians[0]), medians, np.full(len(values) - count - half, medians[-1])))
+
+
+@registerDetector('mad')
+def madDetector(handler, timebase, start=None, statlength=10, madlimit=10.0, **unused):
+    """Robust wick test. The HIGH wick of a candle is HIGH - max(OPEN, CLOSE), and the LOW wick is min(OPEN, CLOSE) - LOW.
+    A wick is an outlier if it is longer than the median wick of the 2*statlength+1 candles around it by more than
+    madlimit times the median absolute deviation (scaled to a standard deviation). The median and the MAD are not
+    pulled up by the outliers themselves, so a single pass finds them all, and the run time only depends on the
+    number of candles. Outlier wicks are scaled down to the median wick length."""
+    try:
+        set = handler.getDataset(timebase, 'ALL', start=start)
+    except:
+        return None, None, None, None, None
+    x = set['MTS'].values
+    bodyHigh = np.fmax(set['OPEN'].values, set['CLOSE'].values)
+    bodyLow = np.fmin(set['OPEN'].values, set['CLOSE'].values)
+    window = 2*statlength + 1
+    results = []
+    for type, wick, body, polarity in (('HIGH', set['HIGH'].values - bodyHigh, bodyHigh, 1), ('LOW', bodyLow - set['LOW'].values, bodyLow, -1)):
+        median = rollingMedian(wick, window)
+        mad = rollingMedian(np.abs(wick - median), window)
+        with np.errstate(invalid='ignore'):
+            outliers = np.flatnonzero(wick - median > madlimit*mad_to_sigma*np.fmax(mad, 1e-12))
+        results.append((x[outliers], set[type].values[outliers].copy()))
+        values = set[type].values.copy()
+        values[outliers] = body[outliers] + polarity*median[outliers]
+        set[type] = values
+    print('Found {} positive outliers and {} negative outliers.'.format(len(results[0][0]), len(results[1][0])))
+    return set, results[0][0], results[0][1], results[1][0], results[1][1]
@@ -0,0 +1,256 @@
+import os
+import json
+import socket
+import threading
+import socketserver
+import collections
+import numpy as np
+from src import converters
+
+"""Local query service for a candles file, so that many processes can share one open CandlesHandler.
+
+The server opens the candles file read-only once, and keeps the results of recent queries in a cache that is
+cleared whenever the file changes on disk. The file is opened without a lock, so that the sync and clean tools can
+still write to it. A query that ran while the file changed is answered again from the reopened file. Clients are
+served in parallel: only the check of the file and the cache are locked, not the reads. It listens on a Unix socket,
+or on a localhost TCP port on systems without Unix sockets (Windows).
+
+Protocol: a client sends one request per line as JSON, e.g.
+
+    {"op": "getDataset", "timebase": "1m", "coloumns": ["MTS", "CLOSE"], "start": 1514764800, "end": null}
+
+and the server answers with one line of JSON and, for getDataset, the rows as raw float64 bytes:
+
+    {"rows": 1440, "coloumns": ["MTS", "CLOSE"], "index": false}\n<1440*2*8 bytes>
+
+Errors are answered with {"error": "..."}. A connection can be used for any number of requests.
+CandlesClient.getDataset mirrors CandlesHandler.getDataset."""
+
+#TCP port used when Unix sockets are not available.
+default_port = 50555
+
+
+def defaultAddress(path):
+    """Returns the default address of the server of a candles file: a Unix socket next to the file, or a localhost port."""
+    if hasattr(socket, 'AF_UNIX'):
+        return os.path.splitext(os.path.abspath(path))[0] + '.sock'
+    return ('127.0.0.1', default_port)
+
+
+def parseAddress(address):
+    """Parses "host:port" into a TCP address. Anything else is taken as the path of a Unix socket."""
+    if isinstance(address, str) and ':' in address and not os.path.sep in address:
+        host, port = address.rsplit(':', 1)
+        return (host, int(port))
+    return address
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Answers the requests of one connection."""
+
+    def handle(self):
+        try:
+            for line in self.rfile:
+                try:
+                    header, payload = self.server.candles.query(json.loads(line))
+                except Exception as e:
+                    header, payload = {'error': "{}: {}".format(type(e).__name__, e)}, b''
+                self.wfile.write(json.dumps(header).encode() + b'\n')
+                if payload:
+                    self.wfile.write(payload)
+                self.wfile.flush()
+        except ConnectionError:
+            pass #The client disconnected.
+
+
+class _Reader(object):
+    """A read-only CandlesHandler of the candles file, shared by the queries that run on it. When the file changes, a new
+    reader replaces it, and the old one is closed once its last query is done."""
+
+    def __init__(self, path, stamp):
+        from src import dataset_handler as dh
+        self.handler = dh.CandlesHandler(path=path, mode="r", locking=False)
+        self.stamp = stamp
+        self.users = 0
+        self.retired = False
+
+
+class CandlesServer(object):
+    """Serves queries of a candles file to local clients.
+
+    Parameters
+    ----------
+    path            :   String. Path of the candles file.
+    address=None    :   Optional. Path of a Unix socket, or a (host, port) tuple. Defaults to defaultAddress(path).
+    cacheEntries=64 :   Integer. Number of query results kept in the cache.
+    """
+
+    def __init__(self, path, address=None, cacheEntries=64):
+        self.path = path
+        self.address = parseAddress(address) if address is not None else defaultAddress(path)
+        self.cacheEntries = cacheEntries
+        self.hits = 0
+        self.misses = 0
+        self._cache = collections.OrderedDict()
+        #Guards the reader, the cache and the counters. Queries read the file without holding it.
+        self._lock = threading.Lock()
+        self._reader = _Reader(path, self._fileStamp())
+        if isinstance(self.address, str):
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self._server = socketserver.ThreadingUnixStreamServer(self.address, _RequestHandler)
+        else:
+            self._server = socketserver.ThreadingTCPServer(self.address, _RequestHandler)
+        self._server.daemon_threads = True
+        self._server.candles = self
+
+    def _fileStamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _checkFile(self):
+        """Replaces the reader and clears the cache if the file changed since it was opened. Call with the lock held."""
+        stamp = self._fileStamp()
+        if stamp != self._reader.stamp:
+            self._release(self._reader, retire=True)
+            self._reader = _Reader(self.path, stamp)
+            self._cache.clear()
+
+    def _release(self, reader, retire=False):
+        """Marks a reader as replaced and/or one of its queries as done, and closes it when it is unused. Call with the lock held."""
+        reader.retired = reader.retired or retire
+        if reader.retired and reader.users == 0:
+            reader.handler.close()
+
+    def query(self, request):
+        """Answers one request. Returns the response header (a dictionary) and the payload bytes."""
+        key = json.dumps(request, sort_keys=True)
+        op = request.get('op')
+        while True:
+            with self._lock:
+                self._checkFile()
+                if op == 'stats':
+                    return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._cache)}, b''
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return self._cache[key]
+                if op not in ('getDataset', 'latestMTS'):
+                    raise ValueError("Unknown op \"{}\".".format(op))
+                reader = self._reader
+                reader.users += 1
+            try:
+                if op == 'getDataset':
+                    response = self._getDataset(reader.handler, request)
+                else:
+                    response = (reader.handler.latestMTS(), b'')
+            except (OSError, KeyError):
+                #The file can be unreadable while another process writes to it.
+                if self._fileStamp() == reader.stamp:
+                    raise
+                response = None
+            finally:
+                with self._lock:
+                    reader.users -= 1
+                    self._release(reader)
+            #A query that ran while the file changed is run again on a new reader.
+            if self._fileStamp() == reader.stamp:
+                break
+        with self._lock:
+            self.misses += 1
+            if reader is self._reader:
+                self._cache[key] = response
+                while len(self._cache) > self.cacheEntries:
+                    self._cache.popitem(last=False)
+        return response
+
+    def _getDataset(self, handler, request):
+        coloumns = request.get('coloumns', 'ALL')
+        index = bool(request.get('index', False))
+        names = handler.valid_coloumns if coloumns == 'ALL' else list(coloumns)
+        #With index=True, the MTS values of the index are sent as an extra first coloumn.
+        queried = names if not index else ['MTS'] + names
+        dataframe = handler.getDataset(request['timebase'], queried, start=request.get('start'), end=request.get('end'),
+                                             startIndex=request.get('startIndex'), endIndex=request.get('endIndex'),
+                                             length=request.get('length'))
+        values = np.ascontiguousarray(dataframe.values, dtype=np.float64).reshape(len(dataframe), len(queried))
+        return {'rows': len(values), 'coloumns': names, 'index': index}, values.tobytes()
+
+    def serveForever(self):
+        """Serves requests until shutdown is called."""
+        print("Serving \"{}\" on {}".format(self.path, self.address))
+        self._server.serve_forever()
+
+    def shutdown(self):
+        """Stops serving, and closes the socket and the candles file."""
+        self._server.shutdown()
+        self._server.server_close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+        with self._lock:
+            self._release(self._reader, retire=True)
+
+
+class CandlesClient(object):
+    """Client of a CandlesServer. Its getDataset takes the same parameters as CandlesHandler.getDataset.
+
+    Parameters
+    ----------
+    address     :   Path of the Unix socket, a (host, port) tuple, or "host:port". defaultAddress(path) gives the
+                    default address of the server of a candles file.
+    """
+
+    def __init__(self, address):
+        self.address = parseAddress(address)
+        if isinstance(self.address, str):
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._socket.connect(self.address)
+        self._file = self._socket.makefile('rwb')
+
+    def _request(self, request):
+        self._file.write(json.dumps(request).encode() + b'\n')
+        self._file.flush()
+        header = json.loads(self._file.readline())
+        if 'error' in header:
+            raise RuntimeError("The candles server could not answer the request: {}".format(header['error']))
+        return header
+
+    def getDataset(self, timebase, coloumns, start=None, end=None, startIndex=None, endIndex=None, length=None, index=False):
+        """Returns the dataset specified as a pandas dataframe. See CandlesHandler.getDataset."""
+        import pandas
+        request = {'op': 'getDataset', 'timebase': timebase, 'coloumns': coloumns, 'index': index,
+                   'start': None if start is None else float(converters.toTs(start)),
+                   'end': None if end is None else float(converters.toTs(end)),
+                   'startIndex': None if startIndex is None else int(startIndex),
+                   'endIndex': None if endIndex is None else int(endIndex),
+                   'length': None if length is None else int(length)}
+        header = self._request(request)
+        width = len(header['coloumns']) + (1 if header['index'] else 0)
+        values = np.empty((header['rows'], width), dtype=np.float64)
+        buffer = memoryview(values).cast('B')
+        received = 0
+        while received < len(buffer):
+            count = self._file.readinto(buffer[received:])
+            if not count:
+                raise RuntimeError("The candles server closed the connection.")
+            received += count
+        if header['index']:
+            dataframe = pandas.DataFrame(values[:, 1:], columns=header['coloumns'])
+            dataframe.index = pandas.DatetimeIndex(converters.tsArrayToDt64(values[:, 0]), name='DATETIME')
+            return dataframe
+        return pandas.DataFrame(values, columns=header['coloumns'])
+
+    def latestMTS(self):
+        """Returns a dictionary of the latest MTS timestamps of each dataset. See CandlesHandler.latestMTS."""
+        return self._request({'op': 'latestMTS'})
+
+    def stats(self):
+        """Returns the cache hits and misses of the server."""
+        return self._request({'op': 'stats'})
+
+    def close(self):
+        self._file.close()
+        self._socket.close()
@@ -0,0 +1,158 @@
+import os
+import sys
+import weakref
+import collections
+import numpy as np
+from multiprocessing import shared_memory
+
+"""Shared-memory candle arrays for multi-process work such as parameter sweeps.
+
+The parent process loads timebase/coloumn ranges into shared memory blocks once, and passes their descriptors to
+the workers. Workers attach to a descriptor and get a read-only numpy view of the block, without copying it:
+
+    with SharedCandles(handler) as shared:
+        descriptor = shared.load('1m', ['MTS', 'CLOSE'], start='2018-01-01 00:00:00')
+        with ProcessPoolExecutor() as executor:
+            results = list(executor.map(backtest, [descriptor]*32, parameters))
+
+    def backtest(descriptor, parameter):
+        with attach(descriptor) as candles:
+            close = candles.values[:, 1]
+            ...
+
+The blocks belong to the SharedCandles that created them. They are freed when it is closed (or garbage collected),
+so it must outlive the workers. Attaching never frees a block."""
+
+SharedDescriptor = collections.namedtuple('SharedDescriptor', ['name', 'timebase', 'coloumns', 'shape', 'dtype', 'tracker'], defaults=(None,))
+SharedDescriptor.__doc__ = """Picklable description of a shared candles array: the name of the shared memory block,
+the timebase and coloumns of the candles, the shape and dtype of the array, and the identity of the resource
+tracker of the owner (see AttachedCandles)."""
+
+
+def _trackerId():
+    """Returns an identity of the resource tracker of this process that is the same in every process sharing it: the
+    device and inode of the pipe to the tracker. Child processes inherit the pipe, but not the process id of the
+    tracker. Returns None if there is no tracker."""
+    from multiprocessing import resource_tracker
+    fd = getattr(resource_tracker._resource_tracker, '_fd', None)
+    if fd is None:
+        return None
+    try:
+        info = os.fstat(fd)
+    except OSError:
+        return None
+    return (info.st_dev, info.st_ino)
+
+
+def _release(blocks):
+    """Closes and frees shared memory blocks."""
+    for block in blocks:
+        block.close()
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+    blocks.clear()
+
+
+class SharedCandles(object):
+    """Owner of shared memory blocks of candles. Use it as a context manager, or call close when done.
+
+    Parameters
+    ----------
+    handler     :   An open CandlesHandler to load the candles from.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self._blocks = []
+        self._finalizer = weakref.finalize(self, _release, self._blocks)
+
+    def load(self, timebase, coloumns='ALL', start=None, end=None, chunkRows=1000000):
+        """Copies candles into a new shared memory block, reading the hdf5 file in chunks.
+        Parameters
+        ----------
+        timebase            :   The timebase of the candles.
+        coloumns='ALL'      :   The coloumns to load. Either the string 'ALL', or a list of coloumn names.
+        start, end          :   Optional. Only rows with start <= MTS <= end are loaded. Same formats as in getDataset.
+        chunkRows=1000000   :   Integer. Number of rows read at a time.
+
+        Returns
+        -------
+        descriptor          :   SharedDescriptor of the block. Pass it to attach in the workers."""
+        _, names = self.handler._coloumnIndices(coloumns)
+        startIndex, endIndex = self.handler._indexRange(timebase, start, end)
+        shape = (endIndex - startIndex, len(names))
+        #A shared memory block can not be empty.
+        block = shared_memory.SharedMemory(create=True, size=max(1, shape[0]*shape[1]*8))
+        self._blocks.append(block)
+        array = np.ndarray(shape, dtype=np.float64, buffer=block.buf)
+        filled = 0
+        for rows in self.handler.iterDataset(timebase, names, start=start, end=end, chunkRows=chunkRows, asPandas=False):
+            array[filled:filled+len(rows)] = rows
+            filled += len(rows)
+        del array #The block can not be closed while a view of it exists.
+        return SharedDescriptor(block.name, timebase, names, shape, 'float64', _trackerId())
+
+    def close(self):
+        """Frees all blocks. Workers that are still attached keep their views until they detach."""
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AttachedCandles(object):
+    """A worker's read-only view of a shared candles array. Use it as a context manager, or call close when done.
+    values is the read-only numpy array, and coloumns are the names of its coloumns."""
+
+    def __init__(self, descriptor):
+        self.descriptor = descriptor
+        self.coloumns = list(descriptor.coloumns)
+        if sys.version_info >= (3, 13):
+            self._block = shared_memory.SharedMemory(name=descriptor.name, track=False)
+        else:
+            #Before Python 3.13, attaching registers the block with the resource tracker, which then frees it when the
+            #process exits, while the owner and other workers still use it. The registration is therefore removed again,
+            #unless this process shares the tracker of the owner (the owner itself, or its multiprocessing workers). There,
+            #it was the owner's own registration, which must stay so that the tracker frees the block if the owner dies.
+            #Only POSIX shared memory is registered.
+            from multiprocessing import resource_tracker
+            self._block = shared_memory.SharedMemory(name=descriptor.name)
+            if os.name == 'posix' and (descriptor.tracker is None or _trackerId() != tuple(descriptor.tracker)):
+                resource_tracker.unregister(self._block._name, 'shared_memory')
+        self.values = np.ndarray(descriptor.shape, dtype=descriptor.dtype, buffer=self._block.buf)
+        self.values.flags.writeable = False
+
+    def dataframe(self, index=False):
+        """Returns the candles as a pandas dataframe. For a single dtype, pandas uses the shared values without copying
+        them, so the dataframe must not be modified, and must not be used after close.
+        With index=True, it is indexed by a DatetimeIndex built from the MTS coloumn, which must have been loaded."""
+        import pandas
+        from src import converters
+        dataframe = pandas.DataFrame(self.values, columns=self.coloumns)
+        if index:
+            dataframe.index = pandas.DatetimeIndex(converters.tsArrayToDt64(self.values[:, self.coloumns.index('MTS')]), name='DATETIME')
+        return dataframe
+
+    def close(self):
+        """Detaches from the block. values can not be used afterwards."""
+        if self._block is not None:
+            self.values = None
+            self._block.close()
+            self._block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def attach(descriptor):
+    """Attaches to the shared candles array of a descriptor returned by SharedCandles.load.
+    Returns an AttachedCandles with a read-only numpy view of the array."""
+    return AttachedCandles(descriptor)
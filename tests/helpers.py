@@ -0,0 +1,48 @@
+import numpy as np
+from src import dataset_handler as dh
+
+"""Shared helpers of the tests: synthetic candles and candle files in temporary directories."""
+
+
+def candleRows(start, count, step=60):
+    """Returns count synthetic candles in the candles format, starting at the MTS start, step seconds apart."""
+    mts = start + step*np.arange(count, dtype=np.float64)
+    close = 1000 + np.arange(count, dtype=np.float64)
+    return np.column_stack([mts, close - 1, close, close + 2, close - 3, np.full(count, 0.5)])
+
+
+def newHandler(path, rows=None, timebase='1m', **options):
+    """Creates a candles file at path without prompting, and appends rows to a timebase if given."""
+    handler = dh.CandlesHandler(**options)
+    handler.open(str(path), new=True)
+    if rows is not None:
+        handler._appendRows(timebase, rows)
+    return handler
+
+
+def runWithTimeout(func, seconds=10):
+    """Runs func in a thread and returns its result. Fails if it does not return within seconds, e.g. because it hangs."""
+    import threading
+    result = {}
+
+    def target():
+        try:
+            result['value'] = func()
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    assert not thread.is_alive(), "The call did not return within {} seconds.".format(seconds)
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
+
+
+def writeConfig(directory, candlespath):
+    """Writes a config file whose raw and clean candles files are both candlespath. Returns its path."""
+    path = str(directory/'config.ini')
+    with open(path, 'w') as file:
+        file.write("[DATASETS]\ncandles_dataset_path = {}\nclean_candles_dataset_path = {}\n".format(candlespath, candlespath))
+    return path
@@ -0,0 +1,31 @@
+import numpy as np
+from tests.helpers import candleRows, newHandler
+
+start = 1514764800
+
+
+def alignedHandler(path):
+    handler = newHandler(path, candleRows(start, 180))
+    handler._appendRows('1h', candleRows(start, 3, step=3600))
+    return handler
+
+
+def test_no_lookahead(tmp_path):
+    handler = alignedHandler(tmp_path/'c.hdf5')
+    aligned = handler.getAligned(['1m', '1h'], ['CLOSE'])
+    assert len(aligned) == 180
+    #The first 1h candle has only closed on the 1m row starting at 00:59.
+    assert np.isnan(aligned['1h_CLOSE'].values[:59]).all()
+    assert (aligned['1h_CLOSE'].values[59:119] == 1000).all()
+    assert (aligned['1h_CLOSE'].values[119:179] == 1001).all()
+    assert aligned['1h_CLOSE'].values[179] == 1002
+    assert np.array_equal(aligned['1m_CLOSE'].values, 1000 + np.arange(180))
+
+
+def test_range_matches_full(tmp_path):
+    handler = alignedHandler(tmp_path/'c.hdf5')
+    full = handler.getAligned(['1h', '1m'], 'ALL')
+    part = handler.getAligned(['1m', '1h'], 'ALL', start=start + 90*60, end=start + 150*60)
+    expected = full[(full['MTS'] >= start + 90*60) & (full['MTS'] <= start + 150*60)].reset_index(drop=True)
+    assert list(part.columns) == list(full.columns)
+    assert np.array_equal(part.values, expected.values)
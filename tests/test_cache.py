@@ -0,0 +1,97 @@
+import os
+import gzip
+import json
+import time
+import pytest
+from src import clients
+from tests.helpers import newHandler
+
+start_mts = 1500000000
+page_size = 100
+#Number of candles served for every timeframe. Timeframes with long candles stop at the last closed candle.
+candle_counts = {'1m': 550}
+
+
+class FakeAPI(object):
+    """Serves the candles API from synthetic candles, in place of BitfinexPublic._get."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def candles(self, timeframe):
+        step = clients.timeframe_seconds[timeframe]
+        count = min(candle_counts.get(timeframe, 200), int((time.time() - start_mts)//step))
+        return [[(start_mts + step*n)*1000, 100.0 + n, 101.0 + n, 103.0 + n, 99.0 + n, 1.0] for n in range(count)]
+
+    def __call__(self, url, return_json=True, **kwargs):
+        self.calls += 1
+        path, _, query = url.partition('?')
+        timeframe = path.split(':')[1]
+        candles = self.candles(timeframe)
+        if path.endswith('/last'):
+            return list(candles[-1])
+        params = dict(item.split('=') for item in query.split('&'))
+        return [list(candle) for candle in candles if candle[0] >= int(params['start'])][:int(params['limit'])]
+
+
+def noNetwork(url, **kwargs):
+    raise AssertionError("Replay mode made a request: {}".format(url))
+
+
+def syncedClient(cachedir, replay=False):
+    client = clients.BitfinexPublic(cache=clients.CandleCache(str(cachedir), replay=replay), page_size=page_size)
+    client._get = noNetwork if replay else FakeAPI()
+    return client
+
+
+def cachedPages(cachedir):
+    pages = []
+    for root, _, files in os.walk(str(cachedir)):
+        for name in files:
+            if name.endswith('.json.gz'):
+                with gzip.open(os.path.join(root, name), 'rt') as f:
+                    pages.append((os.path.join(root, name), json.load(f)))
+    return pages
+
+
+def test_replay_reproduces_sync(tmp_path):
+    online = newHandler(tmp_path/'online.hdf5')
+    online.syncDatafile(syncedClient(tmp_path/'cache'))
+    replayed = newHandler(tmp_path/'replay.hdf5')
+    replayed.syncDatafile(syncedClient(tmp_path/'cache', replay=True))
+    assert online._committedRows('1m') == 550
+    #Only full pages are cached, so the replay ends with the last full page.
+    assert replayed._committedRows('1m') == 500
+    for timebase in ('5m', '1h', '1D'):
+        assert replayed._committedRows(timebase) == online._committedRows(timebase) == 200
+
+
+def test_replay_miss_stops_instead_of_skipping_ahead(tmp_path):
+    online = newHandler(tmp_path/'online.hdf5')
+    online.syncDatafile(syncedClient(tmp_path/'cache'))
+    #Remove the second page of 1m candles, as if it had been evicted.
+    for path, page in cachedPages(tmp_path/'cache'):
+        if page[0][0] == (start_mts + page_size*60)*1000 and page[1][0] - page[0][0] == 60000:
+            os.remove(path)
+    replayed = newHandler(tmp_path/'replay.hdf5')
+    with pytest.raises(clients.BitfinexError):
+        replayed.syncDatafile(syncedClient(tmp_path/'cache', replay=True))
+    #The rows before the missing page are kept, without a gap.
+    assert replayed._committedRows('1m') == page_size
+    result = replayed.validate(timebases=['1m'])['1m']
+    assert result['gaps'] == 0 and result['missing_candles'] == 0
+
+    #A later online sync continues where the replay stopped.
+    replayed.syncDatafile(syncedClient(tmp_path/'cache'))
+    assert replayed._committedRows('1m') == 550
+    assert replayed.validate(timebases=['1m'])['1m']['gaps'] == 0
+
+
+def test_storing_a_page_again_keeps_the_size(tmp_path):
+    cache = clients.CandleCache(str(tmp_path/'cache'), max_bytes=10**9)
+    pages = {n: [[(start_mts + 60*m)*1000, 1.0, 1.0, 1.0, 1.0, 1.0] for m in range(n, n + 100)] for n in range(3)}
+    for n, page in pages.items():
+        cache.put(str(n)*8, page, '1m', 'tBTCUSD')
+    for _ in range(5):
+        cache.put('0'*8, pages[0], '1m', 'tBTCUSD')
+    assert cache._size == sum(size for _, size, _ in cache._pages())
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from src import cleaning
+from src import dataset_handler as dh
+from tests.helpers import newHandler
+from tests.test_outliers import spikedRows
+
+
+def cleanFile(tmp_path, rawPath, name, workers, engine):
+    clean = newHandler(tmp_path/name)
+    #The raw file has no 1h candles, so that job has nothing to save.
+    jobs = [('1m', None, 'replace'), ('5m', None, 'replace'), ('1h', None, 'replace')]
+    cleaning.cleanCandles(str(rawPath), clean, jobs, workers=workers, engine=engine, settings={'statlength': 10})
+    return clean
+
+
+def test_parallel_clean_matches_serial(tmp_path):
+    rawPath = tmp_path/'raw.hdf5'
+    raw = newHandler(rawPath, spikedRows())
+    fiveMinutes = spikedRows(350)
+    fiveMinutes[:, 0] = 1500000000 + 300*np.arange(350)
+    raw._appendRows('5m', fiveMinutes)
+    raw.close()
+
+    for engine in ('gaussian', 'mad'):
+        serial = cleanFile(tmp_path, rawPath, 'serial_{}.hdf5'.format(engine), 1, engine)
+        parallel = cleanFile(tmp_path, rawPath, 'parallel_{}.hdf5'.format(engine), 2, engine)
+        for timebase in ('1m', '5m'):
+            expected = serial.getDataset(timebase, 'ALL').values
+            assert len(expected) > 0
+            assert np.array_equal(parallel.getDataset(timebase, 'ALL').values, expected, equal_nan=True)
+
+
+def test_failed_job_closes_the_raw_file(tmp_path, monkeypatch):
+    rawPath = tmp_path/'raw.hdf5'
+    newHandler(rawPath, spikedRows()).close()
+    closed = []
+    close = dh.CandlesHandler.close
+    monkeypatch.setattr(dh.CandlesHandler, 'close', lambda self: (closed.append(self.datafile_path), close(self)))
+    with pytest.raises(ValueError):
+        cleaning.cleanJob(str(rawPath), '1m', None, 'unknown', {})
+    assert closed == [str(rawPath)]
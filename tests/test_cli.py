@@ -0,0 +1,26 @@
+import time
+from src import cli
+from tests.helpers import candleRows, newHandler, writeConfig
+
+
+def test_missing_config(tmp_path, capsys):
+    assert cli.main(['--config', str(tmp_path/'missing.ini'), 'status']) == 1
+    assert "Could not find configuration file" in capsys.readouterr().out
+
+
+def test_status_prints_latest_candles(tmp_path, capsys):
+    path = tmp_path/'c.hdf5'
+    newHandler(path, candleRows(time.time()//60*60 - 600, 10)).close()
+    configpath = writeConfig(tmp_path, path)
+    assert cli.main(['--config', configpath, 'status']) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith('1m\t') and lines[0].endswith('ok')
+    assert "Dataset is empty!" in lines[1]
+
+
+def test_status_max_age(tmp_path, capsys):
+    path = tmp_path/'c.hdf5'
+    newHandler(path, candleRows(time.time()//60*60 - 3600, 10)).close()
+    configpath = writeConfig(tmp_path, path)
+    assert cli.main(['--config', configpath, 'status', '--max-age', '60']) == 1
+    assert 'STALE' in capsys.readouterr().out
@@ -0,0 +1,26 @@
+import datetime
+import numpy as np
+from src import converters
+from tests.helpers import candleRows, newHandler
+
+
+def test_array_conversions_round_trip():
+    timestamps = np.array([0, 1500000000, 1514764800.0, np.nan])
+    dt64 = converters.tsArrayToDt64(timestamps)
+    assert dt64[2] == np.datetime64('2018-01-01T00:00:00')
+    assert np.isnat(dt64[3])
+    assert list(converters.tsArrayToStr(timestamps)) == ['1970-01-01 00:00:00', '2017-07-14 02:40:00', '2018-01-01 00:00:00', 'NaT']
+    assert np.array_equal(converters.strArrayToTs(['2017-07-14 02:40:00', '2018-01-01 00:00:00']), [1500000000, 1514764800])
+    assert np.array_equal(converters.dt64ToTs(dt64[:3]), [0, 1500000000, 1514764800])
+
+
+def test_scalar_conversions_agree():
+    for value in ('2018-01-01 00:00:00', np.datetime64('2018-01-01T00:00:00'), 1514764800, datetime.datetime(2018, 1, 1)):
+        assert converters.toTs(value) == 1514764800
+
+
+def test_getDataset_index(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(1514764800, 10))
+    dataframe = handler.getDataset('1m', ['MTS', 'CLOSE'], start='2018-01-01 00:03:00', index=True)
+    assert str(dataframe.index[0]).startswith('2018-01-01 00:0')
+    assert np.array_equal(converters.dt64ToTs(dataframe.index.values), dataframe['MTS'].values)
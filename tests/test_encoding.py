@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from src import dataset_handler as dh
+from tests.helpers import candleRows, newHandler
+
+
+def roundedRows(count):
+    """Candles with 2 price decimals and 4 volume decimals, and a row with NaN prices."""
+    rows = candleRows(1500000000, count)
+    rows[:, 1:5] += 0.25
+    rows[:, 5] = np.round(np.random.default_rng(0).uniform(0, 100, count), 4)
+    rows[3, 1:5] = np.nan
+    return rows
+
+
+@pytest.mark.parametrize('encoding', ['float64', 'float32', 'int64', 'int32'])
+def test_rows_round_trip(tmp_path, encoding):
+    rows = roundedRows(50)
+    handler = newHandler(tmp_path/'c.hdf5', rows, encoding=encoding)
+    stored = handler._readRows('1m', 0, 50)
+    assert np.array_equal(stored[:, 0], rows[:, 0])
+    assert np.array_equal(np.isnan(stored), np.isnan(rows))
+    tolerance = 1e-3 if encoding == 'float32' else 1e-9
+    assert np.nanmax(np.abs(stored[:, 1:] - rows[:, 1:])) < tolerance
+    handler.close()
+
+    #The encoding is read from the file when it is opened again.
+    handler = dh.CandlesHandler(path=str(tmp_path/'c.hdf5'), mode="r")
+    assert np.array_equal(handler._readRows('1m', 0, 50), stored, equal_nan=True)
+
+
+def test_convertEncoding_reports_round_trip_error(tmp_path):
+    rows = roundedRows(50)
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    report = handler.convertEncoding(str(tmp_path/'int.hdf5'), encoding='int64')
+    assert max(report['1m'].values()) < 1e-9
+    converted = dh.CandlesHandler(path=str(tmp_path/'int.hdf5'), mode="r")
+    assert np.allclose(converted._readRows('1m', 0, 50), rows, equal_nan=True)
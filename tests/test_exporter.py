@@ -0,0 +1,39 @@
+import os
+import numpy as np
+import pytest
+from src import exporter
+from tests.helpers import candleRows, newHandler
+
+pytest.importorskip('pyarrow')
+
+#Hourly candles from 2018-01-15 over about three months.
+rows = candleRows(1515974400, 2000, step=3600)
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_round_trip(tmp_path, fmt):
+    handler = newHandler(tmp_path/'c.hdf5', rows, timebase='1h')
+    directory = str(tmp_path/'export')
+    assert exporter.exportCandles(handler, directory, timebases=['1h'], fmt=fmt, workers=2, chunkRows=97) == {'1h': 2000}
+    months = sorted(os.listdir(os.path.join(directory, '1h')))
+    assert months == ['month=2018-01', 'month=2018-02', 'month=2018-03', 'month=2018-04']
+
+    imported = newHandler(tmp_path/'imported.hdf5')
+    assert exporter.importCandles(imported, directory, workers=2, batchRows=500) == {'1h': 2000}
+    assert np.array_equal(imported.getDataset('1h', 'ALL').values, rows)
+
+
+def test_export_range_and_coloumns(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', rows, timebase='1h')
+    directory = str(tmp_path/'export')
+    counts = exporter.exportCandles(handler, directory, timebases=['1h'], coloumns=['CLOSE'], start='2018-02-01 00:00:00', end='2018-02-28 23:00:00')
+    assert counts == {'1h': 28*24}
+    dataframe = exporter._readFile(os.path.join(directory, '1h', 'month=2018-02', 'part-0.parquet'))
+    assert list(dataframe.columns) == ['MTS', 'CLOSE']
+    assert dataframe['MTS'].iloc[0] == 1517443200
+
+
+def test_invalid_format(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', rows, timebase='1h')
+    with pytest.raises(ValueError):
+        exporter.exportCandles(handler, str(tmp_path/'export'), fmt='csv')
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas
+import pytest
+from src import features
+from tests.helpers import candleRows, newHandler
+
+start = 1514764800
+
+
+def candlesFrame(first, count):
+    rows = candleRows(start + 60*first, count)
+    rows[:, 2] = 1000*np.exp(0.01*np.sin(first + np.arange(count)))
+    return pandas.DataFrame(rows, columns=['MTS', 'OPEN', 'CLOSE', 'HIGH', 'LOW', 'VOLUME'])
+
+
+def test_feature_values(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5')
+    handler.saveDataset(candlesFrame(0, 100), '1m')
+    for name in ('return', 'logreturn', 'volatility_60', 'pctchange_60'):
+        handler.addFeature(name, timebases=['1m'])
+    stored = handler.getFeatures('1m', ['return', 'logreturn', 'pctchange_60'])
+    close = handler.getDataset('1m', ['CLOSE'])['CLOSE'].values
+    assert np.isnan(stored['return'].values[0])
+    assert np.allclose(stored['return'].values[1:], close[1:]/close[:-1] - 1)
+    assert np.allclose(stored['logreturn'].values[1:], np.diff(np.log(close)))
+    assert np.allclose(stored['pctchange_60'].values[59:], close[59:]/close[:-59] - 1)
+    assert np.isnan(stored['pctchange_60'].values[:59]).all()
+
+
+def test_incremental_update_matches_full_compute(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5')
+    handler.saveDataset(candlesFrame(0, 70), '1m')
+    names = ['return', 'volatility_60', 'pctchange_60']
+    for name in names:
+        handler.addFeature(name, timebases=['1m'])
+    handler.saveDataset(candlesFrame(70, 50), '1m')
+    handler.saveDataset(candlesFrame(120, 3), '1m')
+    stored = handler.getFeatures('1m', names)
+    rows = handler.getDataset('1m', ['CLOSE']).values
+    assert len(stored) == 123
+    for name in names:
+        assert np.allclose(stored[name].values, features.feature_registry[name]['func'](rows), equal_nan=True)
+
+
+def test_unknown_feature(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(start, 5))
+    with pytest.raises(RuntimeError):
+        handler.addFeature('nonexistent')
+    with pytest.raises(RuntimeError):
+        handler.getFeatures('1m', ['return'])
@@ -0,0 +1,80 @@
+import sys
+import time
+import asyncio
+import threading
+import subprocess
+import numpy as np
+from src import dataset_handler as dh
+from tests.helpers import candleRows, newHandler, runWithTimeout
+
+start = 1500000000
+
+
+def appendLater(handler, timebase, rows, delay=0.2):
+    thread = threading.Thread(target=lambda: (time.sleep(delay), handler._appendRows(timebase, rows)))
+    thread.start()
+    return thread
+
+
+def test_subscribe(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(start, 10))
+    received = []
+    subscription = handler.subscribe(lambda timebase, rows: received.append((timebase, rows)), timebases=['1m'], coloumns=['MTS', 'CLOSE'])
+    handler.subscribe(lambda timebase, rows: 1/0)
+    handler._appendRows('1m', candleRows(start + 600, 3))
+    handler._appendRows('5m', candleRows(start, 2, step=300))
+    assert len(received) == 1 and received[0][0] == '1m'
+    assert np.array_equal(received[0][1], candleRows(start + 600, 3)[:, [0, 2]])
+    handler.unsubscribe(subscription)
+    handler._appendRows('1m', candleRows(start + 780, 1))
+    assert len(received) == 1
+    assert handler._committedRows('1m') == 14
+
+
+def test_follow_is_woken_by_appends(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(start, 10))
+    seen = {}
+    writer = appendLater(handler, '1m', candleRows(start + 600, 5))
+    began = time.time()
+    timebase, rows = runWithTimeout(lambda: next(handler.follow('1m', seen=seen, interval=30)))
+    writer.join()
+    #The append wakes the generator, without waiting for the interval.
+    assert time.time() - began < 5
+    assert timebase == '1m' and np.array_equal(rows, candleRows(start + 600, 5))
+    assert seen == {'1m': 15}
+    #A follow that continues from seen only yields the rows after it, and stops after timeout.
+    handler._appendRows('1m', candleRows(start + 900, 2))
+    followed = list(handler.follow(['1m', '5m'], coloumns=['MTS'], seen=seen, interval=0.05, timeout=0.2))
+    assert len(followed) == 1 and np.array_equal(followed[0][1][:, 0], [start + 900, start + 960])
+
+
+def test_afollow(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(start, 10))
+
+    async def collect():
+        return [rows async for timebase, rows in handler.afollow('1m', interval=0.05, timeout=1.0)]
+
+    writer = appendLater(handler, '1m', candleRows(start + 600, 5))
+    followed = asyncio.run(collect())
+    writer.join()
+    assert np.array_equal(np.concatenate(followed), candleRows(start + 600, 5))
+
+
+def test_follow_rows_of_another_process(tmp_path):
+    path = str(tmp_path/'c.hdf5')
+    newHandler(path, candleRows(start, 10)).close()
+    follower = dh.CandlesHandler(path=path, mode="r", locking=False)
+    writer = subprocess.Popen([sys.executable, '-c', "import time; from src import dataset_handler as dh; from tests.helpers import candleRows\n"
+                               "for n in range(3):\n"
+                               "    time.sleep(0.3); h = dh.CandlesHandler(path={!r}, locking=False); h._appendRows('1m', candleRows({} + 60*n, 1)); h.close()".format(path, start + 600)])
+    try:
+        followed = []
+        for _, rows in follower.follow('1m', interval=0.05, timeout=5):
+            followed.append(rows)
+            if sum(len(rows) for rows in followed) >= 3:
+                break
+        assert writer.wait(10) == 0
+    finally:
+        writer.kill()
+    assert np.array_equal(np.concatenate(followed)[:, 0], start + 600 + 60*np.arange(3))
+    follower.close()
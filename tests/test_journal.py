@@ -0,0 +1,42 @@
+import numpy as np
+from src import dataset_handler as dh
+from tests.helpers import candleRows, newHandler
+
+
+def interruptedPage(handler, rows):
+    """Writes a page the way _appendRows does, but stops before the commit marker, like a killed sync."""
+    dataset = handler.candlesfile['1m']
+    journal = handler._journal('1m')
+    length = dataset.shape[0]
+    journal.resize(journal.shape[0]+1, 0)
+    journal[-1, :] = [rows[0, 0], rows[-1, 0], length+len(rows), 0]
+    dataset.resize(length+len(rows), 0)
+    dataset[length:, :] = rows
+    handler.candlesfile.flush()
+
+
+def test_interrupted_page_is_rolled_back(tmp_path):
+    path = tmp_path/'c.hdf5'
+    handler = newHandler(path, candleRows(1500000000, 20))
+    interruptedPage(handler, candleRows(1500000000 + 20*60, 10))
+    handler.close()
+
+    handler = dh.CandlesHandler(path=str(path))
+    assert handler.latestMTS()['1m'] == 1500000000 + 19*60
+    assert handler._recoverDataset('1m') == 10
+    assert handler.candlesfile['1m'].shape[0] == 20
+    journal = handler._journal('1m')[:]
+    assert journal.shape[0] == 1 and journal[-1, 3] == 1
+    #The next page continues after the last committed row.
+    handler._appendRows('1m', candleRows(1500000000 + 20*60, 10))
+    assert handler._committedRows('1m') == 30
+    assert np.array_equal(handler._readRows('1m', 0, 30)[:, 0], candleRows(1500000000, 30)[:, 0])
+
+
+def test_file_without_commit_marker(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(1500000000, 5))
+    dataset = handler.candlesfile['1m']
+    del dataset.attrs['committed_rows']
+    dataset.resize(8, 0)
+    dataset[5:, :] = np.nan
+    assert handler._committedRows('1m') == 5
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from src import cleaning
+from src import outliers
+from tests.helpers import candleRows, newHandler
+
+
+def spikedRows(count=400):
+    """Candles with random wicks, and one long HIGH wick at row 100 and one long LOW wick at row 300."""
+    rows = candleRows(1500000000, count)
+    wicks = np.random.default_rng(0).exponential(3, (count, 2))
+    rows[:, 3] = np.fmax(rows[:, 1], rows[:, 2]) + wicks[:, 0]
+    rows[:, 4] = np.fmin(rows[:, 1], rows[:, 2]) - wicks[:, 1]
+    rows[100, 3] += 500
+    rows[300, 4] -= 500
+    return rows
+
+
+def test_mad_detector_finds_and_scales_spikes(tmp_path):
+    rows = spikedRows()
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    cleaned, outlierXhigh, outlierYhigh, outlierXlow, outlierYlow = outliers.detectOutliers(handler, '1m', engine='mad')
+    assert rows[100, 0] in outlierXhigh and rows[300, 0] in outlierXlow
+    assert outlierYhigh[list(outlierXhigh).index(rows[100, 0])] == rows[100, 3]
+    assert cleaned['HIGH'].values[100] < rows[100, 3] - 400
+    assert cleaned['LOW'].values[300] > rows[300, 4] + 400
+    assert (cleaned['HIGH'].values >= np.fmax(rows[:, 1], rows[:, 2])).all()
+
+
+def test_unknown_engine(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', spikedRows())
+    with pytest.raises(ValueError):
+        outliers.detectOutliers(handler, '1m', engine='unknown')
+
+
+@pytest.mark.parametrize('engine', ['gaussian', 'mad'])
+def test_cleanJob_counts_outliers(tmp_path, engine):
+    path = tmp_path/'c.hdf5'
+    newHandler(path, spikedRows()).close()
+    timebase, cleaned, outlierCount, seconds = cleaning.cleanJob(str(path), '1m', None, engine, {})
+    assert timebase == '1m' and len(cleaned) > 0
+    assert outlierCount >= 2
@@ -0,0 +1,70 @@
+import pytest
+from src import clients
+
+start_mts = 1500000000
+
+
+class PagedAPI(object):
+    """Serves endless 1m candles in place of BitfinexPublic._get. Limits above maxLimit are rejected, and every
+    call reports the download time duration, like BitfinexPublic._request."""
+
+    def __init__(self, client, maxLimit, duration=0.1):
+        self.client = client
+        self.maxLimit = maxLimit
+        self.duration = duration
+        self.limits = []
+
+    def __call__(self, url, return_json=True, **kwargs):
+        params = dict(item.split('=') for item in url.partition('?')[2].split('&'))
+        limit = int(params['limit'])
+        self.limits.append(limit)
+        if limit > self.maxLimit:
+            raise clients.BitfinexError("limit: invalid")
+        self.client.lastduration = self.duration
+        first = int(params['start'])
+        return [[first + 60000*n, 1.0, 1.0, 1.0, 1.0, 1.0] for n in range(limit)]
+
+
+def pagedClient(maxLimit, page_size='auto'):
+    client = clients.BitfinexPublic(page_size=page_size)
+    client._get = PagedAPI(client, maxLimit)
+    return client
+
+
+def test_probe_finds_the_largest_accepted_limit():
+    client = pagedClient(2500)
+    page = client.get_candle_page('1m', 'tBTCUSD', start_mts)
+    assert client._get.limits == [10000, 5000, 2500]
+    assert len(page) == 2500 and page[0][0] == start_mts
+    client.get_candle_page('1m', 'tBTCUSD', start_mts + 2500*60)
+    #Later pages do not probe again.
+    assert client._get.limits[3:] == [2500]
+
+
+def test_limit_adapts_to_the_download_time():
+    client = pagedClient(10000)
+    client.get_candle_page('1m', 'tBTCUSD', start_mts)
+    client._get.duration = 10.0
+    for _ in range(4):
+        client.get_candle_page('1m', 'tBTCUSD', start_mts)
+    #Slow pages halve the limit, down to the smallest page size.
+    assert client._get.limits[1:] == [10000, 5000, 2500, 1250]
+    assert client._pageLimit == 1000
+    client._get.duration = 0.1
+    for _ in range(5):
+        client.get_candle_page('1m', 'tBTCUSD', start_mts)
+    #Fast full pages double it again, up to the largest accepted limit.
+    assert client._get.limits[5:] == [1000, 2000, 4000, 8000, 10000]
+    assert client._pageLimit == 10000
+
+
+def test_fixed_page_size_does_not_probe():
+    client = pagedClient(2500, page_size=100)
+    assert len(client.get_candle_page('1m', 'tBTCUSD', start_mts)) == 100
+    assert client._get.limits == [100]
+
+
+def test_no_accepted_limit():
+    client = pagedClient(10)
+    with pytest.raises(clients.BitfinexError):
+        client.get_candle_page('1m', 'tBTCUSD', start_mts)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas
+from src import dataset_handler as dh
+from tests.helpers import candleRows, newHandler
+
+start = 1514764800
+
+
+def randomRows(first, count, seed):
+    rng = np.random.default_rng(seed)
+    rows = candleRows(start + 60*first, count)
+    rows[:, 3] += rng.uniform(0, 5, count)
+    rows[:, 4] -= rng.uniform(0, 5, count)
+    rows[:, 5] = rng.uniform(0, 2, count)
+    return rows
+
+
+def reference(rows, blockSize):
+    return np.array([[block[0, 0], block[0, 1], block[-1, 2], block[:, 3].max(), block[:, 4].min(), block[:, 5].sum()]
+                     for block in (rows[a:a+blockSize] for a in range(0, len(rows), blockSize))])
+
+
+def test_reduceCandles():
+    rows = randomRows(0, 10, 0)
+    assert np.allclose(dh.reduceCandles(rows, 4), reference(rows, 4))
+
+
+def test_overview_levels(tmp_path):
+    rows = randomRows(0, 1000, 1)
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    overview = handler.getOverview('1m', maxPoints=100)
+    #The finest level with at most 100 blocks has blocks of 4^2 candles.
+    assert np.allclose(overview.values, reference(rows, 16))
+    assert np.allclose(handler.getOverview('1m', maxPoints=1000).values, rows)
+
+
+def test_incremental_update_matches_full_build(tmp_path):
+    rows = randomRows(0, 1000, 2)
+    handler = newHandler(tmp_path/'c.hdf5', rows[:333])
+    handler.updatePyramid('1m')
+    handler.saveDataset(pandas.DataFrame(rows[333:], columns=handler.valid_coloumns), '1m')
+    handler.saveDataset(pandas.DataFrame(rows[-1:].copy() + [[60, 0, 0, 0, 0, 0]], columns=handler.valid_coloumns), '1m')
+    rows = handler.getDataset('1m', 'ALL').values
+    assert len(rows) == 1001
+    group = handler.candlesfile[dh.pyramid_group]['1m']
+    for name in group:
+        assert np.allclose(group[name][:], reference(rows, 2**int(name))), name
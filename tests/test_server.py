@@ -0,0 +1,69 @@
+import sys
+import time
+import threading
+import subprocess
+import numpy as np
+import pytest
+from src import server
+from src import dataset_handler as dh
+from tests.helpers import candleRows, newHandler
+
+pytestmark = pytest.mark.skipif(not hasattr(server.socket, 'AF_UNIX'), reason="Uses a Unix socket.")
+
+
+@pytest.fixture
+def running(tmp_path):
+    """A candles file with 100 1m candles, and a server of it running in a thread."""
+    path = str(tmp_path/'c.hdf5')
+    newHandler(path, candleRows(1500000000, 100)).close()
+    candles = server.CandlesServer(path, address=str(tmp_path/'c.sock'))
+    thread = threading.Thread(target=candles.serveForever, daemon=True)
+    thread.start()
+    yield candles
+    candles.shutdown()
+
+
+def test_getDataset_matches_handler(running):
+    client = server.CandlesClient(running.address)
+    dataframe = client.getDataset('1m', ['MTS', 'CLOSE'], startIndex=10, endIndex=20)
+    assert np.array_equal(dataframe.values, candleRows(1500000000, 100)[10:20][:, [0, 2]])
+    client.getDataset('1m', ['MTS', 'CLOSE'], startIndex=10, endIndex=20)
+    assert client.stats()['hits'] == 1
+    client.close()
+
+
+def test_clients_are_served_in_parallel(running, monkeypatch):
+    original = dh.CandlesHandler.getDataset
+
+    def slow(self, *args, **kwargs):
+        time.sleep(0.5)
+        return original(self, *args, **kwargs)
+
+    monkeypatch.setattr(dh.CandlesHandler, 'getDataset', slow)
+    results = []
+
+    def query(n):
+        client = server.CandlesClient(running.address)
+        results.append(len(client.getDataset('1m', 'ALL', startIndex=n, endIndex=n+1)))
+        client.close()
+
+    threads = [threading.Thread(target=query, args=(n,)) for n in range(4)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1, 1, 1, 1]
+    assert time.perf_counter() - start < 1.5
+
+
+def test_cache_is_cleared_when_the_file_changes(running, tmp_path):
+    client = server.CandlesClient(running.address)
+    assert len(client.getDataset('1m', ['MTS'])) == 100
+    #Another process appends to the file while the server has it open.
+    subprocess.run([sys.executable, '-c', "from src import dataset_handler as dh; from tests.helpers import candleRows; "
+                    "h = dh.CandlesHandler(path={!r}); h._appendRows('1m', candleRows(1500000000 + 100*60, 5)); h.close()".format(running.path)],
+                   check=True)
+    assert len(client.getDataset('1m', ['MTS'])) == 105
+    assert client.latestMTS()['1m'] == 1500000000 + 104*60
+    client.close()
@@ -0,0 +1,71 @@
+import os
+import h5py
+import numpy as np
+from src import dataset_handler as dh
+from tests.helpers import candleRows, newHandler
+
+#One candle per day, so that the rows span several yearly shards.
+day = 60*60*24
+
+
+def shardedHandler(tmp_path, count=1000):
+    handler = newHandler(tmp_path/'c.hdf5', shards='year')
+    for start in range(0, count, 250):
+        handler._appendRows('1m', candleRows(1500000000 + start*day, min(250, count - start), step=day))
+    return handler
+
+
+def test_sharded_reads_match_appended_rows(tmp_path):
+    handler = shardedHandler(tmp_path)
+    assert handler.candlesfile['1m'].is_virtual
+    assert len(handler._shardList(handler._shardDirectory('1m'))) == 4
+    assert np.array_equal(handler._readRows('1m', 0, 1000)[:, 0], candleRows(1500000000, 1000, step=day)[:, 0])
+
+
+def test_missing_virtual_dataset_keeps_shard_rows(tmp_path):
+    handler = shardedHandler(tmp_path)
+    del handler.candlesfile['1m']
+    handler.close()
+    handler = dh.CandlesHandler(path=str(tmp_path/'c.hdf5'))
+    assert handler._committedRows('1m') == 1000
+    assert handler._recoverDataset('1m') == 0
+    assert sum(handler._shardLengths('1m')) == 1000
+
+
+def test_interrupted_rebuild_is_restored(tmp_path):
+    handler = shardedHandler(tmp_path)
+    #A crash between moving the old dataset away and moving the new one in.
+    handler.candlesfile.move('1m', dh.virtual_old.format('1m'))
+    handler.close()
+    handler = dh.CandlesHandler(path=str(tmp_path/'c.hdf5'))
+    assert handler._committedRows('1m') == 1000
+    assert dh.virtual_old.format('1m') not in handler.candlesfile
+    handler._appendRows('1m', candleRows(1500000000 + 1000*day, 10, step=day))
+    assert handler._committedRows('1m') == 1010
+
+
+def test_uncommitted_shard_rows_are_rolled_back(tmp_path):
+    handler = shardedHandler(tmp_path)
+    #Rows written to the active shard by a page that never got its commit marker.
+    rows = candleRows(1500000000 + 1000*day, 5, step=day)
+    handler._appendShardRows('1m', handler._encodeRows('1m', rows), rows[:, 0], handler._shardDirectory('1m'))
+    handler.close()
+    handler = dh.CandlesHandler(path=str(tmp_path/'c.hdf5'))
+    assert handler._recoverDataset('1m') == 5
+    assert sum(handler._shardLengths('1m')) == handler._committedRows('1m') == 1000
+
+
+def test_append_only_opens_the_active_shard(tmp_path, monkeypatch):
+    handler = shardedHandler(tmp_path)
+    directory = handler._shardDirectory('1m')
+    opened = []
+    original = h5py.File
+
+    def tracking(name, *args, **kwargs):
+        if str(name).startswith(directory):
+            opened.append(os.path.basename(str(name)))
+        return original(name, *args, **kwargs)
+
+    monkeypatch.setattr(h5py, 'File', tracking)
+    handler._appendRows('1m', candleRows(1500000000 + 1000*day, 10, step=day))
+    assert set(opened) == {os.path.basename(handler._shardList(directory)[-1])}
@@ -0,0 +1,72 @@
+import sys
+import subprocess
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pytest
+from src import sharedmemory
+from tests.helpers import candleRows, newHandler
+
+
+def closeSum(descriptor):
+    """Worker: attaches to a shared candles array and returns the sum of its CLOSE coloumn."""
+    with sharedmemory.attach(descriptor) as candles:
+        return float(candles.values[:, candles.coloumns.index('CLOSE')].sum())
+
+
+@pytest.fixture
+def handler(tmp_path):
+    return newHandler(tmp_path/'c.hdf5', candleRows(1500000000, 500))
+
+
+def test_attached_view_is_read_only(handler):
+    with sharedmemory.SharedCandles(handler) as shared:
+        descriptor = shared.load('1m', ['MTS', 'CLOSE'], chunkRows=64)
+        with sharedmemory.attach(descriptor) as candles:
+            assert np.array_equal(candles.values, candleRows(1500000000, 500)[:, [0, 2]])
+            with pytest.raises(ValueError):
+                candles.values[0, 0] = 0
+
+
+@pytest.mark.parametrize('method', ['fork', 'spawn'])
+def test_workers_do_not_free_the_block(handler, method):
+    if method not in multiprocessing.get_all_start_methods():
+        pytest.skip("Start method {} is not available.".format(method))
+    expected = candleRows(1500000000, 500)[:, 2].sum()
+    with sharedmemory.SharedCandles(handler) as shared:
+        descriptor = shared.load('1m', ['MTS', 'CLOSE'])
+        with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context(method)) as executor:
+            assert list(executor.map(closeSum, [descriptor]*4)) == [expected]*4
+        #The block outlives the workers.
+        assert closeSum(descriptor) == expected
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=descriptor.name)
+
+
+def test_unrelated_process_does_not_free_the_block(handler):
+    with sharedmemory.SharedCandles(handler) as shared:
+        descriptor = shared.load('1m', ['MTS', 'CLOSE'])
+        #A process that is not a multiprocessing worker of the owner has its own resource tracker.
+        output = subprocess.run([sys.executable, '-c', "from src import sharedmemory; from tests.test_sharedmemory import closeSum; "
+                                 "print(closeSum(sharedmemory.SharedDescriptor(*{!r})))".format(tuple(descriptor))],
+                                check=True, capture_output=True, text=True)
+        assert float(output.stdout) == candleRows(1500000000, 500)[:, 2].sum()
+        assert 'leaked' not in output.stderr
+        assert closeSum(descriptor) == candleRows(1500000000, 500)[:, 2].sum()
+
+
+def test_attach_does_not_replace_the_tracker_registration(handler, monkeypatch):
+    register = resource_tracker.register
+    original = shared_memory.SharedMemory
+    seen = []
+
+    def recording(*args, **kwargs):
+        seen.append(resource_tracker.register is register)
+        return original(*args, **kwargs)
+
+    with sharedmemory.SharedCandles(handler) as shared:
+        descriptor = shared.load('1m', ['CLOSE'])
+        monkeypatch.setattr(sharedmemory.shared_memory, 'SharedMemory', recording)
+        sharedmemory.attach(descriptor).close()
+    assert seen == [True]
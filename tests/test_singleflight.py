@@ -0,0 +1,84 @@
+import time
+import threading
+from src import clients
+
+
+def concurrently(func, count=16):
+    """Calls func from count threads at once and returns their results."""
+    barrier = threading.Barrier(count)
+    results = [None]*count
+
+    def call(n):
+        barrier.wait()
+        results[n] = func()
+
+    threads = [threading.Thread(target=call, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return results
+
+
+def test_concurrent_calls_are_coalesced():
+    flights = clients.SingleFlight(ttl=0)
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.3)
+        return [1, 2, 3]
+
+    results = concurrently(lambda: flights.do('key', slow))
+    assert len(calls) == 1
+    assert results == [[1, 2, 3]]*16
+    assert flights.stats() == {'hits': 0, 'coalesced': 15, 'calls': 1}
+    #Every caller has its own copy.
+    results[0].append(4)
+    assert results[1] == [1, 2, 3]
+
+
+def test_results_expire_after_ttl():
+    flights = clients.SingleFlight(ttl=0.2)
+    values = iter(range(10))
+    assert flights.do('key', lambda: [next(values)]) == [0]
+    cached = flights.do('key', lambda: [next(values)])
+    assert cached == [0]
+    cached.append(5)
+    assert flights.do('key', lambda: [next(values)]) == [0]
+    assert flights.do('other', lambda: [next(values)]) == [1]
+    time.sleep(0.25)
+    assert flights.do('key', lambda: [next(values)]) == [2]
+    assert flights.stats() == {'hits': 2, 'coalesced': 0, 'calls': 3}
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flights = clients.SingleFlight(ttl=10)
+
+    def failing():
+        time.sleep(0.3)
+        raise clients.BitfinexError("down")
+
+    def call():
+        try:
+            return flights.do('key', failing)
+        except clients.BitfinexError as e:
+            return e
+
+    assert all(isinstance(result, clients.BitfinexError) for result in concurrently(call, 8))
+    assert flights.do('key', lambda: 'up') == 'up'
+
+
+def test_ticker_shares_one_request():
+    client = clients.BitfinexPublic(ttl=1.0)
+    ticker = [1.0, 2.0, 3.0, 4.0, 0.0, 0.0, 2.5, 100.0, 3.0, 1.0]
+    urls = []
+
+    def get(url, return_json=True, **kwargs):
+        urls.append(url)
+        time.sleep(0.2)
+        return list(ticker)
+
+    client._get = get
+    assert concurrently(client.ticker, 8) == [ticker]*8
+    assert urls == ['v2/ticker/tBTCUSD']
@@ -0,0 +1,132 @@
+import time
+import threading
+import warnings
+import numpy as np
+import pytest
+from src import dataset_handler as dh
+from tests.helpers import candleRows, newHandler, runWithTimeout
+
+
+def test_iterDataset_reads_all_rows(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(1500000000, 30))
+    blocks = list(handler.iterDataset('1m', chunkRows=7, asPandas=False))
+    assert [len(block) for block in blocks] == [7, 7, 7, 7, 2]
+    assert np.array_equal(np.concatenate(blocks), candleRows(1500000000, 30))
+
+
+def test_iterDataset_early_break_does_not_hang(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(1500000000, 30))
+    threads = threading.active_count()
+
+    def first():
+        for block in handler.iterDataset('1m', chunkRows=15):
+            time.sleep(0.3) #Lets the background thread fill the queue and reach the end of the data.
+            return block
+
+    assert len(runWithTimeout(first)) == 15
+    assert threading.active_count() == threads
+
+
+def test_iterDataset_close_does_not_hang(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(1500000000, 30))
+    blocks = handler.iterDataset('1m', chunkRows=15)
+    next(blocks)
+    time.sleep(0.3)
+    runWithTimeout(blocks.close)
+
+
+def test_readAhead_closes_source_and_reraises():
+    closed = threading.Event()
+
+    def source():
+        try:
+            yield 1
+            yield 2
+            yield 3
+        finally:
+            closed.set()
+
+    items = dh.readAhead(source())
+    assert next(items) == 1
+    runWithTimeout(items.close)
+    assert closed.is_set()
+
+    def failing():
+        yield 1
+        raise ValueError("broken")
+
+    try:
+        list(dh.readAhead(failing()))
+        assert False
+    except ValueError:
+        pass
+
+
+def referenceWindows(rows, window, stride, horizon):
+    starts = range(0, len(rows) - window - horizon + 1, stride)
+    windows = np.array([rows[s:s+window] for s in starts])
+    targets = np.array([rows[s+window-1+horizon] for s in starts])
+    return windows, targets
+
+
+@pytest.mark.parametrize('window, stride, horizon, chunkRows, batchSize', [(10, 1, 0, 25, 7), (8, 3, 2, 13, 4), (1, 1, 0, 5, 100)])
+def test_iterWindows_matches_reference(tmp_path, window, stride, horizon, chunkRows, batchSize):
+    rows = candleRows(1500000000, 100)
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    expected, expectedTargets = referenceWindows(rows[:, [2, 5]], window, stride, horizon)
+    batches = list(handler.iterWindows('1m', ['CLOSE', 'VOLUME'], window=window, stride=stride, horizon=horizon,
+                                       batchSize=batchSize, chunkRows=chunkRows, normalized=False))
+    assert all(len(windows) <= batchSize for windows, _ in batches)
+    assert np.array_equal(np.concatenate([windows for windows, _ in batches]), expected)
+    if horizon:
+        assert np.array_equal(np.concatenate([targets for _, targets in batches]), expectedTargets)
+
+
+def test_iterWindows_normalizes_prices_but_not_mts_or_volume(tmp_path):
+    rows = candleRows(1500000000, 50)
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    windows, targets = next(handler.iterWindows('1m', window=10, horizon=1, batchSize=5))
+    expected, expectedTargets = referenceWindows(rows, 10, 1, 1)
+    for clmn in (0, 5):
+        assert np.array_equal(windows[..., clmn], expected[:5, :, clmn])
+        assert np.array_equal(targets[:, clmn], expectedTargets[:5, clmn])
+    assert np.allclose(windows[..., 1:5], (expected[:5, :, 1:5] - expected[:5, :1, 1:5])/expected[:5, :1, 1:5])
+    assert np.allclose(targets[:, 1:5], (expectedTargets[:5, 1:5] - expected[:5, 0, 1:5])/expected[:5, 0, 1:5])
+
+
+def test_iterWindows_zero_volume(tmp_path):
+    rows = candleRows(1500000000, 50)
+    #Quiet candles without any trades.
+    rows[::3, 5] = 0
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        batches = list(handler.iterWindows('1m', window=10, horizon=2, batchSize=8))
+    windows = np.concatenate([windows for windows, _ in batches])
+    targets = np.concatenate([targets for _, targets in batches])
+    assert np.isfinite(windows).all() and np.isfinite(targets).all()
+    assert np.array_equal(windows[..., 5], referenceWindows(rows, 10, 1, 2)[0][..., 5])
+
+
+def test_normalizeBatch_zero_first_value():
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        normalized = dh.normalizeBatch([[0.0, 0.0, 2.0], [2.0, 3.0, 1.0]])
+    assert np.array_equal(normalized, [[0.0, 0.0, 0.0], [0.0, 0.5, -0.5]])
+
+
+def test_normalizeBatch_matches_normalize():
+    windows = np.random.default_rng(1).uniform(90, 110, (20, 30))
+    handler = dh.CandlesHandler()
+    assert np.allclose(dh.normalizeBatch(windows), [handler.normalize(window.copy()) for window in windows])
+
+
+def test_iterWindows_early_break_does_not_hang(tmp_path):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(1500000000, 100))
+
+    def first():
+        for windows, targets in handler.iterWindows('1m', window=5, batchSize=10, chunkRows=20):
+            time.sleep(0.3)
+            return windows
+
+    assert len(runWithTimeout(first)) == 10
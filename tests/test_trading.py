@@ -0,0 +1,110 @@
+import json
+import hmac
+import hashlib
+import threading
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from src import clients
+
+key = 'test-key'
+secret = 'test-secret'
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Records every signed POST, and answers it with an order notification."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length'])).decode()
+        with self.server.lock:
+            self.server.requests.append((self.path, dict(self.headers), body))
+        response = json.dumps([0, 'on-req', None, None, [], None, 'SUCCESS', 'Submitted']).encode()
+        self.send_response(200)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def trading():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+    server.requests = []
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = clients.BitfinexTrading(key, secret, workers=4)
+    client.api_url = 'http://127.0.0.1:{}/'.format(server.server_address[1])
+    client.auth_limiter = clients.RateLimiter(rate=1e9, burst=100)
+    yield client, server
+    client.close()
+    server.shutdown()
+    server.server_close()
+
+
+def test_nonces_are_unique_across_threads(tmp_path):
+    for generator in (clients.NonceGenerator(), clients.NonceGenerator(str(tmp_path/'nonce'))):
+        nonces = []
+        lock = threading.Lock()
+
+        def draw():
+            drawn = [generator.next() for _ in range(200)]
+            assert drawn == sorted(drawn)
+            with lock:
+                nonces.extend(drawn)
+
+        threads = [threading.Thread(target=draw) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(set(nonces)) == len(nonces) == 1600
+
+
+def test_nonce_file_is_shared(tmp_path):
+    path = str(tmp_path/'nonce')
+    first = clients.NonceGenerator(path).next()
+    #A second generator, e.g. in another process, continues after the stored nonce.
+    with open(path, 'w') as f:
+        f.write(str(first + 10**9))
+    generator = clients.NonceGenerator(path)
+    assert generator.next() == first + 10**9 + 1
+    with open(path) as f:
+        assert int(f.read()) == first + 10**9 + 1
+
+
+def test_signed_order(trading):
+    client, server = trading
+    assert client.new_order(amount=0.5, price=1000, side='sell', order_type='exchange limit', symbol='btcusd')[6] == 'SUCCESS'
+    path, headers, body = server.requests[0]
+    assert path == '/v2/auth/w/order/submit'
+    assert json.loads(body) == {'symbol': 'tBTCUSD', 'amount': '-0.5', 'price': '1000', 'type': 'EXCHANGE LIMIT'}
+    expected = hmac.new(secret.encode(), ('/api/v2/auth/w/order/submit' + headers['bfx-nonce'] + body).encode(), hashlib.sha384)
+    assert headers['bfx-signature'] == expected.hexdigest()
+    assert headers['bfx-apikey'] == key
+
+
+def test_async_orders_are_signed_with_unique_nonces(trading):
+    client, server = trading
+    futures = [client.new_order_async(amount=0.01, price=1000 + n) for n in range(40)]
+    futures.append(client.cancel_order_async(7))
+    assert all(future.result()[6] == 'SUCCESS' for future in futures)
+    nonces = [headers['bfx-nonce'] for _, headers, _ in server.requests]
+    assert len(set(nonces)) == len(server.requests) == 41
+    for path, headers, body in server.requests:
+        expected = hmac.new(secret.encode(), ('/api' + path + headers['bfx-nonce'] + body).encode(), hashlib.sha384)
+        assert headers['bfx-signature'] == expected.hexdigest()
+
+
+def test_throttled_async_orders_arrive_in_nonce_order(trading):
+    client, server = trading
+    #Workers wait for their tokens, so without ordering a later nonce could overtake an earlier one.
+    client.auth_limiter = clients.RateLimiter(rate=50, burst=1)
+    futures = [client.new_order_async(amount=0.01, price=1000 + n) for n in range(30)]
+    assert all(future.result()[6] == 'SUCCESS' for future in futures)
+    nonces = [int(headers['bfx-nonce']) for _, headers, _ in server.requests]
+    assert len(nonces) == 30
+    assert nonces == sorted(nonces)
+    assert len(set(nonces)) == 30
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+from src import cli
+from tests.helpers import candleRows, newHandler, writeConfig
+
+
+def test_nonadjacent_duplicates_are_counted(tmp_path):
+    rows = candleRows(1500000000, 40)
+    #Five rows repeat the MTS of rows that are not next to them.
+    rows[[10, 15, 20, 25, 30], 0] = rows[[2, 4, 6, 8, 35], 0]
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    result = handler.validate(timebases=['1m'])['1m']
+    assert result['duplicates'] == 5
+    #The same duplicates are found when they are in different chunks.
+    assert handler.validate(timebases=['1m'], chunkRows=7)['1m']['duplicates'] == 5
+
+
+def test_sorted_file_has_no_duplicates(tmp_path, monkeypatch):
+    handler = newHandler(tmp_path/'c.hdf5', candleRows(1500000000, 40))
+    #A sorted file is checked row against row, without collecting its MTS values.
+    monkeypatch.setattr(handler, '_decodeMTS', None)
+    monkeypatch.setattr(np, 'union1d', None)
+    result = handler.validate(timebases=['1m'], chunkRows=7)['1m']
+    assert result['duplicates'] == 0 and result['unsorted'] == 0 and result['gaps'] == 0
+
+
+@pytest.mark.parametrize('chunkRows', [5, 7, 40])
+def test_duplicates_after_sorted_chunks(tmp_path, chunkRows):
+    rows = candleRows(1500000000, 40)
+    #A duplicate of the last row of a chunk, an adjacent duplicate, and a late row that repeats an early one.
+    rows[[5, 12, 37], 0] = rows[[4, 11, 3], 0]
+    rows[[20, 21], 0] = np.nan
+    handler = newHandler(tmp_path/'c.hdf5', rows)
+    result = handler.validate(timebases=['1m'], chunkRows=chunkRows)['1m']
+    assert result['duplicates'] == 3
+    assert result['examples']['duplicates'] == [5, 12, 37]
+
+
+def test_repair_removes_duplicates(tmp_path):
+    rows = candleRows(1500000000, 40)
+    rows[[10, 30], 0] = rows[[2, 35], 0]
+    path = tmp_path/'c.hdf5'
+    newHandler(path, rows).close()
+    configpath = writeConfig(tmp_path, path)
+    assert cli.main(['--config', configpath, 'validate', '--timebases', '1m']) == 1
+    assert cli.main(['--config', configpath, 'validate', '--timebases', '1m', '--repair']) == 0
+    assert cli.main(['--config', configpath, 'validate', '--timebases', '1m']) == 0
+
+
+def test_repair_fails_when_problems_remain(tmp_path):
+    rows = candleRows(1500000000, 40)
+    rows[12, 2] = np.nan #NaN prices are not removed by repair.
+    path = tmp_path/'c.hdf5'
+    newHandler(path, rows).close()
+    configpath = writeConfig(tmp_path, path)
+    assert cli.main(['--config', configpath, 'validate', '--timebases', '1m', '--repair']) == 1